@@ -11,8 +11,18 @@ else:
     ext_modules = [
         setuptools.extension.Extension("borg.bregman", ["src/python/borg/bregman.pyx"]),
         setuptools.extension.Extension("borg.models", ["src/python/borg/models.pyx"]),
-        setuptools.extension.Extension("borg.planners", ["src/python/borg/planners.pyx"]),
-        setuptools.extension.Extension("borg.statistics", ["src/python/borg/statistics.pyx"]),
+        setuptools.extension.Extension(
+            "borg.planners",
+            ["src/python/borg/planners.pyx"],
+            extra_compile_args = ["-fopenmp"],
+            extra_link_args = ["-fopenmp"],
+            ),
+        setuptools.extension.Extension(
+            "borg.statistics",
+            ["src/python/borg/statistics.pyx"],
+            extra_compile_args = ["-fopenmp"],
+            extra_link_args = ["-fopenmp"],
+            ),
         setuptools.extension.Extension("borg.domains.max_sat.features", ["src/python/borg/domains/max_sat/features.pyx"]),
         setuptools.extension.Extension("borg.domains.max_sat.instance", ["src/python/borg/domains/max_sat/instance.pyx"]),
         setuptools.extension.Extension("borg.domains.pb.features", ["src/python/borg/domains/pb/features.pyx"]),
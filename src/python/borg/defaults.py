@@ -4,6 +4,10 @@ import os
 
 machine_speed = 1.0
 proc_poll_period = 1.0
+proc_rescan_period = 1.0
+session_accounting = "auto"
+charge_system_time = False
+solver_pool_size = 0
 root_log_level = os.environ.get("BORG_LOG_ROOT_LEVEL", "NOTSET")
 
 try:
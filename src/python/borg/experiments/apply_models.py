@@ -2,7 +2,6 @@
 
 import os.path
 import csv
-import copy
 import numpy
 import condor
 import borg
@@ -13,7 +12,7 @@ def infer_distributions(run_data, model_name, instance, exclude):
     """Compute model predictions on every instance."""
 
     # customize the run data
-    filtered_data = copy.deepcopy(run_data)
+    filtered_data = run_data.copy()
 
     filtered_runs = filter(lambda r: r.solver != exclude, filtered_data.run_lists[instance])
 
@@ -60,7 +59,7 @@ def main(out_path, bundle, experiments, workers = 0, local = False):
     """Write the actual output of multiple models."""
 
     def yield_jobs():
-        run_data = borg.storage.RunData.from_bundle(bundle)
+        run_data = borg.storage.RunData.from_bundle(bundle, mutable = False)
 
         for experiment in experiments:
             yield (
@@ -12,7 +12,7 @@ logger = borg.get_logger(__name__, default_level = "INFO")
 def main(out_path, bundle_path):
     """Grade the utility of instance features."""
 
-    run_data = borg.storage.RunData.from_bundle(bundle_path)
+    run_data = borg.storage.RunData.from_bundle(bundle_path, mutable = False)
     model = borg.models.MulEstimator()(run_data, 60, run_data)
     regress = borg.regression.NearestRTDRegression(model)
     names = sorted(run_data.common_features)
@@ -15,7 +15,7 @@ def main(out_root, bundle):
     """Write the latent classes of a matrix model."""
 
     # fit the model
-    run_data = borg.storage.RunData.from_bundle(bundle)
+    run_data = borg.storage.RunData.from_bundle(bundle, mutable = False)
 
     logger.info("fitting matrix mixture model")
 
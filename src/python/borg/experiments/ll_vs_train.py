@@ -65,7 +65,7 @@ def main(out_path, experiments, workers = 0, local = False):
         for experiment in experiments:
             logger.info("preparing experiment: %s", experiment)
 
-            run_data = get_run_data(experiment["run_data"])
+            run_data = get_run_data(experiment["run_data"], mutable = False)
             validation = sklearn.cross_validation.ShuffleSplit(len(run_data), 32, test_fraction = 0.1, indices = False)
             max_instance_count = numpy.floor(0.9 * len(run_data)) - 10
             instance_counts = map(int, map(round, numpy.r_[10:max_instance_count:24j]))
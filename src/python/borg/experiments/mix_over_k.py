@@ -51,7 +51,7 @@ def main(out_path, bundle, workers = 0, local = False):
     """Evaluate the mixture model(s) over a range of component counts."""
 
     def yield_jobs():
-        run_data = borg.storage.RunData.from_bundle(bundle)
+        run_data = borg.storage.RunData.from_bundle(bundle, mutable = False)
         validation = sklearn.cross_validation.ShuffleSplit(len(run_data), 64, test_fraction = 0.2, indices = False)
 
         for (train_mask, test_mask) in validation:
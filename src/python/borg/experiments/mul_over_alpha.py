@@ -38,7 +38,7 @@ def main(out_path, bundle, workers = 0, local = False):
     """Evaluate the pure multinomial model over a range of smoothing values."""
 
     def yield_jobs():
-        run_data = borg.storage.RunData.from_bundle(bundle)
+        run_data = borg.storage.RunData.from_bundle(bundle, mutable = False)
         validation = sklearn.cross_validation.KFold(len(run_data), 10, indices = False)
 
         for (train_mask, test_mask) in validation:
@@ -17,7 +17,7 @@ def simulate_run(run, maker, all_data, train_mask, test_mask, instances, indepen
     test_data = all_data.masked(test_mask)
 
     if instances is not None:
-        ids = sorted(train_data.run_lists, key = lambda _: numpy.random.rand())[:instances]
+        ids = sorted(train_data.ids, key = lambda _: numpy.random.rand())[:instances]
         train_data = train_data.filter(*ids)
 
     if independent:
@@ -40,7 +40,7 @@ def simulate_run(run, maker, all_data, train_mask, test_mask, instances, indepen
     solver = maker(suite, train_data, model_kwargs = model_kwargs)
     successes = []
 
-    for (i, instance_id) in enumerate(test_data.run_lists):
+    for (i, instance_id) in enumerate(test_data.ids):
         logger.info("simulating run %i/%i on %s", i, len(test_data), instance_id)
 
         with suite.domain.task_from_path(instance_id) as instance:
@@ -94,7 +94,7 @@ def main(out_path, runs, repeats = 128, workers = 0, local = False):
 
     def yield_jobs():
         for run in runs:
-            all_data = get_run_data(run["bundle"])
+            all_data = get_run_data(run["bundle"], mutable = False)
             validation = sklearn.cross_validation.ShuffleSplit(len(all_data), repeats, test_fraction = 0.2, indices = False)
 
             if run["portfolio_name"] == "-":
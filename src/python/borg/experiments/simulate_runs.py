@@ -81,7 +81,7 @@ def simulate_run(run, maker, train_data, test_data):
     solver = maker(suite, train_data, test_data)
     rows = []
 
-    for (i, instance_id) in enumerate(test_data.run_lists):
+    for (i, instance_id) in enumerate(test_data.ids):
         logger.info("simulating run %i/%i on %s", i, len(test_data), instance_id)
 
         with suite.domain.task_from_path(instance_id) as instance:
@@ -121,7 +121,7 @@ def main(out_path, runs, repeats = 5, workers = 0, local = False):
 
     def yield_jobs():
         for run in runs:
-            train_data = get_run_data(run["train_bundle"])
+            train_data = get_run_data(run["train_bundle"], mutable = False)
 
             if run.get("only_nontrivial", False):
                 train_data = train_data.only_nontrivial()
@@ -130,7 +130,7 @@ def main(out_path, runs, repeats = 5, workers = 0, local = False):
                 validation = sklearn.cross_validation.KFold(len(train_data), repeats, indices = False)
                 data_sets = [(train_data.masked(v), train_data.masked(e)) for (v, e) in validation]
             else:
-                test_data = get_run_data(run["test_bundle"])
+                test_data = get_run_data(run["test_bundle"], mutable = False)
 
                 if run.get("only_nontrivial", False):
                     test_data = test_data.only_nontrivial()
@@ -19,10 +19,11 @@ def run_experiment(run_data, planner_name, B):
         raise ValueError("unrecognized planner name \"{0}\"".format(planner_name))
 
     suite = borg.fake.FakeSuite(run_data)
-    portfolio = borg.portfolios.PreplanningPortfolio(suite, run_data, B = B, planner = planner)
+    model = borg.models.MulEstimator()(run_data, B, run_data)
+    portfolio = borg.portfolios.PreplanningPortfolio(suite, model, planner = planner)
 
     def yield_rows():
-        for instance_id in run_data.run_lists:
+        for instance_id in run_data.ids:
             with suite.domain.task_from_path(instance_id) as instance:
                 budget = borg.Cost(cpu_seconds = run_data.common_budget)
                 answer = portfolio(instance, suite, budget)
@@ -46,10 +47,11 @@ def main(out_path, bundle, workers = 0, local = False):
     """Evaluate the mixture model(s) over a range of component counts."""
 
     def yield_jobs():
-        run_data = borg.storage.RunData.from_bundle(bundle)
+        run_data = borg.storage.RunData.from_bundle(bundle, mutable = False)
         planner_names = ["knapsack", "streeter", "bellman"]
         bin_counts = xrange(1, 121)
         replications = xrange(16)
+
         experiments = itertools.product(planner_names, bin_counts, replications)
 
         for (planner_name, bin_count, _) in experiments:
@@ -84,8 +84,7 @@ class FakeSolverFactory(object):
     def start(self, task):
         """Return a fake solver process."""
 
-        all_runs = self._runs_data.run_lists[task]
-        our_runs = filter(lambda run: run.solver == self._solver_name, all_runs)
+        our_runs = list(self._runs_data.runs_on(task, self._solver_name))
 
         if len(our_runs) == 0:
             raise Exception("no runs of solver \"{0}\" are recorded".format(self._solver_name))
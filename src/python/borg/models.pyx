@@ -53,7 +53,63 @@ def sampled_pmfs_log_pmf(pmfs, counts):
 
     return logs_NM
 
-def run_data_log_probabilities(model, testing, weights = None):
+@cython.infer_types(True)
+def multinomial_log_coefficients(counts):
+    """Compute the log multinomial coefficient of each instance's counts."""
+
+    cdef int M = counts.shape[0]
+    cdef int S = counts.shape[1]
+    cdef int C = counts.shape[2]
+
+    cdef numpy.ndarray[int, ndim = 3] counts_MSC = counts
+    cdef numpy.ndarray[double, ndim = 1] logs_M = numpy.zeros(M, numpy.double)
+
+    cdef int counts_msc
+
+    for m in xrange(M):
+        for s in xrange(S):
+            sum_counts_ms = 0
+
+            for c in xrange(C):
+                counts_msc = counts_MSC[m, s, c]
+
+                if counts_msc > 0:
+                    sum_counts_ms += counts_msc
+
+                    logs_M[m] -= libc.math.lgamma(1.0 + counts_msc)
+
+            logs_M[m] += libc.math.lgamma(1.0 + sum_counts_ms)
+
+    return logs_M
+
+def sampled_pmfs_log_pmf_dense(pmfs, counts):
+    """
+    Compute the log probabilities of instance runs given discrete log PMFs.
+
+    Equivalent to sampled_pmfs_log_pmf(), but the coefficient terms are
+    computed once per instance, and the rest is a single matrix product.
+    """
+
+    borg.statistics.assert_log_weights(pmfs, axis = -1)
+
+    (N, S, C) = pmfs.shape
+    M = counts.shape[0]
+
+    pmfs_NK = numpy.reshape(pmfs, (N, S * C))
+    counts_MK = numpy.reshape(counts, (M, S * C)).astype(numpy.double)
+
+    # zero counts contribute nothing, even against zero-probability bins
+    impossible_NK = numpy.isneginf(pmfs_NK)
+    logs_NM = numpy.dot(numpy.where(impossible_NK, 0.0, pmfs_NK), counts_MK.T)
+
+    logs_NM += multinomial_log_coefficients(counts)[None, :]
+    logs_NM[numpy.dot(impossible_NK.astype(numpy.double), counts_MK.T) > 0.0] = -numpy.inf
+
+    borg.statistics.assert_log_probabilities(logs_NM)
+
+    return logs_NM
+
+def run_data_log_probabilities(model, testing, weights = None, dense = True):
     """Compute per-instance log probabilities of run data under a model."""
 
     logger.info("scoring model on %i instances", len(testing))
@@ -61,8 +117,12 @@ def run_data_log_probabilities(model, testing, weights = None):
     (N, S, C) = model.log_masses.shape
     B = C - 1
 
-    counts = testing.to_bins_array(testing.solver_names, B)
-    log_probabilities = borg.models.sampled_pmfs_log_pmf(model.log_masses, counts)
+    counts = testing.to_bins_array(testing.solver_names, B, edges = model.edges)
+
+    if dense:
+        log_probabilities = borg.models.sampled_pmfs_log_pmf_dense(model.log_masses, counts)
+    else:
+        log_probabilities = borg.models.sampled_pmfs_log_pmf(model.log_masses, counts)
 
     if weights is None:
         weights = numpy.ones_like(log_probabilities.T) / log_probabilities.shape[0]
@@ -76,6 +136,25 @@ def run_data_log_probabilities(model, testing, weights = None):
 
     return lps_per
 
+def run_data_bins_array(run_data, bins):
+    """
+    Discretize run durations, returning counts, interval and bin edges.
+
+    Bins are either a count of uniform bins over the common budget, or a
+    sequence of upper bin edges, in seconds, the last of which is the cutoff.
+    """
+
+    if numpy.ndim(bins) == 0:
+        counts_NSD = run_data.to_bins_array(run_data.solver_names, bins)
+
+        return (counts_NSD, run_data.get_common_budget() / bins, None)
+    else:
+        edges = numpy.asarray(bins, numpy.double)
+        (B,) = edges.shape
+        counts_NSD = run_data.to_bins_array(run_data.solver_names, B, edges = edges)
+
+        return (counts_NSD, edges[-1] / B, edges)
+
 class MultinomialModel(object):
     """Multinomial mixture model."""
 
@@ -87,13 +166,23 @@ class MultinomialModel(object):
         log_masses = None,
         names = None,
         features = None,
+        edges = None,
         ):
         """Initialize."""
 
-        (N, _, _) = log_survival.shape
+        (N, _, C) = log_survival.shape
 
         self._interval = interval
         self._log_survival_NSC = log_survival
+        self._edges = edges
+
+        if edges is None:
+            self._durations_C = interval * numpy.arange(1, C + 1)
+        else:
+            assert len(edges) == C - 1
+
+            # the final, unfinished bin is as wide as the one before it
+            self._durations_C = numpy.append(edges, edges[-1] + numpy.diff(numpy.r_[0.0, edges])[-1])
 
         if log_weights is None:
             self._log_weights_N = numpy.zeros(N) - numpy.log(N)
@@ -127,6 +216,7 @@ class MultinomialModel(object):
                 log_masses = self._log_masses_NSC,
                 names = self._names,
                 features = features,
+                edges = self._edges,
                 )
 
     def condition(self, failures):
@@ -139,7 +229,7 @@ class MultinomialModel(object):
 
         log_post_weights_N -= numpy.logaddexp.reduce(log_post_weights_N)
 
-        return MultinomialModel(self._interval, self._log_survival_NSC, log_post_weights_N)
+        return MultinomialModel(self._interval, self._log_survival_NSC, log_post_weights_N, edges = self._edges)
 
     @property
     def interval(self):
@@ -147,6 +237,18 @@ class MultinomialModel(object):
 
         return self._interval
 
+    @property
+    def edges(self):
+        """Upper bin edges, in seconds, or None if bins are uniform."""
+
+        return self._edges
+
+    @property
+    def durations(self):
+        """Run duration, in seconds, associated with each bin."""
+
+        return self._durations_C
+
     @property
     def log_weights(self):
         """Log weights of the model components."""
@@ -184,7 +286,7 @@ class MulEstimator(object):
     def __call__(self, run_data, bins, full_data):
         """Estimator parameters of the simple multinomial model."""
 
-        counts_NSD = run_data.to_bins_array(run_data.solver_names, bins)
+        (counts_NSD, interval, edges) = run_data_bins_array(run_data, bins)
         samples_NSD = counts_NSD + self._alpha
 
         # XXX hack
@@ -194,16 +296,17 @@ class MulEstimator(object):
 
         return \
             MultinomialModel(
-                run_data.get_common_budget() / bins,
+                interval,
                 borg.statistics.to_log_survival(samples_NSD, axis = -1),
                 log_masses = borg.statistics.floored_log(samples_NSD),
                 names = numpy.array(sorted(run_data.ids)),
                 features = run_data.to_features_array(),
+                edges = edges,
                 )
 
 class MulDirEstimator(object):
     def __call__(self, run_data, bins, full_data):
-        counts_NSD = run_data.to_bins_array(run_data.solver_names, bins)
+        (counts_NSD, interval, edges) = run_data_bins_array(run_data, bins)
 
         (N, S, D) = counts_NSD.shape
 
@@ -217,11 +320,12 @@ class MulDirEstimator(object):
 
         return \
             MultinomialModel(
-                run_data.get_common_budget() / bins,
+                interval,
                 borg.statistics.to_log_survival(samples_NSD, axis = -1),
                 log_masses = borg.statistics.floored_log(samples_NSD),
                 names = numpy.array(sorted(run_data.ids)),
                 features = run_data.to_features_array(),
+                edges = edges,
                 )
 
 class MulDirMixEstimator(object):
@@ -232,9 +336,8 @@ class MulDirMixEstimator(object):
 
     def __call__(self, run_data, bins, full_data):
         # ...
-        counts_NSD = run_data.to_bins_array(run_data.solver_names, bins)
+        (counts_NSD, interval, edges) = run_data_bins_array(run_data, bins)
         features_NF = run_data.to_features_array()
-        interval = run_data.get_common_budget() / bins
 
         (N, S, D) = counts_NSD.shape
         (_, F) = features_NF.shape
@@ -284,27 +387,118 @@ class MulDirMixEstimator(object):
                 log_masses = borg.statistics.floored_log(samples_TSD),
                 names = names_T,
                 features = features_TF,
+                edges = edges,
                 )
 
 class MulDirMatMixEstimator(object):
-    def __init__(self, K = 32, alpha = None):
+    def __init__(self, K = 32, alpha = None, threads = 1):
         self._K = K
         self._alpha = alpha
+        self._threads = threads
+        self._partial = None
 
-    def __call__(self, run_data, bins, full_data):
+    def __call__(self, run_data, bins, full_data, initial = None, iterations = 128):
         # ...
-        counts_NSD = run_data.to_bins_array(run_data.solver_names, bins)
+        (counts_NSD, interval, edges) = run_data_bins_array(run_data, bins)
         features_NF = run_data.to_features_array()
-        full_NSD = full_data.to_bins_array(full_data.solver_names, bins)
-        interval = run_data.get_common_budget() / bins
-
-        (N, S, D) = counts_NSD.shape
-        (_, F) = features_NF.shape
-        K = self._K
 
         # fit model
         (alphas_KSD, log_responsibilities_KN) = \
-            borg.statistics.dcm_matrix_mixture_estimate_ml(counts_NSD, K, self._alpha)
+            borg.statistics.dcm_matrix_mixture_estimate_ml(
+                counts_NSD,
+                self._K,
+                self._alpha,
+                self._threads,
+                initial = initial,
+                iterations = iterations,
+                )
+
+        return \
+            self._build_model(
+                interval,
+                alphas_KSD,
+                log_responsibilities_KN,
+                counts_NSD,
+                features_NF,
+                sorted(run_data.ids),
+                edges = edges,
+                )
+
+    def refit(self, model, run_data, bins, full_data = None, iterations = 8):
+        """Run a few EM iterations on run data, starting from a fitted model."""
+
+        (_, N) = model.responsibilities.shape
+        log_weights_K = numpy.logaddexp.reduce(model.responsibilities, axis = -1) - numpy.log(N)
+
+        return \
+            self(
+                run_data,
+                bins,
+                run_data if full_data is None else full_data,
+                initial = (model.latent_classes, log_weights_K),
+                iterations = iterations,
+                )
+
+    def partial_fit(self, run_data, bins, iterations = 8):
+        """
+        Update the model fitted so far with new instances.
+
+        The first call fits a model; later calls run a few EM iterations over
+        the new instances only, starting from the current components, with
+        earlier instances represented by their accumulated sufficient
+        statistics. Returns a model of all instances seen.
+        """
+
+        (counts_NSD, interval, edges) = run_data_bins_array(run_data, bins)
+        features_NF = run_data.to_features_array()
+        names_N = sorted(run_data.ids)
+
+        if self._partial is None:
+            (alphas_KSD, log_responsibilities_KN) = \
+                borg.statistics.dcm_matrix_mixture_estimate_ml(counts_NSD, self._K, self._alpha, self._threads)
+
+            statistics = borg.statistics.dcm_matrix_mixture_statistics(counts_NSD, log_responsibilities_KN)
+        else:
+            (
+                statistics,
+                alphas_KSD,
+                seen_counts_NSD,
+                seen_features_NF,
+                seen_names_N,
+                seen_log_responsibilities_KN,
+                ) = \
+                self._partial
+
+            (_, seen_weights_KU) = statistics
+            log_weights_K = numpy.log(numpy.sum(seen_weights_KU, axis = -1) / numpy.sum(seen_weights_KU))
+
+            (alphas_KSD, log_responsibilities_KN) = \
+                borg.statistics.dcm_matrix_mixture_estimate_ml(
+                    counts_NSD,
+                    self._K,
+                    self._alpha,
+                    self._threads,
+                    initial = (alphas_KSD, log_weights_K),
+                    iterations = iterations,
+                    statistics = statistics,
+                    )
+
+            statistics = borg.statistics.dcm_matrix_mixture_statistics(counts_NSD, log_responsibilities_KN, statistics)
+            counts_NSD = numpy.concatenate([seen_counts_NSD, counts_NSD])
+            features_NF = numpy.concatenate([seen_features_NF, features_NF])
+            names_N = seen_names_N + names_N
+            log_responsibilities_KN = numpy.hstack([seen_log_responsibilities_KN, log_responsibilities_KN])
+
+        self._partial = (statistics, alphas_KSD, counts_NSD, features_NF, names_N, log_responsibilities_KN)
+
+        return self._build_model(interval, alphas_KSD, log_responsibilities_KN, counts_NSD, features_NF, names_N, edges = edges)
+
+    def _build_model(self, interval, alphas_KSD, log_responsibilities_KN, counts_NSD, features_NF, names_N, edges = None):
+        """Extract RTD samples from a fitted mixture."""
+
+        (N, S, D) = counts_NSD.shape
+        (_, F) = features_NF.shape
+        (K, _) = log_responsibilities_KN.shape
 
         # extract RTD samples
         T = N * K
@@ -313,7 +507,6 @@ class MulDirMatMixEstimator(object):
         samples_TSD = numpy.empty((T, S, D), numpy.double)
         log_weights_T = numpy.empty(T, numpy.double)
         features_TF = numpy.empty((T, F), numpy.double)
-        names_N = sorted(run_data.ids)
         names_T = numpy.empty(T, object)
 
         #samples_TSD = alphas_KSD / numpy.sum(alphas_KSD, axis = -1)[..., None] # XXX
@@ -413,6 +606,7 @@ class MulDirMatMixEstimator(object):
                 log_weights = log_weights_T,
                 names = names_T,
                 features = features_TF,
+                edges = edges,
                 )
 
         model.latent_classes = alphas_KSD
@@ -484,7 +678,7 @@ class DiscreteLogNormalMatMixEstimator(object):
     def __init__(self, int K = 128):
         self._K = K
 
-    def __call__(self, run_data, bins, full_data):
+    def __call__(self, run_data, bins, full_data, initial = None, iterations = 64):
         """Fit parameters of the log-normal linked mixture model."""
 
         # ...
@@ -497,11 +691,13 @@ class DiscreteLogNormalMatMixEstimator(object):
         K = self._K
 
         # estimate training RTDs
-        (ps_KSD, log_responsibilities_KN) = \
+        (ps_KSD, log_responsibilities_KN, parameters) = \
             borg.statistics.discrete_log_normal_matrix_mixture_estimate_ml(
                 counts_NSD,
                 budget,
                 K,
+                initial = initial,
+                iterations = iterations,
                 )
 
         borg.statistics.assert_log_weights(log_responsibilities_KN, axis = 0)
@@ -527,7 +723,7 @@ class DiscreteLogNormalMatMixEstimator(object):
                 #print "----"
                 #print counts_NSD[numpy.argsort(log_responsibilities_KN[t, :])[-4:][::-1]]
 
-        return \
+        model = \
             MultinomialModel(
                 interval,
                 borg.statistics.to_log_survival(samples_TSD, axis = -1),
@@ -536,6 +732,12 @@ class DiscreteLogNormalMatMixEstimator(object):
                 #features = features_TF,
                 )
 
+        model.latent_classes = ps_KSD
+        model.responsibilities = log_responsibilities_KN
+        model.latent_parameters = parameters
+
+        return model
+
         samples_NSD = numpy.empty((N, S, D))
 
         for n in xrange(N):
@@ -563,3 +765,18 @@ class DiscreteLogNormalMatMixEstimator(object):
                 log_masses = borg.statistics.floored_log(samples_NSD),
                 )
 
+    def refit(self, model, run_data, bins, full_data = None, iterations = 8):
+        """Run a few EM iterations on run data, starting from a fitted model."""
+
+        (_, N) = model.responsibilities.shape
+        log_weights_K = numpy.logaddexp.reduce(model.responsibilities, axis = -1) - numpy.log(N)
+
+        return \
+            self(
+                run_data,
+                bins,
+                run_data if full_data is None else full_data,
+                initial = tuple(model.latent_parameters) + (log_weights_K,),
+                iterations = iterations,
+                )
+
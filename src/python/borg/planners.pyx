@@ -1,6 +1,10 @@
 #cython: profile=False
 """@author: Bryan Silverthorn <bcs@cargo-cult.org>"""
 
+import time
+import heapq
+import hashlib
+import collections
 import numpy
 import borg
 
@@ -9,6 +13,8 @@ cimport libc.math
 cimport numpy
 cimport borg.statistics
 
+from cython.parallel cimport prange
+
 logger = borg.get_logger(__name__, default_level = "INFO")
 
 cdef extern from "math.h":
@@ -17,11 +23,20 @@ cdef extern from "math.h":
 class Planner(object):
     """Discretizing dynamic-programming planner."""
 
-    def __init__(self, compute_plan):
+    resumes = False
+    accepts_durations = False
+
+    def __init__(self, compute_plan, **kwargs):
         self._compute_plan = compute_plan
+        self._kwargs = kwargs
 
-    def plan(self, log_survival, log_weights = None):
-        """Compute a plan."""
+    def plan(self, log_survival, log_weights = None, durations = None):
+        """
+        Compute a plan.
+
+        Bins are of uniform width unless the run duration of each bin is
+        given, in which case the budget is that of the last bin.
+        """
 
         log_survival_WSB = log_survival
 
@@ -32,85 +47,337 @@ class Planner(object):
         else:
             log_weights_W = log_weights
 
-        return self._compute_plan(log_survival_WSB, log_weights_W)
+        if durations is None:
+            return self._compute_plan(log_survival_WSB, log_weights_W, **self._kwargs)
+        elif self.accepts_durations:
+            return self._compute_plan(log_survival_WSB, log_weights_W, durations = durations, **self._kwargs)
+        else:
+            raise ValueError("{0} does not support non-uniform bins".format(type(self).__name__))
+
+    def start(self, log_survival, log_weights = None, durations = None):
+        """Begin incremental planning."""
+
+        return PlanState(self, log_survival, log_weights, durations)
+
+    def plan_batch(self, log_survival):
+        """Compute a single-world plan for each instance."""
+
+        return [self.plan(log_survival_SB[None, ...]) for log_survival_SB in log_survival]
 
 @cython.infer_types(True)
 @cython.wraparound(False)
 @cython.boundscheck(False)
-def knapsack_plan(log_survival, log_weights):
-    """Compute a plan via dynamic programming."""
-
-    # prepare
-    cdef int W
-    cdef int S
-    cdef int B
-
-    (W, S, B) = log_survival.shape
+@cython.cdivision(True)
+cdef void knapsack_fill(
+    numpy.ndarray[double, ndim = 3] survival_SBW,
+    numpy.ndarray[double, ndim = 2] values_B1W,
+    numpy.ndarray[double, ndim = 2] posts_SB,
+    numpy.ndarray[int, ndim = 1] policy_s_B,
+    numpy.ndarray[int, ndim = 1] policy_c_B,
+    numpy.ndarray[int, ndim = 2] previous_BB,
+    int first,
+    int last,
+    int threads,
+    ):
+    """
+    Fill rows first through last of the knapsack value table.
 
-    # generate the value table and associated policy
-    log_survival_swapped = numpy.asarray(log_survival.swapaxes(0, 1).swapaxes(1, 2), order = "C")
+    For each budget, every (solver, duration) candidate is scored by a
+    contiguous dot product over worlds; candidates are scored in parallel,
+    without the GIL, if more than one thread is requested. Taking action c
+    under budget row b leaves budget row previous_BB[b - 1, c], which is
+    always before row b.
+    """
 
-    cdef numpy.ndarray[double, ndim = 3] log_survival_SBW = log_survival_swapped
-    cdef numpy.ndarray[double, ndim = 3] survival_SBW = numpy.exp(log_survival_swapped)
-    cdef numpy.ndarray[double, ndim = 1] log_weights_W = numpy.asarray(log_weights, order = "C")
-    cdef numpy.ndarray[double, ndim = 1] weights_W = numpy.exp(log_weights_W + libc.math.log(W))
-    cdef numpy.ndarray[double, ndim = 2] values_B1W = numpy.ones((B + 1, W))
-    cdef numpy.ndarray[int, ndim = 1] policy_s_B = numpy.empty(B, numpy.intc)
-    cdef numpy.ndarray[int, ndim = 1] policy_c_B = numpy.empty(B, numpy.intc)
+    cdef int S = survival_SBW.shape[0]
+    cdef int W = survival_SBW.shape[2]
 
     cdef double post
     cdef double best_post
-    cdef double v
+    cdef double* survival_W
+    cdef double* values_W
     cdef int best_s
     cdef int best_c
     cdef int b
     cdef int s
     cdef int c
+    cdef int sc
     cdef int w
 
-    for b in xrange(1, B + 1):
+    for b in xrange(first, last + 1):
+        # score every candidate action
+        for sc in prange(S * b, nogil = True, num_threads = threads, schedule = "static"):
+            s = sc / b
+            c = sc % b
+            survival_W = &survival_SBW[s, c, 0]
+            values_W = &values_B1W[previous_BB[b - 1, c], 0]
+            post = 0.0
+
+            for w in xrange(W):
+                post = post + survival_W[w] * values_W[w]
+
+            posts_SB[s, c] = post
+
+        # and pick the best
         best_s = 0
         best_c = 0
         best_post = INFINITY
 
         for s in xrange(S):
             for c in xrange(b):
-                post = 0.0
-
-                for w in xrange(W):
-                    v = weights_W[w] * survival_SBW[s, c, w] * values_B1W[b - c - 1, w]
-
-                    post += v
-
-                if post < best_post:
+                if posts_SB[s, c] < best_post:
                     best_s = s
                     best_c = c
-                    best_post = post
+                    best_post = posts_SB[s, c]
 
         for w in xrange(W):
-            values_B1W[b, w] = survival_SBW[best_s, best_c, w] * values_B1W[b - best_c - 1, w]
+            values_B1W[b, w] = survival_SBW[best_s, best_c, w] * values_B1W[previous_BB[b - 1, best_c], w]
 
         policy_s_B[b - 1] = best_s
         policy_c_B[b - 1] = best_c
 
-    # build a plan from the policy
+def knapsack_policy_plan(policy_s_B, policy_c_B, int B, previous_BB = None):
+    """Build a plan from a knapsack policy."""
+
     plan = []
     b = B
 
     while b > 0:
         s = policy_s_B[b - 1]
         c = policy_c_B[b - 1]
-        b -= c + 1
+
+        if previous_BB is None:
+            b -= c + 1
+        else:
+            b = previous_BB[b - 1][c]
 
         plan.append((s, c))
 
     return plan
 
+def knapsack_previous(int B, durations = None):
+    """
+    Tabulate the budget row left by each action under each budget row.
+
+    Row b > 0 is a budget of the run duration of bin b - 1; row 0 is an
+    empty budget. Budget left over by an action is rounded down to a row.
+    """
+
+    if durations is None:
+        previous_BB = numpy.arange(B)[:, None] - numpy.arange(B)[None, :]
+    else:
+        durations_B = numpy.asarray(durations[:B], numpy.double)
+        budgets_B1 = numpy.r_[0.0, durations_B]
+        left_BB = durations_B[:, None] - durations_B[None, :]
+        previous_BB = numpy.searchsorted(budgets_B1, left_BB.ravel() + 1e-9 * budgets_B1[-1], side = "right") - 1
+
+        previous_BB = previous_BB.reshape((B, B))
+
+    return numpy.maximum(previous_BB, 0).astype(numpy.intc)
+
+def knapsack_plan(log_survival, log_weights, int threads = 1, durations = None):
+    """Compute a plan via dynamic programming."""
+
+    state = KnapsackPlanState(log_survival, log_weights, threads = threads, durations = durations)
+
+    return state.plan(state.B)
+
+@cython.infer_types(True)
+@cython.wraparound(False)
+@cython.boundscheck(False)
+@cython.cdivision(True)
+def knapsack_plan_batch(log_survival, int threads = 1):
+    """
+    Compute a single-world knapsack plan for each of N instances.
+
+    Instances are planned in parallel, without the GIL, if more than one
+    thread is requested; each plan is identical to that computed for its
+    instance alone.
+    """
+
+    # prepare
+    cdef int N
+    cdef int S
+    cdef int B
+
+    (N, S, B) = log_survival.shape
+
+    cdef numpy.ndarray[double, ndim = 3] survival_NSB = numpy.exp(numpy.asarray(log_survival, numpy.double, order = "C"))
+    cdef numpy.ndarray[double, ndim = 2] values_NB1 = numpy.empty((N, B + 1))
+    cdef numpy.ndarray[int, ndim = 2] policy_s_NB = numpy.empty((N, B), numpy.intc)
+    cdef numpy.ndarray[int, ndim = 2] policy_c_NB = numpy.empty((N, B), numpy.intc)
+
+    cdef double post
+    cdef double best_post
+    cdef int best_s
+    cdef int best_c
+    cdef int n
+    cdef int b
+    cdef int s
+    cdef int c
+
+    # generate each value table and associated policy
+    for n in prange(N, nogil = True, num_threads = threads, schedule = "dynamic"):
+        values_NB1[n, 0] = 1.0
+
+        for b in xrange(1, B + 1):
+            best_s = 0
+            best_c = 0
+            best_post = INFINITY
+
+            for s in xrange(S):
+                for c in xrange(b):
+                    post = survival_NSB[n, s, c] * values_NB1[n, b - c - 1]
+
+                    if post < best_post:
+                        best_s = s
+                        best_c = c
+                        best_post = post
+
+            values_NB1[n, b] = best_post
+            policy_s_NB[n, b - 1] = best_s
+            policy_c_NB[n, b - 1] = best_c
+
+    # build plans from the policies
+    policies = zip(policy_s_NB.tolist(), policy_c_NB.tolist())
+
+    return [knapsack_policy_plan(policy_s_B, policy_c_B, B) for (policy_s_B, policy_c_B) in policies]
+
+class PlanState(object):
+    """Beliefs carried between calls to a planner during a single solve."""
+
+    def __init__(self, planner, log_survival, log_weights = None, durations = None):
+        """Initialize."""
+
+        (W, S, B) = log_survival.shape
+
+        if log_weights is None:
+            log_weights = -numpy.ones(W) * numpy.log(W)
+
+        self._planner = planner
+        self._log_survival_WSB = log_survival
+        self._log_weights_W = numpy.array(log_weights, numpy.double)
+        self._durations = durations
+        self.B = B
+
+    def condition(self, s, b):
+        """Condition on the failure of a run."""
+
+        self._log_weights_W += self._log_survival_WSB[:, s, b]
+        self._log_weights_W -= numpy.logaddexp.reduce(self._log_weights_W)
+
+    def plan(self, B):
+        """Compute a plan over the first B bins."""
+
+        if self._durations is None:
+            return self._planner.plan(self._log_survival_WSB[..., :B], self._log_weights_W)
+        else:
+            return self._planner.plan(self._log_survival_WSB[..., :B], self._log_weights_W, self._durations[:B])
+
+    def log_mean_survival(self, B):
+        """Compute the weighted mean survival function over the first B bins."""
+
+        return \
+            numpy.logaddexp.reduce(
+                self._log_survival_WSB[..., :B] + self._log_weights_W[:, None, None],
+                axis = 0,
+                )
+
+class KnapsackPlanState(PlanState):
+    """
+    Knapsack planner state that keeps its tables between calls.
+
+    The exponentiated survival products, the budget-row table and the work
+    buffers are computed once. Since each row of the value table depends only
+    on earlier rows, planning over a shorter budget reuses the existing table.
+    Conditioning on a failure updates the world weights in place, but must
+    invalidate every row: each row's choice of action minimizes a sum over
+    every world, so reweighting any world may change any row.
+
+    If the run duration of each bin is given, bins may be of any width.
+    """
+
+    def __init__(self, log_survival, log_weights = None, threads = 1, durations = None):
+        """Initialize."""
+
+        (W, S, B) = log_survival.shape
+
+        if log_weights is None:
+            log_weights = -numpy.ones(W) * numpy.log(W)
+
+        log_survival_swapped = numpy.asarray(log_survival.swapaxes(0, 1).swapaxes(1, 2), order = "C")
+
+        self._threads = threads
+        self._survival_SBW = numpy.exp(log_survival_swapped)
+        self._values_B1W = numpy.empty((B + 1, W))
+        self._posts_SB = numpy.empty((S, B))
+        self._policy_s_B = numpy.empty(B, numpy.intc)
+        self._policy_c_B = numpy.empty(B, numpy.intc)
+        self._previous_BB = knapsack_previous(B, durations)
+        self._previous_lists = None if durations is None else self._previous_BB.tolist()
+        self._filled = 0
+        self.B = B
+
+        # (the value table is stored pre-multiplied by the world weights)
+        self._values_B1W[0, :] = numpy.exp(numpy.asarray(log_weights, numpy.double) + numpy.log(W))
+
+    def condition(self, s, b):
+        """Condition on the failure of a run."""
+
+        weights_W = self._values_B1W[0]
+
+        weights_W *= self._survival_SBW[s, b]
+        weights_W *= weights_W.shape[0] / numpy.sum(weights_W)
+
+        # (every row's choice depends on every world weight)
+        self._filled = 0
+
+    def plan(self, B):
+        """Compute a plan over the first B bins."""
+
+        B = min(B, self.B)
+
+        if B > self._filled:
+            knapsack_fill(
+                self._survival_SBW,
+                self._values_B1W,
+                self._posts_SB,
+                self._policy_s_B,
+                self._policy_c_B,
+                self._previous_BB,
+                self._filled + 1,
+                B,
+                self._threads,
+                )
+
+            self._filled = B
+
+        return knapsack_policy_plan(self._policy_s_B, self._policy_c_B, B, self._previous_lists)
+
+    def log_mean_survival(self, B):
+        """Compute the weighted mean survival function over the first B bins."""
+
+        weights_W = self._values_B1W[0]
+
+        return numpy.log(numpy.dot(self._survival_SBW[:, :B], weights_W) / weights_W.shape[0])
+
 class KnapsackPlanner(Planner):
     """Discretizing dynamic-programming planner."""
 
-    def __init__(self):
-        Planner.__init__(self, knapsack_plan)
+    accepts_durations = True
+
+    def __init__(self, threads = 1):
+        Planner.__init__(self, knapsack_plan, threads = threads)
+
+    def start(self, log_survival, log_weights = None, durations = None):
+        """Begin incremental planning."""
+
+        return KnapsackPlanState(log_survival, log_weights, durations = durations, **self._kwargs)
+
+    def plan_batch(self, log_survival):
+        """Compute a single-world plan for each instance."""
+
+        return knapsack_plan_batch(log_survival, **self._kwargs)
 
 def streeter_plan(log_survival_WSB, log_weights_W):
     """Compute plan using Streeter's algorithm."""
@@ -133,7 +400,7 @@ def streeter_plan(log_survival_WSB, log_weights_W):
 
         plan.append(action)
 
-        log_plan_survival_W += log_post_survival_WSR[:, min_s, min_b]
+        log_plan_survival_W += log_survival_WSB[:, min_s, min_b]
 
         R -= min_b + 1
 
@@ -150,6 +417,70 @@ class StreeterPlanner(Planner):
     def __init__(self):
         Planner.__init__(self, streeter_plan)
 
+def lazy_streeter_plan(log_survival_WSB, log_weights_W, time_limit = None):
+    """
+    Compute plan using Streeter's algorithm, with lazy evaluation.
+
+    The marginal gain of an action can only shrink as the plan grows, so
+    stale gains are upper bounds; they are kept in a priority queue and only
+    the most promising action is reevaluated, by a dot product over worlds.
+    Each plan prefix is itself a plan, so planning stops early, with the plan
+    so far, once the time limit passes.
+    """
+
+    # prepare
+    (W, S, B) = log_survival_WSB.shape
+
+    if time_limit is None:
+        deadline = None
+    else:
+        deadline = time.time() + time_limit
+
+    failure_SBW = numpy.empty((S, B, W))
+
+    for s in xrange(S):
+        failure_SBW[s] = -numpy.expm1(log_survival_WSB[:, s, :].T)
+
+    gains_SB = numpy.sum(failure_SBW, axis = -1) / numpy.arange(1, B + 1)
+    queue = [(-gains_SB[s, b], s, b, 0) for s in xrange(S) for b in xrange(B)]
+
+    heapq.heapify(queue)
+
+    # plan
+    R = B
+    plan = []
+    plan_survival_W = numpy.ones(W)
+
+    while R > 0 and len(queue) > 0:
+        if deadline is not None and time.time() > deadline:
+            break
+
+        (negative_gain, s, b, evaluated) = heapq.heappop(queue)
+
+        if b >= R:
+            continue
+
+        if evaluated < len(plan):
+            gain = numpy.dot(plan_survival_W, failure_SBW[s, b]) / (b + 1)
+
+            heapq.heappush(queue, (-gain, s, b, len(plan)))
+        else:
+            plan.append((s, b))
+
+            plan_survival_W *= numpy.exp(log_survival_WSB[:, s, b])
+
+            heapq.heappush(queue, (negative_gain, s, b, len(plan) - 1))
+
+            R -= b + 1
+
+    return plan
+
+class LazyStreeterPlanner(Planner):
+    """Greedy approximate planner from Streeter et al., evaluated lazily."""
+
+    def __init__(self, time_limit = None):
+        Planner.__init__(self, lazy_streeter_plan, time_limit = time_limit)
+
 cdef struct PlannerState:
     int W
     int S
@@ -208,6 +539,9 @@ cdef object bellman_plan_full(PlannerState* this, int d):
 class BellmanPlanner(object):
     """Discretizing optimal planner."""
 
+    resumes = False
+    accepts_durations = False
+
     def plan(self, log_survival, log_weights = None):
         """Compute a plan."""
 
@@ -268,54 +602,673 @@ class BellmanPlanner(object):
 
         return plan
 
+    def start(self, log_survival, log_weights = None):
+        """Begin incremental planning."""
+
+        return PlanState(self, log_survival, log_weights)
+
+class SearchLimitReached(Exception):
+    """The planner exhausted its node or time limit."""
+
+class BranchBoundSearch(object):
+    """Memoized branch-and-bound search over sets of actions."""
+
+    def __init__(self, survival_SBW, resolution, node_limit = None, time_limit = None):
+        """Initialize."""
+
+        (S, B, W) = survival_SBW.shape
+
+        self._survival_SBW = survival_SBW
+        self._resolution = resolution
+        self._node_limit = node_limit
+        self._memo = {}
+        self.nodes = 0
+        self.best = (INFINITY, None)
+
+        if time_limit is None:
+            self._deadline = None
+        else:
+            self._deadline = time.time() + time_limit
+
+        # the best plan for each world alone bounds every plan from below
+        self._floors_WR = numpy.ones((W, B + 1))
+
+        for r in xrange(1, B + 1):
+            self._floors_WR[:, r] = self._floors_WR[:, r - 1]
+
+            for b in xrange(r):
+                floors_W = numpy.min(survival_SBW[:, b], axis = 0) * self._floors_WR[:, r - b - 1]
+
+                numpy.minimum(self._floors_WR[:, r], floors_W, self._floors_WR[:, r])
+
+    def search(self, r, k, belief_W, threshold, g = 0.0, prefix = []):
+        """
+        Find the best plan over r bins that starts at action k.
+
+        Returns its log failure probability and the plan, or None if no plan
+        scores below the threshold. The best complete plan seen, including
+        prefix, is tracked along the way.
+        """
+
+        (S, B, W) = self._survival_SBW.shape
+
+        self.nodes += 1
+
+        if self._node_limit is not None and self.nodes > self._node_limit:
+            raise SearchLimitReached()
+
+        if self._deadline is not None and time.time() > self._deadline:
+            raise SearchLimitReached()
+
+        # consult the cache
+        key = (r, k, numpy.round(belief_W / self._resolution).astype(numpy.int64).tostring())
+        cached = self._memo.get(key)
+
+        if cached is not None:
+            (value, plan, exact) = cached
+
+            if exact:
+                self._offer(g + value, prefix + plan)
+
+                return (value, plan) if value < threshold else None
+            elif value >= threshold:
+                return None
+
+        if numpy.log(numpy.dot(belief_W, self._floors_WR[:, r])) >= threshold:
+            self._memo[key] = (threshold, None, False)
+
+            return None
+
+        # expand the most promising actions first
+        failures_SR = numpy.dot(self._survival_SBW[:, :r], belief_W)
+        actions = [(s, b) for s in xrange(S) for b in xrange(r) if s * B + b >= k]
+        best = (0.0, []) if threshold > 0.0 else None
+        bound = threshold
+
+        for (s, b) in sorted(actions, key = lambda action: failures_SR[action]):
+            failure = failures_SR[s, b]
+
+            if failure <= 0.0:
+                best = (-INFINITY, [(s, b)])
+
+                break
+
+            log_failure = numpy.log(failure)
+            next_belief_W = belief_W * self._survival_SBW[s, b] / failure
+            found = \
+                self.search(
+                    r - b - 1,
+                    s * B + b,
+                    next_belief_W,
+                    bound - log_failure,
+                    g + log_failure,
+                    prefix + [(s, b)],
+                    )
+
+            if found is not None:
+                (value, plan) = found
+
+                best = (log_failure + value, [(s, b)] + plan)
+                bound = best[0]
+
+        # store the result
+        if best is None:
+            self._memo[key] = (threshold, None, False)
+        else:
+            self._memo[key] = (best[0], best[1], True)
+
+            self._offer(g + best[0], prefix + best[1])
+
+        return best
+
+    def _offer(self, value, plan):
+        """Record a complete plan if it is the best seen."""
+
+        if value < self.best[0]:
+            self.best = (value, plan)
+
+def pruned_bellman_plan(
+    log_survival_WSB,
+    log_weights_W,
+    bound_planner,
+    resolution = 1e-4,
+    node_limit = None,
+    time_limit = None,
+    ):
+    """
+    Plan by solving the Bellman equation over sets of actions.
+
+    Since the failure probability of a plan does not depend on the order of
+    its actions, only nondecreasing action sequences are searched. Subproblems
+    are cached on their discretized belief state; a plan from the bound
+    planner provides the initial incumbent. If the search exhausts its node
+    or time limit, the best plan found so far is returned.
+    """
+
+    # prepare
+    (W, S, B) = log_survival_WSB.shape
+
+    if B == 0:
+        return []
+
+    log_survival_swapped = numpy.asarray(log_survival_WSB.swapaxes(0, 1).swapaxes(1, 2), order = "C")
+    survival_SBW = numpy.exp(log_survival_swapped)
+    weights_W = numpy.exp(log_weights_W - numpy.logaddexp.reduce(log_weights_W))
+
+    # start from the bound planner's plan
+    bound_plan = bound_planner.plan(log_survival_WSB, log_weights_W)
+    bound_survival_W = numpy.ones(W)
+
+    for (s, b) in bound_plan:
+        bound_survival_W *= survival_SBW[s, b]
+
+    with numpy.errstate(divide = "ignore"):
+        bound_value = numpy.log(numpy.dot(weights_W, bound_survival_W))
+
+    search = BranchBoundSearch(survival_SBW, resolution, node_limit, time_limit)
+
+    search.best = (bound_value, bound_plan)
+
+    # and improve it
+    try:
+        with numpy.errstate(divide = "ignore", invalid = "ignore"):
+            search.search(B, 0, weights_W, bound_value)
+    except SearchLimitReached:
+        logger.info("planning search stopped after %i nodes; using best plan found", search.nodes)
+
+    (_, plan) = search.best
+
+    return plan
+
+class PrunedBellmanPlanner(Planner):
+    """Discretizing optimal planner, with memoization and pruning."""
+
+    def __init__(self, bound_planner = None, resolution = 1e-4, node_limit = None, time_limit = None):
+        if bound_planner is None:
+            bound_planner = KnapsackPlanner()
+
+        Planner.__init__(
+            self,
+            pruned_bellman_plan,
+            bound_planner = bound_planner,
+            resolution = resolution,
+            node_limit = node_limit,
+            time_limit = time_limit,
+            )
+
+def reordering_plan(log_survival_WSB, log_weights_W, inner_planner, durations = None):
+    """Plan, then heuristically reorder."""
+
+    if durations is None:
+        plan = inner_planner.plan(log_survival_WSB, log_weights_W)
+    else:
+        plan = inner_planner.plan(log_survival_WSB, log_weights_W, durations)
+
+    log_mean_fail_cmf_SB = numpy.logaddexp.reduce(log_survival_WSB + log_weights_W[:, None, None], axis = 0)
+
+    return reorder_plan(plan, log_mean_fail_cmf_SB, durations)
+
 class ReorderingPlanner(Planner):
     """Plan, then heuristically reorder."""
 
     def __init__(self, inner_planner):
         """Initialize."""
 
-        def compute_plan(log_survival_WSB, log_weights_W):
-            plan = inner_planner.plan(log_survival_WSB, log_weights_W)
-            log_mean_fail_cmf_SB = numpy.logaddexp.reduce(log_survival_WSB + log_weights_W[:, None, None], axis = 0)
+        Planner.__init__(self, reordering_plan, inner_planner = inner_planner)
+
+        self._inner_planner = inner_planner
+
+    @property
+    def accepts_durations(self):
+        """Does the inner planner support non-uniform bins?"""
 
-            def efficiency(pair):
-                (s, c) = pair
+        return self._inner_planner.accepts_durations
 
-                return log_mean_fail_cmf_SB[s, c] / (c + 1)
+    def start(self, log_survival, log_weights = None, durations = None):
+        """Begin incremental planning."""
 
-            return sorted(plan, key = efficiency)
+        if durations is None:
+            inner_state = self._inner_planner.start(log_survival, log_weights)
+        else:
+            inner_state = self._inner_planner.start(log_survival, log_weights, durations)
 
-        Planner.__init__(self, compute_plan)
+        return ReorderingPlanState(inner_state, durations)
+
+    def plan_batch(self, log_survival):
+        """Compute a single-world plan for each instance."""
+
+        plans = self._inner_planner.plan_batch(log_survival)
+
+        return [reorder_plan(plan, log_survival_SB) for (plan, log_survival_SB) in zip(plans, log_survival)]
+
+class ReorderingPlanState(object):
+    """Incremental planner state whose plans are heuristically reordered."""
+
+    def __init__(self, inner_state, durations = None):
+        self._inner_state = inner_state
+        self._durations = durations
+        self.B = inner_state.B
+
+    def condition(self, s, b):
+        """Condition on the failure of a run."""
+
+        self._inner_state.condition(s, b)
+
+    def plan(self, B):
+        """Compute a plan over the first B bins."""
+
+        plan = self._inner_state.plan(B)
+
+        return reorder_plan(plan, self._inner_state.log_mean_survival(B), self._durations)
+
+    def log_mean_survival(self, B):
+        """Compute the weighted mean survival function over the first B bins."""
+
+        return self._inner_state.log_mean_survival(B)
+
+def reorder_plan(plan, log_mean_fail_cmf_SB, durations = None):
+    """Order plan actions by decreasing efficiency."""
+
+    def efficiency(pair):
+        (s, c) = pair
+
+        if durations is None:
+            return log_mean_fail_cmf_SB[s, c] / (c + 1)
+        else:
+            return log_mean_fail_cmf_SB[s, c] / durations[c]
+
+    return sorted(plan, key = efficiency)
 
 class ReplanningPlanner(object):
     """Repeatedly replan."""
 
+    resumes = False
+    accepts_durations = False
+
     def __init__(self, inner_planner):
         self._inner_planner = inner_planner
 
     def plan(self, log_survival, log_weights = None):
-        # plan;
-        # take first solver;
-        # assume failure;
-        # add to survival function;
-        # repeat
-        # XXX
-        pass
+        """Compute a plan."""
+
+        (_, _, B) = log_survival.shape
+
+        state = self._inner_planner.start(log_survival, log_weights)
+        plan = []
+
+        while B > 0:
+            # take the first action of the inner plan, and assume its failure
+            inner_plan = state.plan(B)
+
+            if len(inner_plan) == 0:
+                break
+
+            (s, c) = inner_plan[0]
+
+            plan.append((s, c))
+            state.condition(s, c)
+
+            B -= c + 1
+
+        return plan
+
+    def start(self, log_survival, log_weights = None):
+        """Begin incremental planning."""
+
+        return PlanState(self, log_survival, log_weights)
+
+def resumed_log_survival(log_survival_WSB, progress_S, B):
+    """Compute the survival of continuing each solver from its progress."""
+
+    (W, S, C) = log_survival_WSB.shape
+
+    resumed_WSB = numpy.zeros((W, S, B))
+
+    for s in xrange(S):
+        p = progress_S[s]
+        n = max(0, min(B, C - p))
+
+        resumed_WSB[:, s, :n] = log_survival_WSB[:, s, p:p + n]
+
+        if p > 0:
+            with numpy.errstate(invalid = "ignore"):
+                resumed_WSB[:, s, :n] -= log_survival_WSB[:, s, p - 1, None]
+
+    # (worlds in which a solver has already succeeded have no weight)
+    resumed_WSB[numpy.isnan(resumed_WSB)] = 0.0
+
+    return resumed_WSB
+
+def resumption_plan(inner_planner, log_survival_WSB, log_weights_W, progress_S, B):
+    """Compute a plan by replanning over resumed solvers."""
+
+    log_weights_W = numpy.array(log_weights_W, numpy.double)
+    progress_S = numpy.array(progress_S, numpy.int)
+    plan = []
+
+    while B > 0:
+        # take the first action of the inner plan, and assume its failure
+        resumed_WSB = resumed_log_survival(log_survival_WSB, progress_S, B)
+        inner_plan = inner_planner.plan(resumed_WSB, log_weights_W)
+
+        if len(inner_plan) == 0:
+            break
+
+        (s, c) = inner_plan[0]
+
+        plan.append((s, c))
+
+        log_weights_W += resumed_WSB[:, s, c]
+        log_weights_W -= numpy.logaddexp.reduce(log_weights_W)
+        progress_S[s] += c + 1
+
+        B -= c + 1
+
+    return plan
 
 class ResumptionPlanner(object):
-    """Include solver resumption in planning."""
+    """
+    Include solver resumption in planning.
+
+    Each action (s, c) runs solver s for c + 1 more bins, continuing its
+    paused run if it has been run before.
+    """
+
+    resumes = True
+    accepts_durations = False
 
     def __init__(self, inner_planner):
         self._inner_planner = inner_planner
 
     def plan(self, log_survival, log_weights = None):
-        # plan;
-        # take first solver;
-        # assume failure;
-        # add to survival function;
-        # repeat
-        # XXX
-        pass
+        """Compute a plan."""
+
+        (W, S, B) = log_survival.shape
+
+        if log_weights is None:
+            log_weights = -numpy.ones(W) * numpy.log(W)
+
+        return resumption_plan(self._inner_planner, log_survival, log_weights, numpy.zeros(S, numpy.int), B)
+
+    def start(self, log_survival, log_weights = None):
+        """Begin incremental planning."""
+
+        return ResumptionPlanState(self._inner_planner, log_survival, log_weights)
+
+class ResumptionPlanState(PlanState):
+    """Beliefs and solver progress carried between resumption plans."""
+
+    def __init__(self, inner_planner, log_survival, log_weights = None):
+        """Initialize."""
+
+        PlanState.__init__(self, inner_planner, log_survival, log_weights)
+
+        (_, S, _) = log_survival.shape
+
+        self._progress_S = numpy.zeros(S, numpy.int)
+
+    def condition(self, s, b):
+        """Condition on the failure of a (possibly resumed) run."""
+
+        resumed_WSB = resumed_log_survival(self._log_survival_WSB, self._progress_S, b + 1)
+
+        self._log_weights_W += resumed_WSB[:, s, b]
+        self._log_weights_W -= numpy.logaddexp.reduce(self._log_weights_W)
+        self._progress_S[s] += b + 1
+
+    def plan(self, B):
+        """Compute a plan over the next B bins."""
+
+        return \
+            resumption_plan(
+                self._planner,
+                self._log_survival_WSB,
+                self._log_weights_W,
+                self._progress_S,
+                B,
+                )
+
+def plans_log_survival(log_survival_WSB, plans):
+    """Compute the log survival of each world under a set of plans."""
+
+    (W, _, _) = log_survival_WSB.shape
+
+    log_survival_W = numpy.zeros(W)
+
+    for plan in plans:
+        for (s, b) in plan:
+            log_survival_W += log_survival_WSB[:, s, b]
+
+    return log_survival_W
+
+def parallel_plan(log_survival_WSB, log_weights_W, inner_planner, cores, rounds = 2, durations = None):
+    """
+    Compute a plan for each of several cores.
+
+    The probability that every run fails does not depend on which core
+    performs which run, so each core is planned in turn, with the world
+    weights conditioned on the failure of every other core's plan; later
+    rounds revisit each core given the rest, keeping any improvement.
+    """
+
+    plans = [[] for _ in xrange(cores)]
+    log_failure = numpy.logaddexp.reduce(log_weights_W)
+
+    for r in xrange(rounds):
+        for p in xrange(cores):
+            others = plans[:p] + plans[p + 1:]
+            conditioned_W = log_weights_W + plans_log_survival(log_survival_WSB, others)
+            log_normalizer = numpy.logaddexp.reduce(conditioned_W)
+
+            if log_normalizer == -INFINITY:
+                continue
+
+            if durations is None:
+                plan = inner_planner.plan(log_survival_WSB, conditioned_W - log_normalizer)
+            else:
+                plan = inner_planner.plan(log_survival_WSB, conditioned_W - log_normalizer, durations)
+            log_failure_p = numpy.logaddexp.reduce(conditioned_W + plans_log_survival(log_survival_WSB, [plan]))
+
+            if r == 0 or log_failure_p < log_failure:
+                plans[p] = plan
+                log_failure = log_failure_p
+
+    return plans
+
+class ParallelPlanner(object):
+    """Plan over several cores."""
+
+    def __init__(self, inner_planner = None, rounds = 2):
+        if inner_planner is None:
+            inner_planner = ReorderingPlanner(KnapsackPlanner())
+
+        self._inner_planner = inner_planner
+        self._rounds = rounds
+
+    @property
+    def accepts_durations(self):
+        """Does the inner planner support non-uniform bins?"""
+
+        return self._inner_planner.accepts_durations
+
+    def plan(self, log_survival, log_weights = None, cores = 1, durations = None):
+        """Compute a list of plans, one per core."""
+
+        (W, _, _) = log_survival.shape
+
+        if log_weights is None:
+            log_weights = -numpy.ones(W) * numpy.log(W)
+
+        if durations is not None and not self.accepts_durations:
+            raise ValueError("{0} does not support non-uniform bins".format(type(self._inner_planner).__name__))
+
+        return parallel_plan(log_survival, log_weights, self._inner_planner, cores, self._rounds, durations)
+
+class CachingPlanner(object):
+    """
+    Plan through a bounded cache of earlier plans.
+
+    Plans are keyed on a digest of the survival function and of the initial
+    world log-weights, quantized to a relative resolution, and on the number
+    of bins and the failures conditioned on since. The fingerprint of the
+    most recent survival function is remembered, so that planning repeatedly
+    against one model hashes it only once. The cache is pickled with the
+    planner.
+    """
+
+    def __init__(self, inner_planner, size = 1024, resolution = 1e-3):
+        """Initialize."""
+
+        self._inner_planner = inner_planner
+        self._size = size
+        self._resolution = resolution
+        self._plans = collections.OrderedDict()
+        self._fingerprinted = None
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+
+        state["_fingerprinted"] = None
+
+        return state
+
+    def plan(self, log_survival, log_weights = None, durations = None):
+        """Compute a plan."""
+
+        (_, _, B) = log_survival.shape
+
+        return self.start(log_survival, log_weights, durations).plan(B)
+
+    def start(self, log_survival, log_weights = None, durations = None):
+        """Begin incremental planning."""
+
+        return CachingPlanState(self, log_survival, log_weights, durations)
+
+    def fingerprint(self, log_survival, durations = None):
+        """Hash a survival function, and its bin durations, if any."""
+
+        if self._fingerprinted is not None:
+            (last_survival, last_durations, fingerprint) = self._fingerprinted
+
+            if last_survival is log_survival and last_durations is durations:
+                return fingerprint
+
+        digest = hashlib.sha1(numpy.ascontiguousarray(log_survival, numpy.double).tostring())
+
+        if durations is not None:
+            digest.update(numpy.ascontiguousarray(durations, numpy.double).tostring())
+
+        fingerprint = digest.hexdigest()
+
+        self._fingerprinted = (log_survival, durations, fingerprint)
+
+        return fingerprint
+
+    def key(self, log_survival, log_weights, durations = None):
+        """Digest the part of a cache key fixed at the start of planning."""
+
+        (W, _, _) = log_survival.shape
+
+        if log_weights is None:
+            log_weights = -numpy.ones(W) * numpy.log(W)
+
+        # quantize in the log domain, so that the resolution is relative
+        log_weights_W = numpy.asarray(log_weights, numpy.double)
+        log_weights_W = log_weights_W - numpy.logaddexp.reduce(log_weights_W)
+        finite_W = numpy.isfinite(log_weights_W)
+        quantized_W = numpy.zeros(W, numpy.int64)
+
+        quantized_W[finite_W] = numpy.round(log_weights_W[finite_W] / self._resolution)
+        quantized_W[~finite_W] = numpy.iinfo(numpy.int64).min
+
+        digest = hashlib.sha1(self.fingerprint(log_survival, durations))
+
+        digest.update(quantized_W.tostring())
+
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Look up a plan, or return None."""
+
+        plan = self._plans.pop(key, None)
+
+        if plan is None:
+            return None
+        else:
+            self._plans[key] = plan
+
+            return list(plan)
+
+    def put(self, key, plan):
+        """Store a plan, evicting the least recently used if necessary."""
+
+        self._plans.pop(key, None)
+
+        self._plans[key] = list(plan)
+
+        while len(self._plans) > self._size:
+            self._plans.popitem(last = False)
+
+    @property
+    def resumes(self):
+        """Does the inner planner resume solvers?"""
+
+        return self._inner_planner.resumes
+
+    @property
+    def accepts_durations(self):
+        """Does the inner planner support non-uniform bins?"""
+
+        return self._inner_planner.accepts_durations
+
+class CachingPlanState(object):
+    """Failures carried between calls to a caching planner."""
+
+    def __init__(self, planner, log_survival, log_weights = None, durations = None):
+        """Initialize."""
+
+        (_, _, B) = log_survival.shape
+
+        self._planner = planner
+        self._log_survival = log_survival
+        self._log_weights = log_weights
+        self._durations = durations
+        self._key = planner.key(log_survival, log_weights, durations)
+        self._failures = []
+        self._inner_state = None
+        self.B = B
+
+    def condition(self, s, b):
+        """Condition on the failure of a run."""
+
+        self._failures.append((s, b))
+
+        if self._inner_state is not None:
+            self._inner_state.condition(s, b)
+
+    def plan(self, B):
+        """Compute a plan over the first B bins."""
+
+        key = (self._key, min(B, self.B), tuple(self._failures))
+        plan = self._planner.get(key)
+
+        if plan is None:
+            if self._inner_state is None:
+                inner_planner = self._planner._inner_planner
+
+                if self._durations is None:
+                    self._inner_state = inner_planner.start(self._log_survival, self._log_weights)
+                else:
+                    self._inner_state = inner_planner.start(self._log_survival, self._log_weights, self._durations)
+
+                for (s, b) in self._failures:
+                    self._inner_state.condition(s, b)
+
+            plan = self._inner_state.plan(B)
+
+            self._planner.put(key, plan)
+
+        return plan
 
 default = ReorderingPlanner(KnapsackPlanner())
 
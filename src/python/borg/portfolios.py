@@ -1,5 +1,6 @@
 """@author: Bryan Silverthorn <bcs@cargo-cult.org>"""
 
+import Queue
 import itertools
 import numpy
 import borg
@@ -50,13 +51,14 @@ class BaselinePortfolio(object):
         """Initialize."""
 
         solver_names = list(suite.solvers)
-        outcome_counts = training.to_bins_array(solver_names, 1).astype(numpy.double)
+        count = 30
+        (outcome_counts, bins) = training.to_bins_arrays(solver_names, [1, count])
+        outcome_counts = outcome_counts.astype(numpy.double)
         success_rates = outcome_counts[..., 0] / numpy.sum(outcome_counts, axis = -1)
         mean_rates = numpy.mean(success_rates, axis = 0)
 
         # XXX hackishly break ties according to run time
-        count = 30
-        bins = training.to_bins_array(solver_names, count).astype(numpy.double)
+        bins = bins.astype(numpy.double)
         wbins = numpy.mean(bins[..., :-1] * numpy.arange(count), axis = -1)
         mean_rates -= numpy.mean(wbins, axis = 0) * 1e-8
 
@@ -72,9 +74,12 @@ class BaselinePortfolio(object):
 class OraclePortfolio(object):
     """Optimal prescient discrete-budget portfolio."""
 
-    def __init__(self, planner = borg.planners.default):
+    def __init__(self, planner = borg.planners.default, plan_cache_size = 1024):
         """Initialize."""
 
+        if plan_cache_size > 0:
+            planner = borg.planners.CachingPlanner(planner, plan_cache_size)
+
         self._planner = planner
 
     def __call__(self, task, suite, budget):
@@ -158,61 +163,234 @@ class PreplanningPortfolio(object):
         return None
 
 class PureModelPortfolio(object):
-    """Hybrid mixture-model portfolio."""
-
-    def __init__(self, suite, model, regress = None, planner = borg.planners.default):
+    """
+    Hybrid mixture-model portfolio.
+
+    On a single core, solvers are run in sequence, replanning after each
+    failure; on several, a plan is made for each core at the outset, and the
+    cores' plans are run concurrently.
+
+    To run on several cores, each entry of suite.solvers must be a factory,
+    called as factory(task, stm_queue = queue, solver_id = id), that returns
+    a solver with unpause_for(budget) and stop() methods and reports on the
+    queue in the manner of borg.solver_io.RunningSolver.
+    """
+
+    def __init__(
+        self,
+        suite,
+        model,
+        regress = None,
+        planner = borg.planners.default,
+        plan_cache_size = 1024,
+        parallel_planner = None,
+        ):
         """Initialize."""
 
+        if model.edges is not None and not planner.accepts_durations:
+            raise ValueError("planner does not support the non-uniform bins of this model")
+
+        if parallel_planner is None:
+            # (runs are not resumed across cores)
+            if planner.resumes:
+                parallel_planner = borg.planners.ParallelPlanner()
+            else:
+                parallel_planner = borg.planners.ParallelPlanner(planner)
+
+        if plan_cache_size > 0:
+            planner = borg.planners.CachingPlanner(planner, plan_cache_size)
+
         self._model = model
         self._regress = regress
         self._planner = planner
+        self._parallel_planner = parallel_planner
         self._solver_names = sorted(suite.solvers)
         self._runs_limit = 256
 
-    def __call__(self, task, suite, budget):
+    def __call__(self, task, suite, budget, cores = 1):
         """Run the portfolio."""
 
+        if cores > 1:
+            return self._run_parallel(task, suite, budget, cores)
+
         with borg.accounting() as accountant:
             # predict RTD weights
-            if self._regress is None:
-                initial_model = self._model
-            else:
-                (feature_names, feature_values) = suite.domain.compute_features(task)
-                feature_dict = dict(zip(feature_names, feature_values))
-                feature_values_sorted = [feature_dict[f] for f in sorted(feature_names)]
-                (predicted_weights,) = numpy.log(self._regress.predict([task], [feature_values_sorted]))
-                initial_model = self._model.with_weights(predicted_weights)
+            initial_model = self._predict_model(task, suite)
 
             # compute and execute a solver schedule
+            # (the planner state is conditioned on each failure in place)
+            durations = initial_model.durations
+
+            if initial_model.edges is None:
+                planning = self._planner.start(initial_model.log_survival, initial_model.log_weights)
+            else:
+                planning = self._planner.start(initial_model.log_survival, initial_model.log_weights, durations)
+
             plan = []
-            failures = []
-
-            for i in xrange(self._runs_limit):
-                elapsed = accountant.total.cpu_seconds
-
-                if budget.cpu_seconds <= elapsed:
-                    break
-
-                if len(plan) == 0:
-                    model = initial_model.condition(failures)
-                    remaining = budget.cpu_seconds - elapsed
-                    remaining_b = int(numpy.ceil(remaining / model.interval))
-                    plan = \
-                        self._planner.plan(
-                            model.log_survival[..., :remaining_b],
-                            model.log_weights,
-                            )
-
-                (s, b) = plan.pop(0)
-                remaining = budget.cpu_seconds - accountant.total.cpu_seconds
-                duration = min(remaining, (b + 1) * model.interval)
-                process = suite.solvers[self._solver_names[s]].start(task)
-                answer = process.run_then_stop(duration)
+            paused = {}
+            progress = numpy.zeros(len(self._solver_names), numpy.int)
+            (C,) = durations.shape
+
+            try:
+                for i in xrange(self._runs_limit):
+                    elapsed = accountant.total.cpu_seconds
+
+                    if budget.cpu_seconds <= elapsed:
+                        break
+
+                    if len(plan) == 0:
+                        # (non-uniform bins may be wide, so never plan past the budget)
+                        remaining = budget.cpu_seconds - elapsed
+
+                        if initial_model.edges is None:
+                            remaining_b = int(numpy.ceil(remaining / initial_model.interval))
+                        else:
+                            remaining_b = int(numpy.searchsorted(durations, remaining * (1.0 + 1e-9), side = "right"))
+
+                        if remaining_b == 0:
+                            break
+
+                        plan = planning.plan(remaining_b)
+
+                        if len(plan) == 0:
+                            break
+
+                    (s, b) = plan.pop(0)
+                    remaining = budget.cpu_seconds - accountant.total.cpu_seconds
+
+                    if self._planner.resumes:
+                        # (the planner picks a finished solver only if nothing else can help)
+                        p = progress[s]
+
+                        if p >= C:
+                            break
+
+                        # a resumed run covers the bins after those it has run
+                        duration = durations[min(p + b, C - 1)] - (durations[p - 1] if p > 0 else 0.0)
+                    else:
+                        duration = durations[b]
+
+                    duration = min(remaining, duration)
+
+                    if s in paused:
+                        process = paused.pop(s)
+                    else:
+                        process = suite.solvers[self._solver_names[s]].start(task)
+
+                    if self._planner.resumes:
+                        answer = process.run_then_pause(duration)
+
+                        if not process.terminated:
+                            paused[s] = process
+                    else:
+                        answer = process.run_then_stop(duration)
+
+                    if suite.domain.is_final(task, answer):
+                        return answer
+                    else:
+                        planning.condition(s, b)
+
+                        if self._planner.resumes:
+                            progress[s] += b + 1
+
+                            # a solver that gave up fails in every bin it has left
+                            if process.terminated and progress[s] < C:
+                                planning.condition(s, C - progress[s] - 1)
+
+                                progress[s] = C
+            finally:
+                for process in paused.values():
+                    process.stop()
+
+            return None
+
+    def _predict_model(self, task, suite):
+        """Predict the RTD weights for a task."""
+
+        if self._regress is None:
+            return self._model
+        else:
+            (feature_names, feature_values) = suite.domain.compute_features(task)
+            feature_dict = dict(zip(feature_names, feature_values))
+            feature_values_sorted = [feature_dict[f] for f in sorted(feature_names)]
+            (predicted_weights,) = numpy.log(self._regress.predict([task], [feature_values_sorted]))
+
+            return self._model.with_weights(predicted_weights)
+
+    def _run_parallel(self, task, suite, budget, cores):
+        """
+        Run a plan on each of several cores, concurrently.
+
+        The budget is of CPU time across every core. Each core is planned over
+        an equal share of it, and no run is granted more than the budget less
+        the time spent, and granted to the other running solvers, so far.
+        """
+
+        # predict RTD weights, and plan for each core
+        model = self._predict_model(task, suite)
+        durations = model.durations
+        share = budget.cpu_seconds / cores
+
+        if model.edges is None:
+            B = int(numpy.ceil(share / model.interval))
+        else:
+            B = int(numpy.searchsorted(durations, share * (1.0 + 1e-9), side = "right"))
+
+        if B == 0:
+            return None
+        elif model.edges is None:
+            plans = self._parallel_planner.plan(model.log_survival[..., :B], model.log_weights, cores)
+        else:
+            plans = self._parallel_planner.plan(model.log_survival[..., :B], model.log_weights, cores, durations[:B])
+
+        logger.info("per-core plans: %s", plans)
+
+        # run each core's plan, concurrently
+        stm_queue = Queue.Queue()
+        solver_ids = itertools.count()
+        running = {}
+        granted = {}
+        spent = 0.0
+
+        def run_next(core):
+            available = budget.cpu_seconds - spent - sum(granted.values())
+
+            if len(plans[core]) > 0 and available > 0.0:
+                (s, b) = plans[core].pop(0)
+                solver_id = solver_ids.next()
+                solver = suite.solvers[self._solver_names[s]](task, stm_queue = stm_queue, solver_id = solver_id)
+                running[solver_id] = (core, solver)
+                granted[solver_id] = min(durations[b], available)
+
+                solver.unpause_for(granted[solver_id])
+
+        try:
+            for core in xrange(cores):
+                run_next(core)
+
+            while len(running) > 0:
+                response = stm_queue.get()
+
+                if isinstance(response, Exception):
+                    raise response
+
+                (solver_id, run_cpu_cost, answer, terminated) = response
+                (core, solver) = running.pop(solver_id)
+
+                solver.stop()
+
+                borg.get_accountant().charge_cpu(run_cpu_cost)
+
+                del granted[solver_id]
+
+                spent += run_cpu_cost
 
                 if suite.domain.is_final(task, answer):
                     return answer
-                else:
-                    failures.append((s, b))
 
-            return None
+                run_next(core)
+        finally:
+            for (_, solver) in running.values():
+                solver.stop()
 
+        return None
@@ -3,13 +3,13 @@
 import os.path
 import uuid
 import time
+import Queue
+import atexit
 import shutil
 import signal
-import select
-import random
 import tempfile
 import datetime
-import multiprocessing
+import threading
 import numpy
 import borg
 
@@ -20,134 +20,444 @@ def random_seed():
 
     return numpy.random.randint(0, 2**31)
 
-def timed_read(fds, timeout = -1):
-    """Read from multiple descriptors with an optional timeout."""
+class SolverRun(object):
+    """A solver session, and its budget, under the supervisor."""
+
+    def __init__(self, parse_output, arguments, stm_queue, solver_id, cwd, tmpdir = None, slot = None):
+        self.parse_output = parse_output
+        self.arguments = arguments
+        self.stm_queue = stm_queue
+        self.solver_id = solver_id
+        self.cwd = cwd
+        self.tmpdir = tmpdir
+        self.slot = slot
+        self.popened = None
+        self.accountant = None
+        self.limit = 0.0
+        self.expenditure = datetime.timedelta()
+        self.last_expenditure = self.expenditure
+        self.last_audit = None
+        self.stdout = []
+        self.paused = True
+        self.terminated = False
+
+    def spawn(self):
+        """Start the solver session."""
+
+        if self.cwd is None:
+            logger.info("running %s", self.arguments)
+        else:
+            logger.info("running %s under %s", self.arguments, self.cwd)
+
+        if self.slot is None:
+            (self.popened, self.accountant) = borg.unix.accounting.spawn_accounted_session(self.arguments, cwd = self.cwd)
+        else:
+            (slot, accountant) = self.slot
+
+            self.slot = None
+
+            try:
+                slot.execute(self.arguments, cwd = self.cwd)
+            except:
+                accountant.close()
+
+                raise
+
+            (self.popened, self.accountant) = (slot, accountant)
+
+    def dismiss(self):
+        """Release an unused warm slot."""
+
+        if self.slot is not None:
+            (slot, accountant) = self.slot
+
+            self.slot = None
+
+            slot.close()
+            accountant.close()
+
+    def next_audit(self):
+        """Return the time at which the session is next due an audit."""
+
+        left = self.limit - borg.util.seconds(self.expenditure)
+
+        return self.last_audit + min(left, borg.defaults.proc_poll_period)
 
-    # poll for I/O events
-    polling = select.poll()
+    def audit(self):
+        """Update the session CPU expenditure."""
+
+        self.accountant.audit()
+
+        self.expenditure = self.accountant.total
+        self.last_audit = time.time()
+
+    def charge_exit(self, usage):
+        """Charge the session at least its leader's final usage."""
+
+        self.accountant.settle(self.popened.pid, usage)
+
+    def run_cost(self):
+        """Return the CPU seconds spent since the run was last unpaused."""
+
+        return borg.util.seconds(self.expenditure - self.last_expenditure)
+
+class SolverSupervisor(object):
+    """
+    Run, pause, resume and account for every solver session from one thread.
+
+    Other threads hand requests to the supervisor thread, which multiplexes
+    solver output and exits through a single session monitor, and reports
+    each pause or termination on the run's queue. If it is started from the
+    main thread, the supervisor also wakes as soon as any solver exits.
+
+    The supervisor optionally keeps a warm pool of session slots: processes
+    already forked into their own sessions, with their temporary directories
+    created, that need only execute a solver. Slots are replaced as they are
+    taken, between runs, by the supervisor thread.
+
+    If the supervisor loop itself fails, every session is killed, the error
+    is reported on the queue of every live run, and later requests to run a
+    solver raise RuntimeError.
+    """
+
+    def __init__(self, slots = None):
+        """Initialize, and start the supervisor thread."""
+
+        if slots is None:
+            slots = borg.defaults.solver_pool_size
+
+        self._monitor = borg.unix.sessions.SessionMonitor()
+        self._requests = Queue.Queue()
+        self._runs = {}
+        self._sessions = {}
+        self._slots = []
+        self._slots_wanted = slots
+        self._lock = threading.Lock()
+        self._running = True
+        self._closed = False
+        self._failure = None
+        self.pid = os.getpid()
+
+        try:
+            self._monitor.watch_children()
+        except ValueError:
+            logger.debug("not started from the main thread; solver exits noticed only at audits")
 
-    for fd in fds:
-        polling.register(fd, select.POLLIN)
+        self._thread = threading.Thread(target = self._supervise, name = "solver supervisor")
+        self._thread.daemon = True
 
-    changed = dict(polling.poll(timeout * 1000))
+        self._thread.start()
 
-    # and interpret them
-    def make_read(fd):
-        revents = changed.get(fd, 0)
+        atexit.register(self.close)
 
-        if revents & select.POLLIN:
-            return os.read(fd, 65536)
-        elif revents & select.POLLHUP:
-            return ""
+        if slots > 0:
+            self._request(self._replenish)
+
+    def take_slot(self):
+        """Return a warm session slot and its accountant, or None."""
+
+        try:
+            slot = self._slots.pop()
+        except IndexError:
+            slot = None
+
+        if self._slots_wanted > 0:
+            self._request(self._replenish)
+
+        return slot
+
+    def unpause_for(self, run, budget):
+        """Grant a run more CPU time, starting it if necessary."""
+
+        if self._failure is not None:
+            raise RuntimeError("the solver supervisor failed: {0}".format(self._failure))
+
+        if run.popened is None:
+            run.spawn()
+
+        if not self._request(self._unpause, run, budget):
+            self.stop(run)
+
+            raise RuntimeError("the solver supervisor failed: {0}".format(self._failure))
+
+    def stop(self, run):
+        """Terminate a run, and wait until it has been terminated."""
+
+        done = threading.Event()
+
+        if self._request(self._stop, run, done):
+            done.wait()
         else:
-            return None
-
-    return map(make_read, fds)
-
-class SolverProcess(multiprocessing.Process):
-    """Attempt to solve the task in a subprocess."""
-
-    def __init__(self, parse_output, arguments, stm_queue, mts_queue, solver_id, tmpdir, cwd):
-        self._parse_output = parse_output
-        self._arguments = arguments
-        self._stm_queue = stm_queue
-        self._mts_queue = mts_queue
-        self._solver_id = solver_id
-        self._tmpdir = tmpdir
-        self._seed = random_seed()
-        self._popened = None
-        self._cwd = cwd
-
-        if self._cwd is None:
-            logger.info("running %s", arguments)
+            # the supervisor thread has failed, so stop the run from this one
+            self._thread.join()
+            self._stop(run, done)
+
+    def close(self):
+        """Kill every remaining session, and stop the supervisor thread."""
+
+        if os.getpid() != self.pid or self._closed:
+            return
+
+        if self._thread.is_alive():
+            self._request(self._shutdown)
+            self._thread.join()
         else:
-            logger.info("running %s under %s", arguments, cwd)
+            self._shutdown()
+
+        self._closed = True
+
+        self._monitor.close()
+
+    def _request(self, method, *arguments):
+        """Hand a request to the supervisor thread; return False if it has failed."""
+
+        if self._closed:
+            raise RuntimeError("the solver supervisor has been closed")
+
+        with self._lock:
+            if self._failure is not None:
+                return False
+
+            self._requests.put((method, arguments))
 
-        multiprocessing.Process.__init__(self)
+        self._monitor.wake()
 
-    def run(self):
-        numpy.random.seed(self._seed)
-        random.seed(numpy.random.randint(2**31))
+        return True
+
+    def _supervise(self):
+        """Run the supervisor loop, failing cleanly on any unexpected error."""
 
         try:
-            class DeathRequestedError(Exception):
-                pass
+            self._loop()
+        except Exception, error:
+            logger.exception("solver supervisor failed")
 
-            try:
-                def handle_sigusr1(number, frame):
-                    raise DeathRequestedError()
+            self._fail(error)
 
+    def _loop(self):
+        """Run the supervisor loop."""
+
+        while self._running:
+            # handle requests from other threads
+            while True:
                 try:
-                    signal.signal(signal.SIGUSR1, handle_sigusr1)
+                    (method, arguments) = self._requests.get_nowait()
+                except Queue.Empty:
+                    break
+
+                try:
+                    method(*arguments)
+                except Exception, error:
+                    logger.warning("solver supervisor request failed: %s", error)
+
+            if not self._running:
+                break
+
+            # wait for output or exits, but no longer than until the next audit
+            deadlines = [run.next_audit() for run in self._runs.values() if not run.paused]
 
-                    self.handle_subsolver()
+            if deadlines:
+                timeout = max(0.0, min(deadlines) - time.time())
+            else:
+                timeout = -1
+
+            for (solver_id, kind, data) in self._monitor.wait(timeout):
+                run = self._runs.get(solver_id)
+
+                if run is None:
+                    continue
+                elif kind == "stdout":
+                    if data == "":
+                        run.terminated = True
+                    else:
+                        run.stdout.append(data)
+                elif kind == "exit":
+                    (_, usage) = data
+
+                    run.terminated = True
+
+                    run.charge_exit(usage)
+
+            # audit, and pause or retire, runs
+            for run in self._runs.values():
+                if not run.paused:
+                    try:
+                        self._check(run)
+                    except Exception, error:
+                        self._retire(run)
+
+                        run.stm_queue.put(error)
+
+    def _unpause(self, run, budget):
+        """Grant a run more CPU time; report it if it has already terminated."""
+
+        try:
+            if run.terminated:
+                # charge whatever it spent between its pause and its exit
+                run.last_expenditure = run.expenditure
+
+                run.audit()
+
+                self._retire(run)
+
+                answer = run.parse_output("".join(run.stdout))
+
+                run.stm_queue.put((run.solver_id, run.run_cost(), answer, True))
+            else:
+                if run.solver_id in self._runs:
+                    os.kill(run.popened.pid, signal.SIGCONT)
+                else:
+                    self._runs[run.solver_id] = run
+                    self._sessions[run.solver_id] = run
+
+                    self._monitor.add(run.solver_id, run.popened)
+
+                run.limit += budget
+                run.last_expenditure = run.expenditure
+                run.last_audit = time.time()
+                run.paused = False
+        except Exception, error:
+            self._retire(run)
+
+            run.stm_queue.put(error)
+
+    def _check(self, run):
+        """Audit a running session; report its pause or termination."""
+
+        if run.terminated or time.time() >= run.next_audit():
+            run.audit()
+
+        if run.terminated:
+            self._retire(run)
+
+            answer = run.parse_output("".join(run.stdout))
+
+            run.stm_queue.put((run.solver_id, run.run_cost(), answer, True))
+        elif run.expenditure >= datetime.timedelta(seconds = run.limit):
+            os.kill(run.popened.pid, signal.SIGSTOP)
+
+            run.paused = True
+
+            run.stm_queue.put((run.solver_id, run.run_cost(), None, False))
+
+    def _stop(self, run, done):
+        """Terminate a run."""
+
+        try:
+            self._retire(run)
+            self._sessions.pop(run.solver_id, None)
+
+            run.dismiss()
+
+            popened = run.popened
+
+            if popened is not None:
+                # kill every process in the session, not only its leader
+                try:
+                    run.accountant.kill()
                 finally:
-                    signal.signal(signal.SIGUSR1, signal.SIG_IGN)
-            except DeathRequestedError:
-                pass
-            except Exception, error:
-                self._stm_queue.put(error)
-        except KeyboardInterrupt:
-            pass
+                    if popened.returncode is None:
+                        popened.kill()
+
+                        os.kill(popened.pid, signal.SIGCONT)
+
+                        popened.wait()
+
+                    popened.stdout.close()
+                    popened.stderr.close()
+
+                    run.accountant.close()
+
+                    run.popened = None
+
+            if run.tmpdir is not None:
+                shutil.rmtree(run.tmpdir, ignore_errors = True)
         finally:
-            if self._popened is not None:
-                self._popened.kill()
+            done.set()
 
-                os.kill(self._popened.pid, signal.SIGCONT)
+    def _replenish(self):
+        """Refill the pool of warm session slots."""
 
-                self._popened.wait()
+        try:
+            while len(self._slots) < self._slots_wanted:
+                self._slots.append(borg.unix.accounting.fork_accounted_slot())
+        except EnvironmentError, error:
+            logger.warning("disabling warm solver slots: %s", error)
 
-            shutil.rmtree(self._tmpdir, ignore_errors = True)
+            self._slots_wanted = 0
 
-    def handle_subsolver(self):
-        # spawn solver
-        limit = 0.0
-        stdout = ""
-        expenditure = datetime.timedelta(seconds = limit)
-        last_expenditure = expenditure
-        last_audit = time.time() - 1.0
+    def _retire(self, run):
+        """Stop supervising a run."""
 
-        while limit == 0.0 or self._popened is not None:
-            if expenditure >= datetime.timedelta(seconds = limit):
-                if self._popened is not None:
-                    os.kill(popened.pid, signal.SIGSTOP)
+        if self._runs.pop(run.solver_id, None) is not None:
+            self._monitor.discard(run.solver_id)
 
-                    run_cost = borg.util.seconds(expenditure - last_expenditure)
-                    self._stm_queue.put((self._solver_id, run_cost, None, False))
+        run.paused = True
+        run.terminated = True
 
-                additional = self._mts_queue.get()
-                limit += additional
-                last_expenditure = expenditure
+    def _fail(self, error):
+        """Kill every session, and report a supervisor failure to every waiter."""
 
-                if self._popened is None:
-                    popened = borg.unix.sessions.spawn_pipe_session(self._arguments, cwd = self._cwd)
-                    self._popened = popened
+        with self._lock:
+            self._failure = error
 
-                    descriptors = [popened.stdout.fileno(), popened.stderr.fileno()]
-                    accountant = borg.unix.accounting.SessionTimeAccountant(popened.pid)
-                else:
-                    os.kill(popened.pid, signal.SIGCONT)
+        # answer the requests that will now never be handled
+        while True:
+            try:
+                (method, arguments) = self._requests.get_nowait()
+            except Queue.Empty:
+                break
+
+            if method == self._stop:
+                (_, done) = arguments
 
-            # spend some time waiting for output
-            (chunk, _) = timed_read(descriptors, 1.0)
+                done.set()
+            elif method == self._unpause:
+                (run, _) = arguments
 
-            if time.time() - last_audit > borg.defaults.proc_poll_period:
-                accountant.audit()
+                self._sessions[run.solver_id] = run
 
-                expenditure = accountant.total
-                last_audit = time.time()
+                run.stm_queue.put(error)
 
-            # check for termination
-            if chunk == "":
-                self._popened = None
-            elif chunk is not None:
-                stdout += chunk
+        # report the failure to every running solver
+        for run in self._runs.values():
+            run.stm_queue.put(error)
 
-        # provide the outcome to the central planner
-        answer = self._parse_output(stdout)
-        run_cost = borg.util.seconds(expenditure - last_expenditure)
+        self._shutdown()
 
-        self._stm_queue.put((self._solver_id, run_cost, answer, True))
+    def _shutdown(self):
+        """Kill every remaining session and warm slot, and stop supervising."""
+
+        try:
+            for run in self._sessions.values():
+                try:
+                    self._stop(run, threading.Event())
+                except Exception, error:
+                    logger.warning("failed to stop solver run %s: %s", run.solver_id, error)
+
+            self._slots_wanted = 0
+
+            while self._slots:
+                (slot, accountant) = self._slots.pop()
+
+                slot.close()
+                accountant.close()
+        finally:
+            self._running = False
+
+supervisor = None
+supervisor_lock = threading.Lock()
+
+def get_supervisor():
+    """Return the solver supervisor of this process, starting it if necessary."""
+
+    global supervisor
+
+    with supervisor_lock:
+        if supervisor is None or supervisor.pid != os.getpid():
+            supervisor = SolverSupervisor()
+
+        return supervisor
 
 def prepare(command, root, cnf_path, tmpdir):
     """Format command for execution."""
@@ -177,7 +487,7 @@ class RunningSolver(object):
         """Initialize."""
 
         if stm_queue is None:
-            self._stm_queue = multiprocessing.Queue()
+            self._stm_queue = Queue.Queue()
         else:
             self._stm_queue = stm_queue
 
@@ -186,18 +496,22 @@ class RunningSolver(object):
         else:
             self._solver_id = solver_id
 
-        self._mts_queue = multiprocessing.Queue()
-        self._tmpdir = tempfile.mkdtemp(prefix = "borg.")
+        slot = get_supervisor().take_slot()
+
+        if slot is None:
+            self._tmpdir = tempfile.mkdtemp(prefix = "borg.")
+        else:
+            self._tmpdir = slot[0].tmpdir
 
-        self._process = \
-            SolverProcess(
+        self._run = \
+            SolverRun(
                 parse,
                 prepare(command, root, task_path, self._tmpdir),
                 self._stm_queue,
-                self._mts_queue,
                 self._solver_id,
-                self._tmpdir,
                 cwd,
+                tmpdir = self._tmpdir,
+                slot = slot,
                 )
 
     def __call__(self, budget):
@@ -223,20 +537,12 @@ class RunningSolver(object):
     def unpause_for(self, budget):
         """Unpause the solver for the specified duration."""
 
-        if not self._process.is_alive():
-            self._process.start()
-
-        self._mts_queue.put(budget)
+        get_supervisor().unpause_for(self._run, budget)
 
     def stop(self):
         """Terminate the solver."""
 
-        if self._process.is_alive():
-            os.kill(self._process.pid, signal.SIGUSR1)
-
-            self._process.join()
-
-        shutil.rmtree(self._tmpdir, ignore_errors = True)
+        get_supervisor().stop(self._run)
 
 class RunningPortfolio(object):
     """Portfolio running on a task."""
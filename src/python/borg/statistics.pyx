@@ -11,8 +11,11 @@ import borg
 cimport cython
 cimport libc.math
 cimport libc.limits
+cimport libc.stdlib
 cimport numpy
 
+from cython.parallel cimport prange
+
 cdef extern from "math.h":
     double NAN
     double INFINITY
@@ -725,7 +728,7 @@ cdef double dcm_log_pdf_raw(
     int D,
     double* alpha, int alpha_stride,
     int* counts, int counts_stride,
-    ):
+    ) nogil:
     """Compute the log of the DCM PDF."""
 
     #cdef numpy.ndarray[double, ndim = 1] alpha_D = alpha
@@ -896,35 +899,87 @@ def dcm_estimate_ml_wallach_raw(alpha, counts, weights):
 
     cdef int N = counts.shape[0]
     cdef int D = counts.shape[1]
-    cdef int M = numpy.max(counts)
-    cdef int L = numpy.max(numpy.sum(counts, axis = -1))
 
     cdef numpy.ndarray[int, ndim = 2] counts_ND = counts
     cdef numpy.ndarray[double, ndim = 1] alpha_D = alpha
     cdef numpy.ndarray[double, ndim = 1] weights_N = weights
-    cdef numpy.ndarray[double, ndim = 1] appearances_L = numpy.zeros(L, numpy.double)
-    cdef numpy.ndarray[double, ndim = 2] appearances_MD = numpy.zeros((M, D), numpy.double)
 
-    # compute appearance histograms
+    if N == 0 or D == 0:
+        return
+
+    cdef int status = \
+        dcm_estimate_ml_wallach_c(
+            N,
+            D,
+            &alpha_D[0], alpha_D.strides[0],
+            &counts_ND[0, 0], counts_ND.strides[0], counts_ND.strides[1],
+            &weights_N[0], weights_N.strides[0],
+            )
+
+    if status < 0:
+        raise MemoryError()
+
+@cython.cdivision(True)
+cdef int dcm_estimate_ml_wallach_c(
+    int N,
+    int D,
+    double* alpha, int alpha_stride,
+    int* counts, int counts_stride0, int counts_stride1,
+    double* weights, int weights_stride,
+    ) nogil:
+    """Compute the maximum-likelihood DCM distribution, in place, without the GIL."""
+
+    cdef void* alpha_p = alpha
+    cdef void* counts_p = counts
+    cdef void* weights_p = weights
+
+    # find the largest count and the largest total count
+    cdef int M = 0
+    cdef int L = 0
     cdef int n
     cdef int d
     cdef int l
     cdef int m
 
     for n in xrange(N):
+        l = 0
+
         for d in xrange(D):
-            m = counts_ND[n, d]
+            m = (<int*>(counts_p + counts_stride0 * n + counts_stride1 * d))[0]
+            l += m
 
-            if m > 0:
-                appearances_MD[m - 1, d] += weights_N[n]
+            if m > M:
+                M = m
+
+        if l > L:
+            L = l
+
+    cdef double* appearances_L = <double*>libc.stdlib.calloc(L + 1, sizeof(double))
+    cdef double* appearances_MD = <double*>libc.stdlib.calloc(M * D + 1, sizeof(double))
+
+    if appearances_L == NULL or appearances_MD == NULL:
+        libc.stdlib.free(appearances_L)
+        libc.stdlib.free(appearances_MD)
+
+        return -1
+
+    # compute appearance histograms
+    cdef double weight_n
 
+    for n in xrange(N):
+        weight_n = (<double*>(weights_p + weights_stride * n))[0]
         l = 0
 
         for d in xrange(D):
-            l += counts_ND[n, d]
+            m = (<int*>(counts_p + counts_stride0 * n + counts_stride1 * d))[0]
+
+            if m > 0:
+                appearances_MD[(m - 1) * D + d] += weight_n
+
+            l += m
 
         if l > 0:
-            appearances_L[l - 1] += weights_N[n]
+            appearances_L[l - 1] += weight_n
 
     # run through the fixed-point iteration
     cdef double numerator
@@ -932,14 +987,16 @@ def dcm_estimate_ml_wallach_raw(alpha, counts, weights):
     cdef double alpha_sum
     cdef double inner_sum
     cdef double change
+    cdef double alpha_d
     cdef double next_alpha_d
+    cdef int i
 
     for i in xrange(1024):
         # compute the magnitude of alpha
         alpha_sum = 0.0
 
         for d in xrange(D):
-            alpha_sum += alpha_D[d]
+            alpha_sum += (<double*>(alpha_p + alpha_stride * d))[0]
 
         # compute the update-ratio denominator
         denominator = 0.0
@@ -949,28 +1006,37 @@ def dcm_estimate_ml_wallach_raw(alpha, counts, weights):
             inner_sum += 1.0 / (l + alpha_sum)
             denominator += appearances_L[l] * inner_sum
 
+        if denominator == 0.0:
+            break
+
         # compute the per-dimensional numerators
         change = 0.0
 
         for d in xrange(D):
+            alpha_d = (<double*>(alpha_p + alpha_stride * d))[0]
             numerator = 0.0
             inner_sum = 0.0
 
             for m in xrange(M):
-                inner_sum += 1.0 / (m + alpha_D[d] + 1e-16)
-                numerator += appearances_MD[m, d] * inner_sum
+                inner_sum += 1.0 / (m + alpha_d + 1e-16)
+                numerator += appearances_MD[m * D + d] * inner_sum
 
-            next_alpha_d = alpha_D[d] * numerator / denominator
+            next_alpha_d = alpha_d * numerator / denominator
 
             if next_alpha_d < 1e-16:
                 next_alpha_d = 1e-16
 
-            change += libc.math.fabs(alpha_D[d] - next_alpha_d)
-            alpha_D[d] = next_alpha_d
+            change += libc.math.fabs(alpha_d - next_alpha_d)
+            (<double*>(alpha_p + alpha_stride * d))[0] = next_alpha_d
 
         if change < 1e-10:
             break
 
+    libc.stdlib.free(appearances_L)
+    libc.stdlib.free(appearances_MD)
+
+    return 0
+
 def dcm_estimate_ml_wallach(counts, weights = None):
     """Compute the maximum-likelihood DCM distribution."""
 
@@ -984,6 +1050,34 @@ def dcm_estimate_ml_wallach(counts, weights = None):
 
     return alpha
 
+def unique_rows(array):
+    """
+    Collapse identical rows of an array.
+
+    Returns the unique rows (in order of first appearance), their
+    multiplicities, and the index of each original row among the uniques.
+    """
+
+    array = numpy.ascontiguousarray(array)
+    indices = {}
+    firsts = []
+    inverse_N = numpy.empty(array.shape[0], numpy.intp)
+
+    for n in xrange(array.shape[0]):
+        key = array[n].tostring()
+        u = indices.get(key)
+
+        if u is None:
+            u = indices[key] = len(firsts)
+
+            firsts.append(n)
+
+        inverse_N[n] = u
+
+    multiplicities_U = numpy.bincount(inverse_N, minlength = len(firsts)).astype(numpy.double)
+
+    return (array[firsts], multiplicities_U, inverse_N)
+
 @cython.wraparound(False)
 @cython.infer_types(True)
 @cython.boundscheck(False)
@@ -1005,42 +1099,48 @@ def dcm_mixture_estimate_ml(counts, int K, alpha = None):
     components /= numpy.sum(components, axis = -1)[..., None] + 1e-32
     components += 1e-1
 
-    cdef numpy.ndarray[int, ndim = 2] counts_ND = counts
+    # collapse duplicate count vectors
+    (unique_counts, multiplicities_U, inverse_N) = unique_rows(counts)
+
+    cdef int U = unique_counts.shape[0]
+
+    cdef numpy.ndarray[int, ndim = 2] counts_UD = unique_counts
     cdef numpy.ndarray[double, ndim = 2] components_KD = components
-    cdef numpy.ndarray[double, ndim = 2] log_densities_KN = numpy.empty((K, N), numpy.double)
+    cdef numpy.ndarray[double, ndim = 2] log_densities_KU = numpy.empty((K, U), numpy.double)
 
+    log_multiplicities_U = numpy.log(multiplicities_U)
     log_weights_K = numpy.zeros(K) - libc.math.log(K)
 
     # expectation maximization
     cdef unsigned int components_KD_stride1 = components_KD.strides[1]
-    cdef unsigned int counts_ND_stride1 = counts_ND.strides[1]
+    cdef unsigned int counts_UD_stride1 = counts_UD.strides[1]
 
     cdef double previous_ll = -INFINITY
 
     cdef int i
     cdef int k
-    cdef int n
+    cdef int u
 
     for i in xrange(128):
         # compute new responsibilities
         for k in xrange(K):
-            for n in xrange(N):
-                log_densities_KN[k, n] = \
+            for u in xrange(U):
+                log_densities_KU[k, u] = \
                     dcm_log_pdf_raw(
                         D,
                         &components_KD[k, 0], components_KD_stride1,
-                        &counts_ND[n, 0], counts_ND_stride1,
+                        &counts_UD[u, 0], counts_UD_stride1,
                         )
 
-        log_responsibilities_KN = log_densities_KN + log_weights_K[..., None]
-        log_responsibilities_KN -= numpy.logaddexp.reduce(log_responsibilities_KN, axis = 0)
+        log_responsibilities_KU = log_densities_KU + log_weights_K[..., None]
+        log_responsibilities_KU -= numpy.logaddexp.reduce(log_responsibilities_KU, axis = 0)
 
-        log_weights_K = numpy.logaddexp.reduce(log_responsibilities_KN, axis = 1)
+        log_weights_K = numpy.logaddexp.reduce(log_responsibilities_KU + log_multiplicities_U, axis = 1)
         log_weights_K -= numpy.log(N)
 
         # compute ll
-        ll_each = numpy.logaddexp.reduce(log_weights_K[:, None] + log_densities_KN, axis = 0)
-        ll = numpy.sum(ll_each)
+        ll_each = numpy.logaddexp.reduce(log_weights_K[:, None] + log_densities_KU, axis = 0)
+        ll = numpy.sum(ll_each * multiplicities_U)
 
         # check for convergence
         delta_ll = ll - previous_ll
@@ -1055,18 +1155,21 @@ def dcm_mixture_estimate_ml(counts, int K, alpha = None):
             logger.warning("ll at EM iteration %i is %f <-- DECLINE", i, ll)
 
         # compute new components
-        responsibilities_KN = numpy.exp(log_responsibilities_KN)
+        weights_KU = numpy.exp(log_responsibilities_KU) * multiplicities_U
 
         for k in xrange(K):
             if alpha is None:
-                dcm_estimate_ml_wallach_raw(components_KD[k], counts_ND, responsibilities_KN[k])
+                dcm_estimate_ml_wallach_raw(components_KD[k], counts_UD, weights_KU[k])
 
                 components_KD[k] += 1e-16
             else:
                 # fast approximation to fixed-alpha Dirichlet estimation
-                components_KD[k, :] = numpy.sum((counts_ND + 1e-4) * responsibilities_KN[k, :, None], axis = 0)
+                components_KD[k, :] = numpy.sum((counts_UD + 1e-4) * weights_KU[k, :, None], axis = 0)
                 components_KD[k, :] *= alpha / numpy.sum(components_KD[k, :])
 
+    # expand responsibilities to every instance
+    log_responsibilities_KN = log_responsibilities_KU[:, inverse_N]
+
     assert_log_weights(log_responsibilities_KN, axis = 0)
 
     return (components_KD, log_responsibilities_KN)
@@ -1075,8 +1178,29 @@ def dcm_mixture_estimate_ml(counts, int K, alpha = None):
 @cython.infer_types(True)
 @cython.boundscheck(False)
 @cython.cdivision(True)
-def dcm_matrix_mixture_estimate_ml(counts, int K, alpha = None):
-    """Fit a DCM mixture using EM."""
+def dcm_matrix_mixture_estimate_ml(
+    counts,
+    int K,
+    alpha = None,
+    int threads = 1,
+    initial = None,
+    int iterations = 128,
+    statistics = None,
+    ):
+    """
+    Fit a DCM mixture using EM.
+
+    Identical count matrices are collapsed before fitting, so each iteration
+    costs time in the number of distinct outcome patterns, not instances.
+    With more than one thread, the E-step is computed in parallel over those
+    patterns, and the M-step in parallel over (component, solver) pairs.
+    Each entry is computed identically regardless of the thread count.
+
+    EM starts from the (components, log weights) pair in initial, if given.
+    Sufficient statistics of previously fitted data, as accumulated by
+    dcm_matrix_mixture_statistics(), may also be given; they contribute to
+    every M-step, but their responsibilities are not recomputed.
+    """
 
     # mise en place
     cdef int N = counts.shape[0]
@@ -1084,57 +1208,92 @@ def dcm_matrix_mixture_estimate_ml(counts, int K, alpha = None):
     cdef int D = counts.shape[2]
 
     # initialization
-    counts_strings = map(str, counts)
-    counts_dict = dict(zip(counts_strings, counts))
-    uniques = sorted(set(counts_strings), key = lambda _: numpy.random.rand())
-    components = numpy.empty((K, S, D), numpy.double)
+    if initial is None:
+        counts_strings = map(str, counts)
+        counts_dict = dict(zip(counts_strings, counts))
+        uniques = sorted(set(counts_strings), key = lambda _: numpy.random.rand())
+        components = numpy.empty((K, S, D), numpy.double)
 
-    for k_ in xrange(K):
-        components[k_] = counts_dict[uniques[k_ % len(uniques)]]
+        for k_ in xrange(K):
+            components[k_] = counts_dict[uniques[k_ % len(uniques)]]
 
-    components /= numpy.sum(components, axis = -1)[..., None] + 1e-32
-    components += 1e-1
+        components /= numpy.sum(components, axis = -1)[..., None] + 1e-32
+        components += 1e-1
+
+        log_weights_K = numpy.zeros(K) - libc.math.log(K)
+    else:
+        components = numpy.array(initial[0], numpy.double)
+        log_weights_K = numpy.array(initial[1], numpy.double)
+        K = components.shape[0]
 
-    cdef numpy.ndarray[int, ndim = 3] counts_NSD = counts
+    # collapse duplicate count matrices
+    (unique_counts, multiplicities_U, inverse_N) = unique_rows(counts)
+
+    cdef int U = unique_counts.shape[0]
+
+    # and append those of previously fitted data, if any
+    if statistics is None:
+        fit_counts = unique_counts
+        prior_weights_KV = numpy.empty((K, 0), numpy.double)
+    else:
+        (prior_counts, prior_weights_KV) = statistics
+        fit_counts = numpy.concatenate([unique_counts, prior_counts])
+        prior_N = numpy.sum(prior_weights_KV)
+        log_prior_weights_K = numpy.log(numpy.sum(prior_weights_KV, axis = 1))
+
+    cdef int F = fit_counts.shape[0]
+
+    cdef numpy.ndarray[int, ndim = 3] counts_USD = unique_counts
+    cdef numpy.ndarray[int, ndim = 3] counts_FSD = fit_counts
     cdef numpy.ndarray[double, ndim = 3] components_KSD = components
-    cdef numpy.ndarray[double, ndim = 2] log_densities_KN = numpy.empty((K, N), numpy.double)
+    cdef numpy.ndarray[double, ndim = 2] log_densities_KU = numpy.empty((K, U), numpy.double)
+    cdef numpy.ndarray[double, ndim = 2] weights_KF
 
-    log_weights_K = numpy.zeros(K) - libc.math.log(K)
+    log_multiplicities_U = numpy.log(multiplicities_U)
 
     # expectation maximization
     cdef unsigned int components_KSD_stride2 = components_KSD.strides[2]
-    cdef unsigned int counts_NSD_stride2 = counts_NSD.strides[2]
+    cdef unsigned int counts_USD_stride2 = counts_USD.strides[2]
+    cdef unsigned int counts_FSD_stride0 = counts_FSD.strides[0]
+    cdef unsigned int counts_FSD_stride2 = counts_FSD.strides[2]
 
     cdef double previous_ll = -INFINITY
 
     cdef int i
     cdef int k
-    cdef int n
+    cdef int u
     cdef int s
+    cdef int ks
+    cdef int failures
 
-    for i in xrange(128):
+    for i in xrange(iterations):
         # compute new responsibilities
-        for k in xrange(K):
-            for n in xrange(N):
-                log_densities_KN[k, n] = 0.0
+        for u in prange(U, nogil = True, num_threads = threads, schedule = "static"):
+            for k in xrange(K):
+                log_densities_KU[k, u] = 0.0
 
                 for s in xrange(S):
-                    log_densities_KN[k, n] += \
+                    log_densities_KU[k, u] += \
                         dcm_log_pdf_raw(
                             D,
                             &components_KSD[k, s, 0], components_KSD_stride2,
-                            &counts_NSD[n, s, 0], counts_NSD_stride2,
+                            &counts_USD[u, s, 0], counts_USD_stride2,
                             )
 
-        log_responsibilities_KN = log_densities_KN + log_weights_K[..., None]
-        log_responsibilities_KN -= numpy.logaddexp.reduce(log_responsibilities_KN, axis = 0)
+        log_responsibilities_KU = log_densities_KU + log_weights_K[..., None]
+        log_responsibilities_KU -= numpy.logaddexp.reduce(log_responsibilities_KU, axis = 0)
 
-        log_weights_K = numpy.logaddexp.reduce(log_responsibilities_KN, axis = 1)
-        log_weights_K -= numpy.log(N)
+        log_weights_K = numpy.logaddexp.reduce(log_responsibilities_KU + log_multiplicities_U, axis = 1)
+
+        if statistics is None:
+            log_weights_K -= numpy.log(N)
+        else:
+            log_weights_K = numpy.logaddexp(log_weights_K, log_prior_weights_K)
+            log_weights_K -= numpy.log(N + prior_N)
 
         # compute ll
-        ll_each = numpy.logaddexp.reduce(log_weights_K[:, None] + log_densities_KN, axis = 0)
-        ll = numpy.sum(ll_each)
+        ll_each = numpy.logaddexp.reduce(log_weights_K[:, None] + log_densities_KU, axis = 0)
+        ll = numpy.sum(ll_each * multiplicities_U)
 
         # check for convergence
         delta_ll = ll - previous_ll
@@ -1149,24 +1308,71 @@ def dcm_matrix_mixture_estimate_ml(counts, int K, alpha = None):
             logger.warning("ll at EM iteration %i is %f <-- DECLINE", i, ll)
 
         # compute new components
-        responsibilities_KN = numpy.exp(log_responsibilities_KN)
+        weights_KF = numpy.hstack([numpy.exp(log_responsibilities_KU) * multiplicities_U, prior_weights_KV])
 
-        for k in xrange(K):
-            for s in xrange(S):
-                if alpha is None:
-                    dcm_estimate_ml_wallach_raw(components_KSD[k, s, :], counts_NSD[:, s, :], responsibilities_KN[k])
+        if alpha is None:
+            failures = 0
 
-                    components_KSD[k, s, :] += 1e-16
-                else:
+            for ks in prange(K * S, nogil = True, num_threads = threads, schedule = "dynamic"):
+                k = ks / S
+                s = ks % S
+
+                if dcm_estimate_ml_wallach_c(
+                    F,
+                    D,
+                    &components_KSD[k, s, 0], components_KSD_stride2,
+                    &counts_FSD[0, s, 0], counts_FSD_stride0, counts_FSD_stride2,
+                    &weights_KF[k, 0], sizeof(double),
+                    ) < 0:
+                    failures += 1
+
+            if failures > 0:
+                raise MemoryError()
+
+            components_KSD += 1e-16
+        else:
+            for k in xrange(K):
+                for s in xrange(S):
                     # fast approximation to fixed-alpha Dirichlet estimation
-                    components_KSD[k, s, :] = numpy.sum((counts_NSD[:, s, :] + 1e-4) * responsibilities_KN[k, :, None], axis = 0)
+                    components_KSD[k, s, :] = numpy.sum((counts_FSD[:, s, :] + 1e-4) * weights_KF[k, :, None], axis = 0)
                     components_KSD[k, s, :] *= alpha / numpy.sum(components_KSD[k, s, :])
 
+    # expand responsibilities to every instance
+    log_responsibilities_KN = log_responsibilities_KU[:, inverse_N]
+
     assert numpy.all(numpy.isfinite(components_KSD))
     assert_log_weights(log_responsibilities_KN, axis = 0)
 
     return (components_KSD, log_responsibilities_KN)
 
+def dcm_matrix_mixture_statistics(counts, log_responsibilities, statistics = None):
+    """
+    Accumulate the sufficient statistics of a DCM mixture fit.
+
+    These are the distinct count patterns, and the expected number of
+    instances with each pattern under each component. They may be added to
+    previously accumulated statistics.
+    """
+
+    if statistics is not None:
+        counts = numpy.concatenate([counts, statistics[0]])
+
+    (unique_counts, _, inverse) = unique_rows(counts)
+
+    K = log_responsibilities.shape[0]
+    U = unique_counts.shape[0]
+    weights_KU = numpy.empty((K, U), numpy.double)
+
+    for k in xrange(K):
+        weights_k = numpy.exp(log_responsibilities[k])
+
+        if statistics is not None:
+            weights_k = numpy.concatenate([weights_k, statistics[1][k]])
+
+        weights_KU[k] = numpy.bincount(inverse, weights = weights_k, minlength = U)
+
+    return (unique_counts, weights_KU)
+
 @cython.cdivision(True)
 @cython.wraparound(False)
 @cython.boundscheck(False)
@@ -1360,8 +1566,14 @@ def discrete_log_normal_mixture_estimate_ml(counts, double terminus, int K):
 
     return (ps_KD, log_responsibilities_KN)
 
-def discrete_log_normal_matrix_mixture_estimate_ml(counts, double terminus, int K):
-    """Fit a discretized right-censored log-normal mixture using EM."""
+def discrete_log_normal_matrix_mixture_estimate_ml(counts, double terminus, int K, initial = None, int iterations = 64):
+    """
+    Fit a discretized right-censored log-normal mixture using EM.
+
+    Returns the discretized components, the responsibilities, and the
+    (mus, sigmas, thetas) component parameters. EM starts from the (mus,
+    sigmas, thetas, log weights) tuple in initial, if given.
+    """
 
     # mise en place
     cdef int N = counts.shape[0]
@@ -1375,10 +1587,21 @@ def discrete_log_normal_matrix_mixture_estimate_ml(counts, double terminus, int
 
     # initialization
     cdef numpy.ndarray[int, ndim = 3] counts_NSD = numpy.asarray(counts, dtype = numpy.intc)
-    cdef numpy.ndarray[double, ndim = 2] mus_KS = numpy.random.rand(K, S) * 10.0
-    cdef numpy.ndarray[double, ndim = 2] sigmas_KS = numpy.random.rand(K, S)
-    #cdef numpy.ndarray[double, ndim = 2] thetas_KS = numpy.zeros((K, S))
-    cdef numpy.ndarray[double, ndim = 2] thetas_KS = numpy.random.rand(K, S) * terminus / 2.0
+    cdef numpy.ndarray[double, ndim = 2] mus_KS
+    cdef numpy.ndarray[double, ndim = 2] sigmas_KS
+    cdef numpy.ndarray[double, ndim = 2] thetas_KS
+
+    if initial is None:
+        mus_KS = numpy.random.rand(K, S) * 10.0
+        sigmas_KS = numpy.random.rand(K, S)
+        #thetas_KS = numpy.zeros((K, S))
+        thetas_KS = numpy.random.rand(K, S) * terminus / 2.0
+    else:
+        mus_KS = numpy.array(initial[0], numpy.double)
+        sigmas_KS = numpy.array(initial[1], numpy.double)
+        thetas_KS = numpy.array(initial[2], numpy.double)
+        K = mus_KS.shape[0]
+
     cdef numpy.ndarray[double, ndim = 3] ps_KSD = numpy.empty((K, S, D))
     cdef numpy.ndarray[double, ndim = 2] log_densities_KN = numpy.empty((K, N), numpy.double)
 
@@ -1396,7 +1619,11 @@ def discrete_log_normal_matrix_mixture_estimate_ml(counts, double terminus, int
         #print "*** initializing", k
         #print counts_NSD[n]
 
-    log_weights_K = numpy.zeros(K) - libc.math.log(K)
+    if initial is None:
+        log_weights_K = numpy.zeros(K) - libc.math.log(K)
+    else:
+        log_weights_K = numpy.array(initial[3], numpy.double)
+
     log_weights_K -= numpy.logaddexp.reduce(log_weights_K)
 
     # expectation maximization
@@ -1404,7 +1631,7 @@ def discrete_log_normal_matrix_mixture_estimate_ml(counts, double terminus, int
     cdef int ps_KSD_stride2 = ps_KSD.strides[2]
     cdef int counts_NSD_stride2 = counts_NSD.strides[2]
 
-    for i in xrange(64):
+    for i in xrange(iterations):
         # compute new responsibilities (E step)
         log_densities_KN[:] = log_weights_K[..., None]
 
@@ -1469,5 +1696,5 @@ def discrete_log_normal_matrix_mixture_estimate_ml(counts, double terminus, int
 
                 #print "@", k, "(mu = {0}; sigma = {1}; theta = {2})".format(mus_K[k], sigmas_K[k], thetas_K[k])
 
-    return (ps_KSD, log_responsibilities_KN)
+    return (ps_KSD, log_responsibilities_KN, (mus_KS, sigmas_KS, thetas_KS))
 
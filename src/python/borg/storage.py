@@ -2,8 +2,12 @@
 
 import os.path
 import csv
+import json
+import copy
 import itertools
 import collections
+import multiprocessing
+import cPickle as pickle
 import numpy
 import borg
 
@@ -79,6 +83,11 @@ class RunData(object):
 
         self.feature_vectors[id_] = vector
 
+    def copy(self):
+        """Return a mutable copy of these data."""
+
+        return copy.deepcopy(self)
+
     def filter(self, *ids):
         """Return a filtered set of run data."""
 
@@ -327,10 +336,18 @@ class RunData(object):
 
         return (times_arrays, ns_arrays, failures_NS)
 
-    def to_bins_array(self, solver_names, B, cutoff = None):
-        """Return discretized run duration counts."""
+    def to_bins_array(self, solver_names, B, cutoff = None, edges = None):
+        """
+        Return discretized run duration counts.
 
-        if cutoff is None:
+        If B upper bin edges are given, in seconds, durations are binned at
+        those edges, and the last edge is the cutoff.
+        """
+
+        if edges is not None:
+            edges = check_bin_edges(edges, B)
+            cutoff = edges[-1]
+        elif cutoff is None:
             cutoff = self.get_common_budget()
 
         S = len(solver_names)
@@ -348,7 +365,10 @@ class RunData(object):
                 s = solver_name_index.index(run.solver)
 
                 if run.success and run.cost < cutoff:
-                    b = int(run.cost / interval)
+                    if edges is None:
+                        b = int(run.cost / interval)
+                    else:
+                        b = int(numpy.searchsorted(edges, run.cost, side = "right"))
 
                     outcomes_NSC[n, s, b] += 1
                 else:
@@ -356,6 +376,11 @@ class RunData(object):
 
         return outcomes_NSC
 
+    def to_bins_arrays(self, solver_names, Bs, cutoff = None):
+        """Return discretized run duration counts at several resolutions."""
+
+        return [self.to_bins_array(solver_names, B, cutoff) for B in Bs]
+
     @property
     def ids(self):
         """All associated instance ids."""
@@ -363,7 +388,7 @@ class RunData(object):
         return self.run_lists.keys()
 
     @staticmethod
-    def from_roots(solver_names, tasks_roots, domain, suffix = ".runs.csv"):
+    def from_roots(solver_names, tasks_roots, domain, suffix = ".runs.csv", **kwargs):
         """Collect run data by scanning for tasks."""
 
         task_paths = []
@@ -371,94 +396,1141 @@ class RunData(object):
         for tasks_root in tasks_roots:
             task_paths.extend(borg.util.files_under(tasks_root, domain.extensions))
 
-        return RunData.from_paths(solver_names, task_paths, domain, suffix)
+        return RunData.from_paths(solver_names, task_paths, domain, suffix, **kwargs)
 
     @staticmethod
-    def from_paths(solver_names, task_paths, domain, suffix = ".runs.csv"):
-        """Collect run data from task paths."""
+    def from_paths(solver_names, task_paths, domain, suffix = ".runs.csv", workers = None, cache_path = None):
+        """
+        Collect run data from task paths.
+
+        Task files are parsed by a pool of worker processes, and their contents
+        are added to the run data as they arrive. If a cache path is given,
+        parsed files are stored there, and later loads re-read only those
+        files whose modification time or size has changed.
+        """
 
         training = RunData(solver_names)
+        cache = TaskFileCache(cache_path)
+
+        # find the files that must be (re)parsed
+        stamps = dict((path, task_file_stamps(path, suffix)) for path in task_paths)
+        stale_paths = [path for path in task_paths if cache.get(path, suffix, stamps[path]) is None]
+
+        logger.info(
+            "parsing %i of %i task file pairs (%i cached)",
+            len(stale_paths),
+            len(task_paths),
+            len(task_paths) - len(stale_paths),
+            )
 
-        for path in task_paths:
-            # load run records
-            run_data = numpy.recfromcsv(path + suffix, usemask = True)
-            rows = run_data.tolist()
+        # parse them, in parallel if worthwhile
+        if workers is None:
+            workers = multiprocessing.cpu_count()
 
-            if run_data.shape == ():
-                rows = [rows]
+        jobs = [(path, suffix) for path in stale_paths]
 
-            for (run_solver, run_budget, run_cost, run_succeeded, run_answer) in rows:
-                record = RunRecord(run_solver, run_budget, run_cost, run_succeeded)
+        if workers > 1 and len(jobs) > 1:
+            pool = multiprocessing.Pool(min(workers, len(jobs)))
+            parsed = pool.imap(_read_task_files, jobs, chunksize = max(1, min(64, len(jobs) // (workers * 4))))
+        else:
+            pool = None
+            parsed = itertools.imap(_read_task_files, jobs)
+
+        # and add them to the run data as they arrive, in the order given
+        try:
+            for path in task_paths:
+                cached = cache.get(path, suffix, stamps[path])
 
-                training.add_run(path, record)
+                if cached is None:
+                    (parsed_path, rows, feature_dict) = parsed.next()
 
-            # load feature data
-            feature_records = numpy.recfromcsv("{0}.features.csv".format(path))
-            feature_dict = dict(zip(feature_records.dtype.names, feature_records.tolist()))
+                    assert parsed_path == path
 
-            training.add_feature_vector(path, feature_dict)
+                    cache.put(path, suffix, stamps[path], rows, feature_dict)
+                else:
+                    (rows, feature_dict) = cached
+
+                for (run_solver, run_budget, run_cost, run_succeeded) in rows:
+                    training.add_run(path, RunRecord(run_solver, run_budget, run_cost, run_succeeded))
+
+                training.add_feature_vector(path, feature_dict)
+        finally:
+            if pool is not None:
+                pool.terminate()
+
+        cache.save()
 
         return training
 
     @staticmethod
-    def from_bundle(bundle_path):
+    def from_bundle(bundle_path, mutable = True):
+        """
+        Collect run data from a CSV or columnar bundle.
+
+        By default, returns record-based run data, to which runs and features
+        may be added. If mutable is false, returns read-only ArrayRunData,
+        which is much cheaper to load, subset and discretize; its add_run and
+        add_feature_vector raise TypeError, and its copy() is mutable.
+        """
+
+        if mutable:
+            if is_columnar_bundle(bundle_path):
+                return RunColumns.load(bundle_path).to_run_data()
+            else:
+                return RunData.from_csv_bundle(bundle_path)
+        else:
+            if is_columnar_bundle(bundle_path):
+                columns = RunColumns.load(bundle_path)
+            else:
+                columns = RunColumns.from_csv_bundle(bundle_path)
+
+            return ArrayRunData(columns)
+
+    @staticmethod
+    def from_csv_bundle(bundle_path):
         """Collect run data from two CSV files."""
 
         run_data = RunData(None)
 
         # load runs
-        runs_csv_path = os.path.join(bundle_path, "all_runs.csv.gz")
+        solver_names = set()
+        csv_rows = iter_csv_bundle(bundle_path, "runs")
 
-        logger.info("reading run data from %s", runs_csv_path)
+        columns = csv_rows.next()
 
-        solver_names = set()
+        if columns[:5] != ["instance", "solver", "budget", "cost", "succeeded"]:
+            raise Exception("unexpected columns in run data CSV file")
+
+        for (instance, solver, budget_str, cost_str, succeeded_str) in csv_rows:
+            run_data.add_run(
+                instance,
+                RunRecord(
+                    solver,
+                    float(budget_str),
+                    float(cost_str),
+                    succeeded_str.lower() == "true",
+                    ),
+                )
+            solver_names.add(solver)
+
+        run_data.solver_names = sorted(solver_names)
+
+        # load features
+        csv_rows = iter_csv_bundle(bundle_path, "features")
+
+        try:
+            columns = csv_rows.next()
+        except StopIteration:
+            pass
+        else:
+            if columns[0] != "instance":
+                raise Exception("unexpected columns in features CSV file")
+
+            for row in csv_rows:
+                feature_dict = dict(zip(columns[1:], map(float, row[1:])))
+
+                run_data.add_feature_vector(row[0], feature_dict)
+
+            assert set(run_data.run_lists) == set(run_data.feature_vectors)
+
+        return run_data
+
+TrainingData = RunData
+
+def check_bin_edges(edges, B):
+    """Validate a sequence of B increasing upper bin edges."""
+
+    edges = numpy.asarray(edges, numpy.double)
+
+    if edges.shape != (B,):
+        raise ValueError("expected {0} bin edges, not {1}".format(B, edges.shape))
+    if numpy.any(edges <= 0.0) or numpy.any(numpy.diff(edges) <= 0.0):
+        raise ValueError("bin edges must be positive and increasing")
+
+    return edges
+
+def geometric_bin_edges(B, cutoff, first):
+    """Return B upper bin edges growing geometrically from first to cutoff."""
+
+    edges = numpy.exp(numpy.linspace(numpy.log(first), numpy.log(cutoff), B))
+
+    edges[-1] = cutoff
+
+    return edges
+
+columnar_index_name = "columns.json"
+columnar_format = "borg-columnar-1"
+columnar_names = ["instances", "solvers", "budgets", "costs", "successes", "features"]
+csv_manifest_name = "manifest.json"
+
+def csv_bundle_paths(bundle_path, name):
+    """List the files of a CSV bundle table: the base file, then any segments."""
+
+    paths = [os.path.join(bundle_path, "all_{0}.csv.gz".format(name))]
+    manifest_path = os.path.join(bundle_path, csv_manifest_name)
 
-        with borg.util.openz(runs_csv_path) as csv_file:
+    if os.path.exists(manifest_path):
+        manifest = borg.util.load_json(manifest_path)
+
+        paths.extend(os.path.join(bundle_path, segment) for segment in manifest["segments"][name])
+
+    return paths
+
+def iter_csv_bundle(bundle_path, name):
+    """Iterate over the header, and then the rows, of a CSV bundle table."""
+
+    header = None
+
+    for path in csv_bundle_paths(bundle_path, name):
+        logger.info("reading %s data from %s", name, path)
+
+        with borg.util.openz(path) as csv_file:
             csv_reader = csv.reader(csv_file)
 
-            columns = csv_reader.next()
+            try:
+                file_header = csv_reader.next()
+            except StopIteration:
+                continue
+
+            if header is None:
+                header = file_header
+
+                yield header
+            elif file_header != header:
+                raise Exception("inconsistent columns in bundle segment {0}".format(path))
+
+            for row in csv_reader:
+                yield row
+
+
+def task_file_stamps(path, suffix = ".runs.csv"):
+    """Return the (mtime, size) stamps of a task's runs and features files."""
+
+    stamps = []
+
+    for file_path in [path + suffix, path + ".features.csv"]:
+        stat = os.stat(file_path)
+
+        stamps.append((stat.st_mtime, stat.st_size))
+
+    return tuple(stamps)
+
+def _read_task_files(arguments):
+    """Parse the runs and features files of a task."""
+
+    (path, suffix) = arguments
+
+    # load run records
+    run_data = numpy.recfromcsv(path + suffix, usemask = True)
+    rows = run_data.tolist()
+
+    if run_data.shape == ():
+        rows = [rows]
+
+    rows = [tuple(row[:4]) for row in rows]
+
+    # load feature data
+    feature_records = numpy.recfromcsv("{0}.features.csv".format(path))
+    feature_dict = dict(zip(feature_records.dtype.names, feature_records.tolist()))
+
+    return (path, rows, feature_dict)
+
+class TaskFileCache(object):
+    """
+    On-disk cache of parsed task files.
+
+    Entries are keyed by task path and runs suffix, and are valid only while
+    the stamps of the underlying files match. Without a cache path, nothing is
+    cached.
+    """
+
+    def __init__(self, cache_path = None):
+        """Initialize."""
+
+        self._cache_path = cache_path
+        self._entries = {}
+        self._dirty = False
+
+        if cache_path is not None and os.path.exists(cache_path):
+            with open(cache_path, "rb") as cache_file:
+                self._entries = pickle.load(cache_file)
+
+            logger.info("loaded %i cached task file entries from %s", len(self._entries), cache_path)
+
+    def get(self, path, suffix, stamps):
+        """Retrieve the (rows, features) of a task, if cached and current."""
+
+        entry = self._entries.get((path, suffix))
+
+        if entry is not None and entry[0] == stamps:
+            return entry[1:]
+        else:
+            return None
+
+    def put(self, path, suffix, stamps, rows, feature_dict):
+        """Store the (rows, features) of a task."""
+
+        self._entries[(path, suffix)] = (stamps, rows, feature_dict)
+        self._dirty = True
+
+    def save(self):
+        """Write the cache to disk, if necessary."""
+
+        if self._cache_path is None or not self._dirty:
+            return
+
+        partial_path = "{0}.partial.{1}".format(self._cache_path, os.getpid())
+
+        with open(partial_path, "wb") as cache_file:
+            pickle.dump(self._entries, cache_file, protocol = -1)
+
+        os.rename(partial_path, self._cache_path)
+
+        self._dirty = False
+
+        logger.info("wrote %i cached task file entries to %s", len(self._entries), self._cache_path)
+
+def is_columnar_bundle(bundle_path):
+    """Is the bundle stored in columnar (rather than CSV) format?"""
+
+    return os.path.exists(os.path.join(bundle_path, columnar_index_name))
+
+class RunColumns(object):
+    """
+    Run and feature data stored as parallel typed arrays.
+
+    Runs are sorted by instance; instances and solvers are stored as integer
+    codes into the (sorted) instance ids and the solver names. Features are
+    stored as a single instances-by-features matrix. A columnar bundle on disk
+    is one .npy file per column, plus a small JSON index of names, so it can be
+    opened memory-mapped without parsing anything.
+    """
 
-            if columns[:5] != ["instance", "solver", "budget", "cost", "succeeded"]:
-                raise Exception("unexpected columns in run data CSV file")
+    def __init__(
+        self,
+        instance_ids,
+        solver_names,
+        feature_names,
+        instances,
+        solvers,
+        budgets,
+        costs,
+        successes,
+        features,
+        ):
+        """Initialize."""
+
+        self.instance_ids = instance_ids
+        self.solver_names = solver_names
+        self.feature_names = feature_names
+        self.instances_R = instances
+        self.solvers_R = solvers
+        self.budgets_R = budgets
+        self.costs_R = costs
+        self.successes_R = successes
+        self.features_NF = features
+
+    def __len__(self):
+        """Number of instances for which data are stored."""
+
+        return len(self.instance_ids)
+
+    def get_run_count(self):
+        """Return the number of runs stored."""
+
+        return self.instances_R.shape[0]
+
+    def get_solver_codes(self, solver_names):
+        """Map stored solver codes onto positions in a list of solver names."""
+
+        solver_names = list(solver_names)
+        remap = numpy.empty(len(self.solver_names), numpy.intp)
+
+        for (s, name) in enumerate(self.solver_names):
+            remap[s] = solver_names.index(name) if name in solver_names else -1
+
+        codes_R = remap[self.solvers_R]
+
+        if numpy.any(codes_R < 0):
+            raise ValueError("run data include runs of unlisted solvers")
+
+        return codes_R
+
+    def to_bins_arrays(self, solver_names, Bs, cutoff):
+        """Discretize run durations at several resolutions in one pass."""
+
+        S = len(solver_names)
+        N = len(self)
+
+        costs_R = numpy.asarray(self.costs_R)
+        finished_R = numpy.logical_and(self.successes_R, costs_R < cutoff)
+        finished_costs = costs_R[finished_R]
+        cells_R = numpy.asarray(self.instances_R, numpy.intp) * S + self.get_solver_codes(solver_names)
+        bs_R = numpy.empty_like(cells_R)
+        outcomes_arrays = []
+
+        for B in Bs:
+            C = B + 1
+            interval = cutoff / B
+
+            bs_R[...] = B
+            bs_R[finished_R] = (finished_costs / interval).astype(numpy.intp)
+
+            outcomes_NSC = \
+                numpy.bincount(cells_R * C + bs_R, minlength = N * S * C) \
+                    .reshape((N, S, C)) \
+                    .astype(numpy.intc)
+
+            outcomes_arrays.append(outcomes_NSC)
+
+        return outcomes_arrays
+
+    def to_edged_bins_array(self, solver_names, edges):
+        """Discretize run durations at arbitrary upper bin edges."""
+
+        S = len(solver_names)
+        N = len(self)
+        (B,) = edges.shape
+        C = B + 1
+
+        costs_R = numpy.asarray(self.costs_R)
+        finished_R = numpy.logical_and(self.successes_R, costs_R < edges[-1])
+        cells_R = numpy.asarray(self.instances_R, numpy.intp) * S + self.get_solver_codes(solver_names)
+        bs_R = numpy.empty_like(cells_R)
+
+        bs_R[...] = B
+        bs_R[finished_R] = numpy.searchsorted(edges, costs_R[finished_R], side = "right")
+
+        return \
+            numpy.bincount(cells_R * C + bs_R, minlength = N * S * C) \
+                .reshape((N, S, C)) \
+                .astype(numpy.intc)
+
+    def take(self, ns):
+        """Gather the columns of a (sorted) subset of instance positions."""
+
+        ns = numpy.asarray(ns, numpy.intp)
+        instances_R = numpy.asarray(self.instances_R)
+        starts_N = numpy.searchsorted(instances_R, ns)
+        lengths_N = numpy.searchsorted(instances_R, ns + 1) - starts_N
+        offsets_N = numpy.cumsum(lengths_N) - lengths_N - starts_N
+        rs = numpy.arange(numpy.sum(lengths_N)) - numpy.repeat(offsets_N, lengths_N)
+
+        return \
+            RunColumns(
+                [self.instance_ids[n] for n in ns],
+                self.solver_names,
+                self.feature_names,
+                numpy.repeat(numpy.arange(ns.shape[0]), lengths_N).astype(numpy.intc),
+                self.solvers_R[rs],
+                self.budgets_R[rs],
+                self.costs_R[rs],
+                self.successes_R[rs],
+                self.features_NF[ns],
+                )
+
+    def to_run_data(self):
+        """Build an equivalent (record-based) run data set."""
+
+        run_data = RunData(list(self.solver_names))
+
+        for r in xrange(self.get_run_count()):
+            run_data.add_run(
+                self.instance_ids[self.instances_R[r]],
+                RunRecord(
+                    self.solver_names[self.solvers_R[r]],
+                    float(self.budgets_R[r]),
+                    float(self.costs_R[r]),
+                    bool(self.successes_R[r]),
+                    ),
+                )
+
+        if self.feature_names:
+            for (n, instance_id) in enumerate(self.instance_ids):
+                feature_dict = dict(zip(self.feature_names, map(float, self.features_NF[n])))
+
+                run_data.add_feature_vector(instance_id, feature_dict)
+
+        return run_data
+
+    def save(self, bundle_path):
+        """Write these data to a new columnar bundle."""
+
+        os.mkdir(bundle_path)
+
+        columns = [
+            self.instances_R,
+            self.solvers_R,
+            self.budgets_R,
+            self.costs_R,
+            self.successes_R,
+            self.features_NF,
+            ]
+
+        for (name, column) in zip(columnar_names, columns):
+            numpy.save(os.path.join(bundle_path, name + ".npy"), numpy.ascontiguousarray(column))
+
+        index = {
+            "format": columnar_format,
+            "instances": self.instance_ids,
+            "solvers": self.solver_names,
+            "features": self.feature_names,
+            }
+
+        with open(os.path.join(bundle_path, columnar_index_name), "wb") as index_file:
+            json.dump(index, index_file)
+
+    @staticmethod
+    def load(bundle_path, mmap = True):
+        """Open a columnar bundle, memory-mapping its columns by default."""
+
+        logger.info("opening columnar run data in %s", bundle_path)
+
+        with open(os.path.join(bundle_path, columnar_index_name), "rb") as index_file:
+            index = json.load(index_file)
+
+        if index.get("format") != columnar_format:
+            raise Exception("unrecognized columnar bundle format")
+
+        encoded = lambda names: [name.encode("utf-8") for name in names]
+        mmap_mode = "r" if mmap else None
+        columns = [
+            numpy.load(os.path.join(bundle_path, name + ".npy"), mmap_mode = mmap_mode)
+            for name in columnar_names
+            ]
+
+        return \
+            RunColumns(
+                encoded(index["instances"]),
+                encoded(index["solvers"]),
+                encoded(index["features"]),
+                *columns
+                )
+
+    @staticmethod
+    def from_run_data(run_data):
+        """Convert record-based run data to columns."""
+
+        instance_ids = sorted(run_data.run_lists)
+        solver_names = list(run_data.solver_names)
+        solver_indices = dict((name, s) for (s, name) in enumerate(solver_names))
 
-            for (instance, solver, budget_str, cost_str, succeeded_str) in csv_reader:
-                run_data.add_run(
-                    instance,
+        R = run_data.get_run_count()
+        instances_R = numpy.empty(R, numpy.intc)
+        solvers_R = numpy.empty(R, numpy.intc)
+        budgets_R = numpy.empty(R, numpy.double)
+        costs_R = numpy.empty(R, numpy.double)
+        successes_R = numpy.empty(R, numpy.bool_)
+        r = 0
+
+        for (n, instance_id) in enumerate(instance_ids):
+            for run in run_data.run_lists[instance_id]:
+                instances_R[r] = n
+                solvers_R[r] = solver_indices[run.solver]
+                budgets_R[r] = run.budget
+                costs_R[r] = run.cost
+                successes_R[r] = run.success
+
+                r += 1
+
+        if run_data.feature_vectors:
+            feature_names = sorted(run_data.feature_vectors[instance_ids[0]])
+        else:
+            feature_names = []
+
+        features_NF = numpy.empty((len(instance_ids), len(feature_names)), numpy.double)
+
+        for (n, instance_id) in enumerate(instance_ids):
+            if feature_names:
+                feature_dict = run_data.feature_vectors[instance_id]
+
+                features_NF[n] = [feature_dict[name] for name in feature_names]
+
+        return \
+            RunColumns(
+                instance_ids,
+                solver_names,
+                feature_names,
+                instances_R,
+                solvers_R,
+                budgets_R,
+                costs_R,
+                successes_R,
+                features_NF,
+                )
+
+    @staticmethod
+    def from_csv_bundle(bundle_path):
+        """Convert a CSV bundle to columns without building run records."""
+
+        # load runs
+        instance_names = []
+        solver_names = []
+        budgets = []
+        costs = []
+        successes = []
+        csv_rows = iter_csv_bundle(bundle_path, "runs")
+
+        columns = csv_rows.next()
+
+        if columns[:5] != ["instance", "solver", "budget", "cost", "succeeded"]:
+            raise Exception("unexpected columns in run data CSV file")
+
+        for (instance, solver, budget_str, cost_str, succeeded_str) in csv_rows:
+            instance_names.append(instance)
+            solver_names.append(solver)
+            budgets.append(float(budget_str))
+            costs.append(float(cost_str))
+            successes.append(succeeded_str.lower() == "true")
+
+        instance_ids = sorted(set(instance_names))
+        instance_indices = dict((name, n) for (n, name) in enumerate(instance_ids))
+        unique_solver_names = sorted(set(solver_names))
+        solver_indices = dict((name, s) for (s, name) in enumerate(unique_solver_names))
+
+        instances_R = numpy.array([instance_indices[name] for name in instance_names], numpy.intc)
+        solvers_R = numpy.array([solver_indices[name] for name in solver_names], numpy.intc)
+        order = numpy.argsort(instances_R, kind = "mergesort")
+
+        # load features
+        feature_names = []
+        features_NF = numpy.empty((len(instance_ids), 0), numpy.double)
+        csv_rows = iter_csv_bundle(bundle_path, "features")
+
+        try:
+            columns = csv_rows.next()
+        except StopIteration:
+            pass
+        else:
+            if columns[0] != "instance":
+                raise Exception("unexpected columns in features CSV file")
+
+            feature_names = columns[1:]
+            features_NF = numpy.empty((len(instance_ids), len(feature_names)), numpy.double)
+            seen_N = numpy.zeros(len(instance_ids), numpy.bool_)
+
+            for row in csv_rows:
+                n = instance_indices[row[0]]
+
+                assert not seen_N[n]
+
+                features_NF[n] = map(float, row[1:])
+                seen_N[n] = True
+
+            assert numpy.all(seen_N)
+
+        return \
+            RunColumns(
+                instance_ids,
+                unique_solver_names,
+                feature_names,
+                instances_R[order],
+                solvers_R[order],
+                numpy.array(budgets, numpy.double)[order],
+                numpy.array(costs, numpy.double)[order],
+                numpy.array(successes, numpy.bool_)[order],
+                features_NF,
+                )
+
+class ArrayRunData(RunData):
+    """
+    Read-only run data backed by columns rather than run records.
+
+    Provides the RunData interface, but implements the array conversions as
+    vectorized operations over integer-coded columns. The run records and
+    feature dictionaries exposed through run_lists and feature_vectors are
+    built only on first use, for code that still needs them; modifying them
+    does not modify these data. Use copy() to obtain mutable run data.
+
+    Subsets (filter, masked, only_*) are returned as views that share these
+    columns and conversion caches. The most recently used bins arrays are
+    cached, up to a bounded number; caches are not pickled.
+    """
+
+    def __init__(self, columns, bins_cache_size = 16):
+        """Initialize."""
+
+        self.solver_names = list(columns.solver_names)
+        self.common_features = sorted(n for n in columns.feature_names if n != "cpu_cost") or None
+
+        self._columns = columns
+        self._common_budget = None
+        self._bins_cache = collections.OrderedDict()
+        self._bins_cache_size = bins_cache_size
+        self._instance_indices = None
+        self._run_lists = None
+        self._feature_vectors = None
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+
+        state["_bins_cache"] = collections.OrderedDict()
+        state["_instance_indices"] = None
+        state["_run_lists"] = None
+        state["_feature_vectors"] = None
+
+        return state
+
+    def __len__(self):
+        """Number of instances for which data are stored."""
+
+        return len(self._columns)
+
+    def add_run(self, id_, run):
+        """Array-backed run data cannot be modified."""
+
+        raise TypeError("array-backed run data are read-only; add runs to a copy()")
+
+    def add_feature_vector(self, id_, vector):
+        """Array-backed run data cannot be modified."""
+
+        raise TypeError("array-backed run data are read-only; add features to a copy()")
+
+    def copy(self):
+        """Return a mutable, record-based copy of these data."""
+
+        return self.columns.to_run_data()
+
+    def filter(self, *ids):
+        """Return a filtered set of run data."""
+
+        return self._subset(numpy.sort(self._get_positions(ids)))
+
+    def filter_features(self, names):
+        """Return a set of run data with only the specified features."""
+
+        columns = self._columns
+        f_indices = [columns.feature_names.index(name) for name in names]
+
+        return \
+            ArrayRunData(
+                RunColumns(
+                    columns.instance_ids,
+                    columns.solver_names,
+                    list(names),
+                    columns.instances_R,
+                    columns.solvers_R,
+                    columns.budgets_R,
+                    columns.costs_R,
+                    columns.successes_R,
+                    numpy.asarray(columns.features_NF)[:, f_indices],
+                    ),
+                )
+
+    def masked(self, mask):
+        """Return a subset of the instances."""
+
+        return self._subset(numpy.nonzero(mask)[0])
+
+    def only_successful(self):
+        """Return only instances on which some solver succeeded."""
+
+        return self._subset(numpy.nonzero(self._count_per_instance(self._columns.successes_R))[0])
+
+    def only_nontrivial(self, threshold = 1.0):
+        """Return only instances on which some solver succeeded."""
+
+        columns = self._columns
+        nontrivial_R = numpy.logical_or(~columns.successes_R, columns.costs_R > threshold)
+
+        return self._subset(numpy.nonzero(self._count_per_instance(nontrivial_R))[0])
+
+    def only_nonempty(self):
+        """Return only instances on which some solver succeeded."""
+
+        return self._subset(numpy.nonzero(self._count_per_instance())[0])
+
+    def runs_on(self, id_, solver):
+        """Retrieve runs made by a solver on an instance."""
+
+        columns = self._columns
+        n = self._get_instance_indices()[id_]
+        (start, end) = numpy.searchsorted(columns.instances_R, [n, n + 1])
+
+        for r in xrange(start, end):
+            if columns.solver_names[columns.solvers_R[r]] == solver:
+                yield \
                     RunRecord(
                         solver,
-                        float(budget_str),
-                        float(cost_str),
-                        succeeded_str.lower() == "true",
+                        float(columns.budgets_R[r]),
+                        float(columns.costs_R[r]),
+                        bool(columns.successes_R[r]),
+                        )
+
+    def get_feature_vector(self, id_):
+        """Retrieve features of a task."""
+
+        columns = self._columns
+        n = self._get_instance_indices()[id_]
+
+        return dict(zip(columns.feature_names, map(float, columns.features_NF[n])))
+
+    def get_feature_vectors(self):
+        """Retrieve features of all tasks."""
+
+        return self.feature_vectors
+
+    def get_common_budget(self):
+        """Retrieve the common run budget, if any."""
+
+        budgets_R = numpy.asarray(self.columns.budgets_R)
+
+        if budgets_R.shape[0] == 0:
+            return None
+        elif numpy.any(budgets_R != budgets_R[0]):
+            raise Exception("collected runs include multiple run budgets")
+        else:
+            return float(budgets_R[0])
+
+    def get_run_count(self):
+        """Return the number of runs stored."""
+
+        return self._columns.get_run_count()
+
+    def to_features_array(self):
+        """Retrieve feature values in an array."""
+
+        columns = self._columns
+        f_indices = [columns.feature_names.index(name) for name in self.common_features]
+
+        return numpy.array(columns.features_NF[:, f_indices], numpy.double)
+
+    def to_runs_array(self, solver_names):
+        """Return run durations as a partially-filled array."""
+
+        columns = self._columns
+        S = len(solver_names)
+        N = len(columns)
+
+        # accumulate the success and failure counts
+        ns_R = numpy.asarray(columns.instances_R)
+        ss_R = columns.get_solver_codes(solver_names)
+        successes_R = numpy.asarray(columns.successes_R)
+        cells_R = ns_R * S + ss_R
+
+        successes_NS = numpy.bincount(cells_R[successes_R], minlength = N * S).reshape((N, S)).astype(numpy.intc)
+        failures_NS = numpy.bincount(cells_R[~successes_R], minlength = N * S).reshape((N, S)).astype(numpy.intc)
+
+        R = numpy.max(successes_NS)
+
+        # fill in run durations, in stored order within each cell
+        durations_NSR = numpy.ones((N, S, R), numpy.double) * numpy.nan
+
+        cells_U = cells_R[successes_R]
+        costs_U = numpy.asarray(columns.costs_R)[successes_R]
+        order = numpy.argsort(cells_U, kind = "mergesort")
+        sorted_cells_U = cells_U[order]
+        ranks_U = numpy.arange(sorted_cells_U.shape[0]) - numpy.searchsorted(sorted_cells_U, sorted_cells_U)
+
+        durations_NSR.reshape((N * S, R))[sorted_cells_U, ranks_U] = costs_U[order]
+
+        return (successes_NS, failures_NS, durations_NSR)
+
+    def to_times_arrays(self):
+        """Return run durations as per-solver arrays."""
+
+        columns = self._columns
+        S = len(self.solver_names)
+        N = len(columns)
+
+        ns_R = numpy.asarray(columns.instances_R)
+        ss_R = columns.get_solver_codes(self.solver_names)
+        successes_R = numpy.asarray(columns.successes_R)
+        costs_R = numpy.asarray(columns.costs_R)
+
+        times_arrays = []
+        ns_arrays = []
+
+        for s in xrange(S):
+            mask_R = numpy.logical_and(successes_R, ss_R == s)
+
+            times_arrays.append(costs_R[mask_R])
+            ns_arrays.append(ns_R[mask_R])
+
+        failed_R = ~successes_R
+        failures_NS = \
+            numpy.bincount(ns_R[failed_R] * S + ss_R[failed_R], minlength = N * S) \
+                .reshape((N, S)) \
+                .astype(numpy.intc)
+
+        return (times_arrays, ns_arrays, failures_NS)
+
+    def to_bins_array(self, solver_names, B, cutoff = None, edges = None):
+        """
+        Return discretized run duration counts.
+
+        If B upper bin edges are given, in seconds, durations are binned at
+        those edges, and the last edge is the cutoff.
+        """
+
+        if edges is None:
+            (outcomes_NSC,) = self.to_bins_arrays(solver_names, [B], cutoff)
+        else:
+            outcomes_NSC = self._get_edged_bins_array(solver_names, check_bin_edges(edges, B))
+
+        return outcomes_NSC
+
+    def to_bins_arrays(self, solver_names, Bs, cutoff = None):
+        """Return discretized run duration counts at several resolutions."""
+
+        if cutoff is None:
+            cutoff = self.common_budget
+
+        return map(numpy.copy, self._get_bins_arrays(solver_names, Bs, cutoff))
+
+    def _get_bins_arrays(self, solver_names, Bs, cutoff):
+        """Return (shared, cached) discretized run duration counts."""
+
+        found = {}
+
+        for B in Bs:
+            key = (tuple(solver_names), B, cutoff)
+            outcomes_NSC = self._bins_cache.pop(key, None)
+
+            if outcomes_NSC is not None:
+                self._bins_cache[key] = found[B] = outcomes_NSC
+
+        missing = sorted(set(B for B in Bs if B not in found))
+
+        if missing:
+            computed = self._columns.to_bins_arrays(solver_names, missing, cutoff)
+
+            for (B, outcomes_NSC) in zip(missing, computed):
+                self._bins_cache[(tuple(solver_names), B, cutoff)] = found[B] = outcomes_NSC
+
+        # evict the least recently used
+        while len(self._bins_cache) > self._bins_cache_size:
+            self._bins_cache.popitem(last = False)
+
+        return [found[B] for B in Bs]
+
+    def _get_edged_bins_array(self, solver_names, edges):
+        """Return run duration counts discretized at upper bin edges."""
+
+        return self._columns.to_edged_bins_array(solver_names, edges)
+
+    def _get_instance_indices(self):
+        """Map instance ids to positions."""
+
+        if self._instance_indices is None:
+            self._instance_indices = dict((id_, n) for (n, id_) in enumerate(self._columns.instance_ids))
+
+        return self._instance_indices
+
+    def _get_positions(self, ids):
+        """Map instance ids to positions in these data."""
+
+        indices = self._get_instance_indices()
+
+        return numpy.array([indices[id_] for id_ in ids], numpy.intp)
+
+    def _count_per_instance(self, mask_R = None):
+        """Count (matching) runs on each instance."""
+
+        instances_R = numpy.asarray(self._columns.instances_R)
+
+        if mask_R is not None:
+            instances_R = instances_R[numpy.asarray(mask_R)]
+
+        return numpy.bincount(instances_R, minlength = len(self._columns))
+
+    def _subset(self, ns):
+        """Return a view of a (sorted) subset of instance positions."""
+
+        return ArrayRunDataView(self, ns)
+
+    @property
+    def common_budget(self):
+        """The common run budget, if any."""
+
+        if self._common_budget is None:
+            self._common_budget = self.get_common_budget()
+
+        return self._common_budget
+
+    @common_budget.setter
+    def common_budget(self, value):
+        self._common_budget = value
+
+    @property
+    def run_lists(self):
+        """Per-instance lists of run records, built on first use."""
+
+        if self._run_lists is None:
+            columns = self.columns
+            run_lists = dict((id_, []) for id_ in columns.instance_ids)
+
+            for r in xrange(columns.get_run_count()):
+                run_lists[columns.instance_ids[columns.instances_R[r]]].append(
+                    RunRecord(
+                        columns.solver_names[columns.solvers_R[r]],
+                        float(columns.budgets_R[r]),
+                        float(columns.costs_R[r]),
+                        bool(columns.successes_R[r]),
                         ),
                     )
-                solver_names.add(solver)
-
-        run_data.solver_names = sorted(solver_names)
 
-        # load features
-        features_csv_path = os.path.join(bundle_path, "all_features.csv.gz")
+            self._run_lists = run_lists
 
-        logger.info("reading feature data from %s", features_csv_path)
+        return self._run_lists
 
-        with borg.util.openz(features_csv_path) as csv_file:
-            csv_reader = csv.reader(csv_file)
+    @property
+    def feature_vectors(self):
+        """Per-instance feature dictionaries, built on first use."""
 
-            try:
-                columns = csv_reader.next()
-            except StopIteration:
-                pass
+        if self._feature_vectors is None:
+            if self._columns.feature_names:
+                self._feature_vectors = dict((id_, self.get_feature_vector(id_)) for id_ in self.ids)
             else:
-                if columns[0] != "instance":
-                    raise Exception("unexpected columns in features CSV file")
+                self._feature_vectors = {}
 
-                for row in csv_reader:
-                    feature_dict = dict(zip(columns[1:], map(float, row[1:])))
+        return self._feature_vectors
 
-                    run_data.add_feature_vector(row[0], feature_dict)
+    @property
+    def columns(self):
+        """The underlying run and feature columns."""
 
-                assert set(run_data.run_lists) == set(run_data.feature_vectors)
+        return self._columns
 
-        return run_data
+    @property
+    def ids(self):
+        """All associated instance ids."""
 
-TrainingData = RunData
+        return list(self._columns.instance_ids)
+
+class ArrayRunDataView(ArrayRunData):
+    """
+    Subset of array-backed run data.
+
+    Holds only a sorted array of instance positions into its parent. The array
+    conversions are computed (and cached) on the parent and then indexed, so
+    creating a view, or many views of the same data, costs index arithmetic
+    rather than copies of the runs.
+    """
+
+    def __init__(self, parent, ns):
+        """Initialize."""
+
+        self.solver_names = parent.solver_names
+        self.common_features = parent.common_features
+
+        self._parent = parent
+        self._ns = numpy.asarray(ns, numpy.intp)
+        self._columns = parent._columns
+        self._common_budget = parent._common_budget
+        self._subset_columns = None
+        self._run_lists = None
+        self._feature_vectors = None
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+
+        state["_subset_columns"] = None
+        state["_run_lists"] = None
+        state["_feature_vectors"] = None
+
+        return state
+
+    def __len__(self):
+        """Number of instances for which data are stored."""
+
+        return self._ns.shape[0]
+
+    def filter_features(self, names):
+        """Return a set of run data with only the specified features."""
+
+        return self._parent.filter_features(names)._subset(self._ns)
+
+    def runs_on(self, id_, solver):
+        """Retrieve runs made by a solver on an instance."""
+
+        self._get_positions([id_])
+
+        return self._parent.runs_on(id_, solver)
+
+    def get_feature_vector(self, id_):
+        """Retrieve features of a task."""
+
+        self._get_positions([id_])
+
+        return self._parent.get_feature_vector(id_)
+
+    def get_run_count(self):
+        """Return the number of runs stored."""
+
+        return int(numpy.sum(self._parent._count_per_instance()[self._ns]))
+
+    def to_features_array(self):
+        """Retrieve feature values in an array."""
+
+        return self._parent.to_features_array()[self._ns]
+
+    def to_runs_array(self, solver_names):
+        """Return run durations as a partially-filled array."""
+
+        (successes_NS, failures_NS, durations_NSR) = self._parent.to_runs_array(solver_names)
+        successes_NS = successes_NS[self._ns]
+        R = numpy.max(successes_NS)
+
+        return (successes_NS, failures_NS[self._ns], durations_NSR[self._ns, :, :R])
+
+    def to_times_arrays(self):
+        """Return run durations as per-solver arrays."""
+
+        (times_arrays, ns_arrays, failures_NS) = self._parent.to_times_arrays()
+        members_N = numpy.zeros(len(self._parent), numpy.bool_)
+        members_N[self._ns] = True
+        renumbered_N = numpy.cumsum(members_N) - 1
+
+        times_arrays = [t[members_N[n]] for (t, n) in zip(times_arrays, ns_arrays)]
+        ns_arrays = [renumbered_N[n[members_N[n]]] for n in ns_arrays]
+
+        return (times_arrays, ns_arrays, failures_NS[self._ns])
+
+    def _get_bins_arrays(self, solver_names, Bs, cutoff):
+        """Return discretized run duration counts."""
+
+        return [a[self._ns] for a in self._parent._get_bins_arrays(solver_names, Bs, cutoff)]
+
+    def _get_edged_bins_array(self, solver_names, edges):
+        """Return run duration counts discretized at upper bin edges."""
+
+        return self._parent._get_edged_bins_array(solver_names, edges)[self._ns]
+
+    def _get_positions(self, ids):
+        """Map instance ids to positions in these data."""
+
+        parent_ns = self._parent._get_positions(ids)
+        ns = numpy.searchsorted(self._ns, parent_ns)
+
+        if numpy.any(ns >= self._ns.shape[0]) or numpy.any(self._ns[numpy.minimum(ns, len(self) - 1)] != parent_ns):
+            raise KeyError("instance is not in this subset")
+
+        return ns
+
+    def _count_per_instance(self, mask_R = None):
+        """Count (matching) runs on each instance."""
+
+        return self._parent._count_per_instance(mask_R)[self._ns]
+
+    def _subset(self, ns):
+        """Return a view of a (sorted) subset of instance positions."""
+
+        return ArrayRunDataView(self._parent, self._ns[ns])
+
+    @property
+    def columns(self):
+        """The run and feature columns of this subset, gathered on first use."""
+
+        if self._subset_columns is None:
+            self._subset_columns = self._columns.take(self._ns)
+
+        return self._subset_columns
+
+    @property
+    def ids(self):
+        """All associated instance ids."""
+
+        instance_ids = self._columns.instance_ids
 
+        return [instance_ids[n] for n in self._ns]
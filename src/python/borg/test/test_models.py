@@ -27,6 +27,29 @@ def test_sampled_pmfs_log_pmf():
     nose.tools.assert_almost_equal(numpy.exp(logs[0, 1]), 0.9**2)
     nose.tools.assert_almost_equal(numpy.exp(logs[0, 2]), 0.1 * 0.9**2)
 
+def test_sampled_pmfs_log_pmf_dense():
+    """Test borg.models.sampled_pmfs_log_pmf_dense()."""
+
+    cdfs = \
+        numpy.log([
+            [[0.1, 0.9, 0.0], [0.5, 0.25, 0.25]],
+            [[0.0, 0.0, 1.0], [0.9, 0.1, 0.0]],
+            ])
+    counts = \
+        numpy.array(
+            [
+                [[1, 0, 0], [0, 2, 1]],
+                [[0, 0, 1], [2, 0, 0]],
+                [[2, 1, 0], [0, 0, 0]],
+                ],
+            numpy.intc,
+            )
+    logs = borg.models.sampled_pmfs_log_pmf(cdfs, counts)
+    dense_logs = borg.models.sampled_pmfs_log_pmf_dense(cdfs, counts)
+
+    nose.tools.assert_equal(numpy.isinf(logs).tolist(), numpy.isinf(dense_logs).tolist())
+    nose.tools.assert_true(numpy.allclose(logs[~numpy.isinf(logs)], dense_logs[~numpy.isinf(dense_logs)]))
+
 def test_kernel_model_sample():
     """Test borg.models.KernelModel.sample()."""
 
@@ -1,5 +1,6 @@
 """@author: Bryan Silverthorn <bcs@cargo-cult.org>"""
 
+import cPickle as pickle
 import nose.tools
 import numpy
 import borg
@@ -47,6 +48,148 @@ def test_knapsack_planner():
     yield (assert_knapsack_planner_ok, "long")
     yield (assert_knapsack_planner_ok, "2worlds")
 
+def test_knapsack_planner_threads():
+    planner = borg.planners.KnapsackPlanner(threads = 4)
+
+    def assert_knapsack_planner_ok(world_name):
+        assert_planner_ok(planner, world_name)
+
+    yield (assert_knapsack_planner_ok, "short")
+    yield (assert_knapsack_planner_ok, "long")
+    yield (assert_knapsack_planner_ok, "2worlds")
+
+def test_knapsack_plan_batch():
+    numpy.random.seed(42)
+
+    log_survival = numpy.log(numpy.sort(numpy.random.random((16, 3, 12)), axis = -1)[..., ::-1])
+
+    for planner in [borg.planners.KnapsackPlanner(threads = 2), borg.planners.default]:
+        plans = planner.plan_batch(log_survival)
+
+        nose.tools.assert_equal(plans, [planner.plan(log_survival_SB[None, ...]) for log_survival_SB in log_survival])
+
+def test_knapsack_plan_state():
+    numpy.random.seed(42)
+
+    log_survival = numpy.log(numpy.sort(numpy.random.random((8, 3, 12)), axis = -1)[..., ::-1])
+    log_weights = numpy.log(numpy.ones(8) / 8)
+    planner = borg.planners.KnapsackPlanner()
+    state = planner.start(log_survival, log_weights)
+
+    for (B, failure) in [(12, (1, 2)), (9, (0, 3)), (5, None), (3, None)]:
+        nose.tools.assert_equal(state.plan(B), planner.plan(log_survival[..., :B], log_weights))
+
+        if failure is not None:
+            state.condition(*failure)
+
+            log_weights = log_weights + log_survival[:, failure[0], failure[1]]
+            log_weights -= numpy.logaddexp.reduce(log_weights)
+
+def test_knapsack_planner_durations():
+    planner = borg.planners.KnapsackPlanner()
+
+    for world_name in ["short", "long", "2worlds"]:
+        (log_survival, log_weights, _) = worlds[world_name]
+
+        nose.tools.assert_equal(
+            planner.plan(log_survival, log_weights, [1.0, 2.0, 3.0, 4.0]),
+            planner.plan(log_survival, log_weights),
+            )
+
+    # with narrow later bins, a single long run beats two short runs
+    log_survival = numpy.log([[[0.9, 0.4, 0.3, 0.25]]])
+    durations = [1.0, 2.0, 2.5, 3.5]
+
+    nose.tools.assert_equal(planner.plan(log_survival), [(0, 1), (0, 1)])
+    nose.tools.assert_equal(planner.plan(log_survival, None, durations), [(0, 3)])
+
+    state = borg.planners.default.start(log_survival, None, durations)
+
+    nose.tools.assert_equal(state.plan(3), [(0, 2)])
+
+def test_planners_accepting_durations():
+    (log_survival, log_weights, _) = worlds["short"]
+    durations = [1.0, 2.0, 2.5, 3.5]
+    knapsack = borg.planners.KnapsackPlanner()
+
+    nose.tools.assert_true(borg.planners.default.accepts_durations)
+    nose.tools.assert_true(borg.planners.CachingPlanner(knapsack).accepts_durations)
+    nose.tools.assert_false(borg.planners.StreeterPlanner().accepts_durations)
+    nose.tools.assert_false(borg.planners.BellmanPlanner().accepts_durations)
+    nose.tools.assert_false(borg.planners.ResumptionPlanner(knapsack).accepts_durations)
+    nose.tools.assert_raises(ValueError, borg.planners.StreeterPlanner().plan, log_survival, log_weights, durations)
+    nose.tools.assert_raises(ValueError, borg.planners.ReorderingPlanner(borg.planners.StreeterPlanner()).plan, log_survival, log_weights, durations)
+
+def test_caching_planner():
+    (log_survival, log_weights, _) = worlds["2worlds"]
+    inner = borg.planners.KnapsackPlanner()
+    planner = borg.planners.CachingPlanner(inner, size = 3)
+    state = planner.start(log_survival, log_weights)
+    plan = state.plan(4)
+
+    nose.tools.assert_equal(plan, inner.plan(log_survival, log_weights))
+
+    plan.pop(0)
+    state.condition(0, 0)
+
+    expected = inner.start(log_survival, log_weights)
+
+    expected.condition(0, 0)
+
+    nose.tools.assert_equal(state.plan(3), expected.plan(3))
+
+    restored = pickle.loads(pickle.dumps(planner, protocol = -1))
+
+    nose.tools.assert_equal(restored.plan(log_survival, log_weights + 1e-6), inner.plan(log_survival, log_weights))
+    nose.tools.assert_equal(len(restored._plans), 2)
+
+def test_caching_planner_many_worlds():
+    W = 6000
+    log_survival = numpy.zeros((W, 2, 2))
+
+    log_survival[:W / 2, 0] = numpy.log(1e-3)
+    log_survival[W / 2:, 1] = numpy.log(1e-3)
+
+    log_weights_a = numpy.r_[numpy.zeros(W / 2), -numpy.inf * numpy.ones(W / 2)]
+    log_weights_b = log_weights_a[::-1]
+    inner = borg.planners.KnapsackPlanner()
+    planner = borg.planners.CachingPlanner(inner)
+
+    nose.tools.assert_equal(planner.plan(log_survival, log_weights_a), inner.plan(log_survival, log_weights_a))
+    nose.tools.assert_equal(planner.plan(log_survival, log_weights_b), inner.plan(log_survival, log_weights_b))
+    nose.tools.assert_equal(planner.plan(log_survival, log_weights_b)[0], (1, 0))
+    nose.tools.assert_equal(len(planner._plans), 2)
+
+    # keys stay small however many worlds there are
+    nose.tools.assert_true(all(len(digest) == 40 for (digest, _, _) in planner._plans))
+
+def test_parallel_planner():
+    log_survival = \
+        numpy.array([
+            [[0.0, 0.0, -numpy.inf, -numpy.inf], [0.0, 0.0, 0.0, 0.0]],
+            [[0.0, 0.0, 0.0, 0.0], [0.0, 0.0, -numpy.inf, -numpy.inf]],
+            ])
+    log_weights = numpy.log([0.6, 0.4])
+    planner = borg.planners.ParallelPlanner(borg.planners.KnapsackPlanner())
+
+    def log_failure(cores):
+        plans = planner.plan(log_survival, log_weights, cores)
+
+        nose.tools.assert_equal(len(plans), cores)
+
+        return numpy.logaddexp.reduce(log_weights + borg.planners.plans_log_survival(log_survival, plans))
+
+    nose.tools.assert_almost_equal(log_failure(1), numpy.log(0.4))
+    nose.tools.assert_equal(log_failure(2), -numpy.inf)
+
+    # with narrow later bins, each core makes a single long run
+    log_survival = numpy.log([[[0.9, 0.4, 0.3, 0.25]]])
+    durations = [1.0, 2.0, 2.5, 3.5]
+
+    nose.tools.assert_true(planner.accepts_durations)
+    nose.tools.assert_equal(planner.plan(log_survival, None, 2, durations), [[(0, 3)], [(0, 3)]])
+    nose.tools.assert_raises(ValueError, borg.planners.ParallelPlanner(borg.planners.StreeterPlanner()).plan, log_survival, None, 2, durations)
+
 def test_max_length_knapsack_planner():
     planner = borg.planners.MaxLengthKnapsackPlanner(3)
 
@@ -68,6 +211,47 @@ def test_streeter_planner():
     #yield (assert_streeter_planner_ok, "long")
     yield (assert_streeter_planner_ok, "2worlds")
 
+def test_replanning_planner():
+    planner = borg.planners.ReplanningPlanner(borg.planners.KnapsackPlanner())
+
+    def assert_replanning_planner_ok(world_name):
+        assert_planner_ok(planner, world_name)
+
+    yield (assert_replanning_planner_ok, "short")
+    yield (assert_replanning_planner_ok, "long")
+    yield (assert_replanning_planner_ok, "2worlds")
+
+def test_resumption_planner():
+    planner = borg.planners.ResumptionPlanner(borg.planners.KnapsackPlanner())
+    log_survival = \
+        numpy.log([
+            [[0.9, 0.8, 0.1, 0.05], [1.0, 1.0, 0.7, 0.6]],
+            [[1.0, 1.0, 1.0, 1.0], [0.5, 0.5, 0.5, 0.5]],
+            ])
+    state = planner.start(log_survival, numpy.log([0.9, 0.1]))
+
+    state.condition(0, 0)
+
+    nose.tools.assert_equal(sorted(state.plan(3)), [(0, 1), (1, 0)])
+    nose.tools.assert_equal(planner.plan(log_survival[..., :1], numpy.log([0.9, 0.1])), [(0, 0)])
+
+def test_lazy_streeter_planner():
+    planner = borg.planners.LazyStreeterPlanner()
+
+    def assert_lazy_streeter_planner_ok(world_name):
+        assert_planner_ok(planner, world_name)
+
+    yield (assert_lazy_streeter_planner_ok, "short")
+    yield (assert_lazy_streeter_planner_ok, "2worlds")
+
+def test_lazy_streeter_planner_matches():
+    numpy.random.seed(42)
+
+    log_survival = numpy.log(numpy.sort(numpy.random.random((16, 4, 10)), axis = -1)[..., ::-1])
+    plan = borg.planners.LazyStreeterPlanner().plan(log_survival)
+
+    nose.tools.assert_equal(plan, map(tuple, borg.planners.StreeterPlanner().plan(log_survival)))
+
 def test_bellman_planner():
     planner = borg.planners.BellmanPlanner()
 
@@ -78,6 +262,36 @@ def test_bellman_planner():
     yield (assert_bellman_planner_ok, "long")
     yield (assert_bellman_planner_ok, "2worlds")
 
+def test_pruned_bellman_planner():
+    planner = borg.planners.PrunedBellmanPlanner()
+
+    def assert_pruned_bellman_planner_ok(world_name):
+        assert_planner_ok(planner, world_name)
+
+    yield (assert_pruned_bellman_planner_ok, "short")
+    yield (assert_pruned_bellman_planner_ok, "long")
+    yield (assert_pruned_bellman_planner_ok, "2worlds")
+
+def test_pruned_bellman_planner_optimal():
+    log_survival = \
+        numpy.log([
+            [[0.9, 0.9, 0.9, 0.9], [0.1, 0.1, 0.1, 0.1]],
+            [[1.0, 1.0, 1.0, 1.0], [1.0, 1.0, 0.3, 0.3]],
+            [[0.5, 0.5, 0.5, 0.5], [1.0, 1.0, 1.0, 1.0]],
+            ])
+    log_weights = -numpy.ones(3) * numpy.log(3)
+
+    def log_failure(plan):
+        return numpy.logaddexp.reduce(log_weights + sum(log_survival[:, s, b] for (s, b) in plan))
+
+    optimal = log_failure(borg.planners.BellmanPlanner().plan(log_survival, log_weights))
+    pruned = borg.planners.PrunedBellmanPlanner().plan(log_survival, log_weights)
+    limited = borg.planners.PrunedBellmanPlanner(node_limit = 1).plan(log_survival, log_weights)
+
+    nose.tools.assert_equal(sorted(pruned), [(0, 0), (1, 2)])
+    nose.tools.assert_almost_equal(log_failure(pruned), optimal)
+    nose.tools.assert_equal(limited, borg.planners.KnapsackPlanner().plan(log_survival, log_weights))
+
 def test_bellman_planner_short():
     plan = \
         borg.planners.BellmanPlanner().plan(
@@ -0,0 +1,76 @@
+"""@author: Bryan Silverthorn <bcs@cargo-cult.org>"""
+
+import numpy
+import nose.tools
+import borg
+
+class FakeRunningSolver(object):
+    """Report each grant at once, as if fully spent."""
+
+    def __init__(self, factory, stm_queue, solver_id):
+        self._factory = factory
+        self._stm_queue = stm_queue
+        self._solver_id = solver_id
+
+    def unpause_for(self, budget):
+        self._factory.grants.append(budget)
+
+        self._stm_queue.put((self._solver_id, budget, self._factory.answer, True))
+
+    def stop(self):
+        self._factory.stopped += 1
+
+class FakeSolverFactory(object):
+    def __init__(self, answer = None):
+        self.answer = answer
+        self.grants = []
+        self.stopped = 0
+
+    def __call__(self, task, stm_queue = None, solver_id = None):
+        return FakeRunningSolver(self, stm_queue, solver_id)
+
+class FakeDomain(object):
+    def is_final(self, task, answer):
+        return answer is not None
+
+class FakeSuite(object):
+    def __init__(self, answers):
+        self.domain = FakeDomain()
+        self.solvers = dict((name, FakeSolverFactory(answer)) for (name, answer) in answers.items())
+
+log_survival = \
+    numpy.log([
+        [[0.9, 0.5, 0.45, 0.44, 0.43], [0.95, 0.9, 0.8, 0.6, 0.4]],
+        [[0.9, 0.9, 0.9, 0.9, 0.9], [0.9, 0.1, 0.1, 0.1, 0.1]],
+        ])
+
+def test_pure_model_portfolio_cores():
+    for edges in [None, numpy.array([0.5, 1.0, 2.5, 3.5])]:
+        suite = FakeSuite({"a": None, "b": None})
+        model = borg.models.MultinomialModel(1.0, log_survival, edges = edges)
+        portfolio = borg.portfolios.PureModelPortfolio(suite, model)
+        budget = 6.0
+
+        # solvers that always fail spend no more than the budget, in total
+        with borg.accounting() as accountant:
+            nose.tools.assert_equal(portfolio(None, suite, borg.Cost(cpu_seconds = budget), 2), None)
+
+        grants = suite.solvers["a"].grants + suite.solvers["b"].grants
+
+        nose.tools.assert_true(len(grants) > 2)
+        nose.tools.assert_true(sum(grants) <= budget + 1e-9)
+        nose.tools.assert_true(accountant.total.cpu_seconds >= sum(grants))
+        nose.tools.assert_equal(suite.solvers["a"].stopped + suite.solvers["b"].stopped, len(grants))
+
+def test_pure_model_portfolio_cores_answer():
+    suite = FakeSuite({"a": "yes", "b": "yes"})
+    portfolio = borg.portfolios.PureModelPortfolio(suite, borg.models.MultinomialModel(1.0, log_survival))
+
+    with borg.accounting():
+        nose.tools.assert_equal(portfolio(None, suite, borg.Cost(cpu_seconds = 3.0), 2), "yes")
+
+    # the first answer ends the solve, and every started solver is stopped
+    started = len(suite.solvers["a"].grants) + len(suite.solvers["b"].grants)
+
+    nose.tools.assert_equal(started, 2)
+    nose.tools.assert_equal(suite.solvers["a"].stopped + suite.solvers["b"].stopped, 2)
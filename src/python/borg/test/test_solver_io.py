@@ -0,0 +1,203 @@
+"""@author: Bryan Silverthorn <bcs@cargo-cult.org>"""
+
+import os
+import time
+import signal
+import Queue
+import datetime
+import nose.tools
+import borg
+
+def parse_output(stdout):
+    return stdout.strip() or None
+
+spin_command = ["sh", "-c", "echo started; while :; do :; done"]
+
+def test_running_solver_terminates():
+    solver = borg.solver_io.RunningSolver(parse_output, ["sh", "-c", "echo {task}"], "/", "foo")
+
+    with borg.accounting() as accountant:
+        nose.tools.assert_equal(solver(10.0), "foo")
+
+    nose.tools.assert_true(accountant.total.cpu_seconds < 10.0)
+
+def test_running_solver_pause_resume():
+    solver = borg.solver_io.RunningSolver(parse_output, spin_command, "/", "/dev/null", solver_id = "a")
+
+    try:
+        # a solver pauses once its (cumulative) budget is spent, and resumes
+        # when granted more
+        costs = []
+
+        for budget in [0.2, 0.3]:
+            solver.unpause_for(budget)
+
+            (solver_id, cost, answer, terminated) = solver._stm_queue.get(timeout = 30.0)
+
+            nose.tools.assert_equal(solver_id, "a")
+            nose.tools.assert_equal(answer, None)
+            nose.tools.assert_false(terminated)
+
+            costs.append(cost)
+
+        nose.tools.assert_true(sum(costs) >= 0.5)
+        nose.tools.assert_true(sum(costs) < 5.0)
+    finally:
+        solver.stop()
+
+def test_running_solver_exits_while_paused():
+    solver = borg.solver_io.RunningSolver(parse_output, spin_command, "/", "/dev/null")
+
+    try:
+        solver.unpause_for(0.2)
+        solver._stm_queue.get(timeout = 30.0)
+
+        # a paused solver that is killed reports termination when resumed
+        os.kill(solver._run.popened.pid, signal.SIGKILL)
+        time.sleep(0.1)
+
+        solver.unpause_for(10.0)
+
+        (_, cost, answer, terminated) = solver._stm_queue.get(timeout = 30.0)
+
+        nose.tools.assert_true(cost < 1.0)
+        nose.tools.assert_equal(answer, "started")
+        nose.tools.assert_true(terminated)
+    finally:
+        solver.stop()
+
+def test_solver_supervisor_charges_exit_while_paused():
+    class Accountant(object):
+        total = datetime.timedelta(seconds = 0.75)
+
+        def audit(self):
+            pass
+
+    supervisor = borg.solver_io.SolverSupervisor(slots = 0)
+
+    try:
+        # a run paused after spending 0.5 s, then exited having spent 0.75 s
+        run = borg.solver_io.SolverRun(parse_output, ["true"], Queue.Queue(), "a", None)
+        run.accountant = Accountant()
+        run.expenditure = datetime.timedelta(seconds = 0.5)
+        run.stdout = ["done\n"]
+        run.terminated = True
+
+        supervisor._unpause(run, 10.0)
+
+        (solver_id, cost, answer, terminated) = run.stm_queue.get(timeout = 30.0)
+
+        nose.tools.assert_almost_equal(cost, 0.25)
+        nose.tools.assert_equal(answer, "done")
+        nose.tools.assert_true(terminated)
+    finally:
+        supervisor.close()
+
+def test_running_solvers_share_queue():
+    stm_queue = Queue.Queue()
+    solvers = [
+        borg.solver_io.RunningSolver(parse_output, ["echo", str(i)], "/", "/dev/null", stm_queue, i)
+        for i in xrange(3)
+        ]
+
+    try:
+        for solver in solvers:
+            solver.unpause_for(10.0)
+
+        responses = sorted(stm_queue.get(timeout = 30.0) for _ in solvers)
+
+        nose.tools.assert_equal([(i, a, t) for (i, _, a, t) in responses], [(i, str(i), True) for i in xrange(3)])
+    finally:
+        for solver in solvers:
+            solver.stop()
+
+def test_running_solver_stop():
+    solver = borg.solver_io.RunningSolver(parse_output, ["sh", "-c", "sleep 60 & wait"], "/", "/dev/null")
+
+    solver.unpause_for(60.0)
+
+    sid = solver._run.popened.pid
+
+    def session():
+        return [p for p in borg.unix.proc.ProcessStat.in_session(sid) if p.state != "Z"]
+
+    while len(session()) < 2:
+        time.sleep(0.01)
+
+    # stopping kills the whole session, and removes its temporary directory
+    solver.stop()
+
+    nose.tools.assert_equal(session(), [])
+    nose.tools.assert_false(os.path.exists(solver._tmpdir))
+
+    # and stopping a solver that never started is harmless
+    borg.solver_io.RunningSolver(parse_output, ["true"], "/", "/dev/null").stop()
+
+def test_running_solver_bad_command():
+    solver = borg.solver_io.RunningSolver(parse_output, ["/nonexistent/solver"], "/", "/dev/null")
+
+    try:
+        nose.tools.assert_raises(OSError, solver, 1.0)
+    finally:
+        solver.stop()
+
+def test_running_solver_warm_slots():
+    previous = borg.solver_io.supervisor
+    supervisor = borg.solver_io.SolverSupervisor(slots = 2)
+
+    borg.solver_io.supervisor = supervisor
+
+    try:
+        for i in xrange(4):
+            solver = borg.solver_io.RunningSolver(parse_output, ["echo", "{tmpdir}"], "/", "/dev/null")
+
+            nose.tools.assert_equal(solver(10.0), solver._tmpdir)
+            nose.tools.assert_false(os.path.exists(solver._tmpdir))
+    finally:
+        borg.solver_io.supervisor = previous
+
+        supervisor.close()
+
+    nose.tools.assert_equal(supervisor._slots, [])
+
+def test_solver_supervisor_failure():
+    previous = borg.solver_io.supervisor
+    supervisor = borg.solver_io.SolverSupervisor(slots = 0)
+
+    borg.solver_io.supervisor = supervisor
+
+    try:
+        solver = borg.solver_io.RunningSolver(parse_output, spin_command, "/", "/dev/null")
+
+        solver.unpause_for(0.1)
+        solver._stm_queue.get(timeout = 30.0)
+
+        sid = solver._run.popened.pid
+
+        def fail(timeout = -1):
+            raise OSError("injected monitor failure")
+
+        supervisor._monitor.wait = fail
+
+        # a running solver hears of the failure, and its session is killed
+        solver.unpause_for(10.0)
+
+        nose.tools.assert_true(isinstance(solver._stm_queue.get(timeout = 30.0), OSError))
+
+        supervisor._thread.join(30.0)
+
+        nose.tools.assert_false(supervisor._thread.is_alive())
+        nose.tools.assert_equal([p for p in borg.unix.proc.ProcessStat.in_session(sid) if p.state != "Z"], [])
+
+        # stopping returns, and later runs are refused
+        solver.stop()
+
+        other = borg.solver_io.RunningSolver(parse_output, spin_command, "/", "/dev/null")
+
+        nose.tools.assert_raises(RuntimeError, other.unpause_for, 10.0)
+
+        other.stop()
+    finally:
+        borg.solver_io.supervisor = previous
+
+        supervisor.close()
@@ -250,6 +250,50 @@ def test_dcm_estimate_ml_wallach_random():
 
             yield (assert_ok, alpha.tolist())
 
+def test_unique_rows():
+    counts = numpy.array([[[1, 0]], [[0, 2]], [[1, 0]], [[1, 0]]], numpy.intc)
+    (uniques, multiplicities, inverse) = borg.statistics.unique_rows(counts)
+
+    nose.tools.assert_equal(uniques.tolist(), [[[1, 0]], [[0, 2]]])
+    nose.tools.assert_equal(multiplicities.tolist(), [3.0, 1.0])
+    nose.tools.assert_equal(inverse.tolist(), [0, 1, 0, 0])
+
+def test_dcm_matrix_mixture_estimate_ml_threads():
+    counts = numpy.random.randint(4, size = (64, 3, 5)).astype(numpy.intc)
+
+    def fit(threads):
+        numpy.random.seed(42)
+
+        return borg.statistics.dcm_matrix_mixture_estimate_ml(counts, 4, threads = threads)
+
+    (components_serial, responsibilities_serial) = fit(1)
+    (components_parallel, responsibilities_parallel) = fit(4)
+
+    nose.tools.assert_true(numpy.array_equal(components_serial, components_parallel))
+    nose.tools.assert_true(numpy.array_equal(responsibilities_serial, responsibilities_parallel))
+
+def test_dcm_matrix_mixture_estimate_ml_incremental():
+    counts = numpy.random.randint(4, size = (64, 3, 5)).astype(numpy.intc)
+    (components, log_responsibilities) = borg.statistics.dcm_matrix_mixture_estimate_ml(counts[:48], 4)
+    statistics = borg.statistics.dcm_matrix_mixture_statistics(counts[:48], log_responsibilities)
+
+    nose.tools.assert_almost_equal(numpy.sum(statistics[1]), 48.0)
+
+    log_weights = numpy.log(numpy.sum(statistics[1], axis = -1) / 48.0)
+    (components, log_responsibilities) = \
+        borg.statistics.dcm_matrix_mixture_estimate_ml(
+            counts[48:],
+            4,
+            initial = (components, log_weights),
+            iterations = 4,
+            statistics = statistics,
+            )
+    statistics = borg.statistics.dcm_matrix_mixture_statistics(counts[48:], log_responsibilities, statistics)
+
+    nose.tools.assert_equal(log_responsibilities.shape, (4, 16))
+    nose.tools.assert_almost_equal(numpy.sum(statistics[1]), 64.0)
+    nose.tools.assert_true(numpy.all(numpy.isfinite(components)))
+
 def test_log_normal_estimate_ml():
     def assert_ok(mu, sigma, theta, terminus):
         values = numpy.exp(numpy.random.normal(mu, sigma, 64000)) + theta
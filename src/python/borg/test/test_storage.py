@@ -0,0 +1,365 @@
+"""@author: Bryan Silverthorn <bcs@cargo-cult.org>"""
+
+import os.path
+import cPickle
+import numpy
+import nose.tools
+import borg
+
+def make_run_data():
+    runs = [
+        ("bar", "solver_a", 100.0, 1.0, True),
+        ("foo", "solver_a", 100.0, 48.0, True),
+        ("foo", "solver_b", 100.0, 100.0, False),
+        ("bar", "solver_b", 100.0, 66.0, True),
+        ("foo", "solver_a", 100.0, 77.0, True),
+        ("bar", "solver_b", 100.0, 100.0, False),
+        ]
+
+    run_data = borg.RunData(["solver_a", "solver_b"])
+
+    for (instance, solver, budget, cost, success) in runs:
+        run_data.add_run(instance, borg.storage.RunRecord(solver, budget, cost, success))
+
+    run_data.add_feature_vector("foo", {"cpu_cost": 1.0, "size": 42.0})
+    run_data.add_feature_vector("bar", {"cpu_cost": 2.0, "size": 24.0})
+
+    return run_data
+
+def test_columnar_bundle_roundtrip():
+    run_data = make_run_data()
+
+    with borg.util.mkdtemp_scoped() as root:
+        bundle_path = os.path.join(root, "bundle")
+
+        borg.storage.RunColumns.from_run_data(run_data).save(bundle_path)
+
+        loaded = borg.RunData.from_bundle(bundle_path)
+
+        nose.tools.assert_equal(sorted(loaded.ids), sorted(run_data.ids))
+        nose.tools.assert_equal(loaded.get_run_count(), run_data.get_run_count())
+        nose.tools.assert_equal(
+            loaded.to_bins_array(run_data.solver_names, 4).tolist(),
+            run_data.to_bins_array(run_data.solver_names, 4).tolist(),
+            )
+        nose.tools.assert_equal(
+            loaded.to_features_array().tolist(),
+            run_data.to_features_array().tolist(),
+            )
+
+def write_task_files(root, name, runs, features = None):
+    """Write, or rewrite, the runs and features files of a task."""
+
+    task_path = os.path.join(root, name)
+
+    with open(task_path + ".runs.csv", "w") as runs_file:
+        runs_file.write("solver,budget,cost,succeeded,answer\n")
+
+        for (solver, cost, succeeded) in runs:
+            runs_file.write("{0},100.0,{1},{2},\n".format(solver, cost, succeeded))
+
+    if features is not None:
+        with open(task_path + ".features.csv", "w") as features_file:
+            features_file.write("cpu_cost,size\n{0},{1}\n".format(*features))
+
+    return task_path
+
+def append_task_runs(task_path, runs):
+    """Append runs to the runs file of a task."""
+
+    with open(task_path + ".runs.csv", "a") as runs_file:
+        for (solver, cost, succeeded) in runs:
+            runs_file.write("{0},100.0,{1},{2},\n".format(solver, cost, succeeded))
+
+def test_csv_bundle_append():
+    import borg.tools.bundle_run_data
+
+    with borg.util.mkdtemp_scoped() as root:
+        bundle_path = os.path.join(root, "bundle")
+        foo_path = write_task_files(root, "foo", [("solver_a", 1.0, True)], (1.0, 42.0))
+        bar_path = write_task_files(root, "bar", [("solver_b", 100.0, False)], (2.0, 24.0))
+
+        borg.tools.bundle_run_data.main(bundle_path, root)
+
+        loaded = borg.RunData.from_bundle(bundle_path)
+
+        nose.tools.assert_equal(loaded.get_run_count(), 2)
+
+        # a partial row is bundled only once complete
+        append_task_runs(foo_path, [("solver_b", 7.0, True)])
+
+        with open(bar_path + ".runs.csv", "a") as runs_file:
+            runs_file.write("solver_a,100.0")
+
+        borg.tools.bundle_run_data.main(bundle_path, root, append = True)
+
+        with open(bar_path + ".runs.csv", "a") as runs_file:
+            runs_file.write(",3.0,True,\n")
+
+        borg.tools.bundle_run_data.main(bundle_path, root, append = True)
+
+        # unchanged sources add nothing
+        borg.tools.bundle_run_data.main(bundle_path, root, append = True)
+
+        manifest = borg.util.load_json(os.path.join(bundle_path, borg.storage.csv_manifest_name))
+
+        nose.tools.assert_equal(manifest["segments"]["runs"], ["runs.000001.csv.gz", "runs.000002.csv.gz"])
+        nose.tools.assert_equal(manifest["segments"]["features"], [])
+
+        loaded = borg.RunData.from_bundle(bundle_path)
+
+        nose.tools.assert_equal(loaded.get_run_count(), 4)
+        nose.tools.assert_equal(sorted(loaded.solver_names), ["solver_a", "solver_b"])
+        nose.tools.assert_equal(
+            sorted(loaded.ids),
+            sorted([os.path.abspath(foo_path), os.path.abspath(bar_path)]),
+            )
+        nose.tools.assert_equal(loaded.to_features_array().tolist(), [[24.0], [42.0]])
+
+def test_csv_bundle_append_changed_source():
+    import borg.tools.bundle_run_data
+
+    with borg.util.mkdtemp_scoped() as root:
+        bundle_path = os.path.join(root, "bundle")
+        foo_path = write_task_files(root, "foo", [("solver_a", 1.0, True)], (1.0, 42.0))
+
+        borg.tools.bundle_run_data.main(bundle_path, root)
+
+        # rewritten in place, at the same size and then larger
+        bundled_mtime = os.path.getmtime(foo_path + ".runs.csv")
+
+        write_task_files(root, "foo", [("solver_a", 2.0, True)])
+
+        os.utime(foo_path + ".runs.csv", (bundled_mtime + 1.0, bundled_mtime + 1.0))
+
+        nose.tools.assert_raises(Exception, borg.tools.bundle_run_data.main, bundle_path, root, append = True)
+
+        write_task_files(root, "foo", [("solver_a", 2.0, True), ("solver_b", 3.0, True)])
+
+        nose.tools.assert_raises(Exception, borg.tools.bundle_run_data.main, bundle_path, root, append = True)
+
+        # and truncated
+        write_task_files(root, "foo", [])
+
+        nose.tools.assert_raises(Exception, borg.tools.bundle_run_data.main, bundle_path, root, append = True)
+
+def test_csv_bundle_append_without_manifest():
+    import borg.tools.bundle_run_data
+
+    with borg.util.mkdtemp_scoped() as root:
+        foo_path = write_task_files(root, "foo", [("solver_a", 1.0, True), ("solver_b", 2.0, True)], (1.0, 42.0))
+        write_task_files(root, "bar", [("solver_a", 100.0, False), ("solver_b", 5.0, True)], (2.0, 24.0))
+
+        for only_solver in [None, "solver_a"]:
+            # bundles written before manifests existed are migrated in place
+            bundle_path = os.path.join(root, "bundle.{0}".format(only_solver))
+            manifest_path = os.path.join(bundle_path, borg.storage.csv_manifest_name)
+
+            borg.tools.bundle_run_data.main(bundle_path, root, only_solver = only_solver)
+
+            os.unlink(manifest_path)
+
+            bundled = borg.RunData.from_bundle(bundle_path).get_run_count()
+
+            borg.tools.bundle_run_data.main(bundle_path, compact = True)
+
+            append_task_runs(foo_path, [("solver_b", 3.0, True), ("solver_a", 4.0, True)])
+            borg.tools.bundle_run_data.main(bundle_path, root, only_solver = only_solver, append = True)
+
+            loaded = borg.RunData.from_bundle(bundle_path)
+
+            nose.tools.assert_true(os.path.exists(manifest_path))
+            nose.tools.assert_equal(loaded.get_run_count(), bundled + (2 if only_solver is None else 1))
+            nose.tools.assert_equal(loaded.to_features_array().tolist(), [[24.0], [42.0]])
+
+def test_csv_bundle_compact():
+    import borg.tools.bundle_run_data
+
+    with borg.util.mkdtemp_scoped() as root:
+        bundle_path = os.path.join(root, "bundle")
+        foo_path = write_task_files(root, "foo", [("solver_a", 1.0, True)], (1.0, 42.0))
+
+        borg.tools.bundle_run_data.main(bundle_path, root)
+
+        append_task_runs(foo_path, [("solver_b", 7.0, True)])
+        borg.tools.bundle_run_data.main(bundle_path, root, append = True)
+
+        write_task_files(root, "bar", [("solver_b", 100.0, False)], (2.0, 24.0))
+        borg.tools.bundle_run_data.main(bundle_path, root, append = True)
+
+        appended = borg.RunData.from_bundle(bundle_path)
+
+        borg.tools.bundle_run_data.main(bundle_path, compact = True)
+
+        manifest = borg.util.load_json(os.path.join(bundle_path, borg.storage.csv_manifest_name))
+
+        nose.tools.assert_equal(manifest["segments"], {"runs": [], "features": []})
+        nose.tools.assert_equal(sorted(os.listdir(bundle_path)), ["all_features.csv.gz", "all_runs.csv.gz", "manifest.json"])
+
+        compacted = borg.RunData.from_bundle(bundle_path)
+
+        nose.tools.assert_equal(sorted(compacted.ids), sorted(appended.ids))
+        nose.tools.assert_equal(compacted.get_run_count(), 3)
+        nose.tools.assert_equal(
+            compacted.to_bins_array(compacted.solver_names, 4).tolist(),
+            appended.to_bins_array(appended.solver_names, 4).tolist(),
+            )
+        nose.tools.assert_equal(
+            compacted.to_features_array().tolist(),
+            appended.to_features_array().tolist(),
+            )
+
+        # appending continues after compaction
+        append_task_runs(foo_path, [("solver_a", 9.0, True)])
+        borg.tools.bundle_run_data.main(bundle_path, root, append = True)
+
+        nose.tools.assert_equal(borg.RunData.from_bundle(bundle_path).get_run_count(), 4)
+
+def test_bundle_mutability():
+    run_data = make_run_data()
+    run = borg.storage.RunRecord("solver_a", 100.0, 5.0, True)
+
+    with borg.util.mkdtemp_scoped() as root:
+        bundle_path = os.path.join(root, "bundle")
+
+        borg.storage.RunColumns.from_run_data(run_data).save(bundle_path)
+
+        loaded = borg.RunData.from_bundle(bundle_path)
+
+        loaded.add_run("baz", run)
+        loaded.add_feature_vector("baz", {"cpu_cost": 3.0, "size": 7.0})
+
+        nose.tools.assert_equal(loaded.get_run_count(), run_data.get_run_count() + 1)
+
+        read_only = borg.RunData.from_bundle(bundle_path, mutable = False)
+
+        nose.tools.assert_raises(TypeError, read_only.add_run, "baz", run)
+        nose.tools.assert_raises(TypeError, read_only.add_feature_vector, "baz", {"size": 7.0})
+
+        copied = read_only.copy()
+
+        copied.add_run("baz", run)
+
+        nose.tools.assert_equal(copied.get_run_count(), run_data.get_run_count() + 1)
+
+def test_array_run_data_conversions():
+    run_data = make_run_data()
+    array_data = borg.storage.ArrayRunData(borg.storage.RunColumns.from_run_data(run_data))
+    solver_names = ["solver_b", "solver_a"]
+
+    nose.tools.assert_equal(
+        array_data.to_bins_array(solver_names, 4).tolist(),
+        run_data.to_bins_array(solver_names, 4).tolist(),
+        )
+
+    (successes, failures, durations) = array_data.to_runs_array(solver_names)
+    (successes_, failures_, durations_) = run_data.to_runs_array(solver_names)
+
+    nose.tools.assert_equal(successes.tolist(), successes_.tolist())
+    nose.tools.assert_equal(failures.tolist(), failures_.tolist())
+    nose.tools.assert_true(numpy.all((durations == durations_) | numpy.isnan(durations_)))
+
+    nose.tools.assert_equal(
+        sorted(array_data.only_nontrivial(50.0).ids),
+        sorted(run_data.only_nontrivial(50.0).ids),
+        )
+
+def test_array_run_data_bins_arrays():
+    run_data = make_run_data()
+    array_data = borg.storage.ArrayRunData(borg.storage.RunColumns.from_run_data(run_data))
+    Bs = [1, 4, 30]
+
+    for (B, outcomes) in zip(Bs, array_data.to_bins_arrays(run_data.solver_names, Bs)):
+        nose.tools.assert_equal(outcomes.tolist(), run_data.to_bins_array(run_data.solver_names, B).tolist())
+
+def test_array_run_data_bins_cache():
+    run_data = make_run_data()
+    array_data = borg.storage.ArrayRunData(borg.storage.RunColumns.from_run_data(run_data), bins_cache_size = 2)
+    view = array_data.filter("foo")
+    Bs = [1, 4, 30]
+
+    for (B, outcomes) in zip(Bs, view.to_bins_arrays(run_data.solver_names, Bs)):
+        nose.tools.assert_equal(outcomes.tolist(), run_data.filter("foo").to_bins_array(run_data.solver_names, B).tolist())
+
+    nose.tools.assert_equal([B for (_, B, _) in array_data._bins_cache], [4, 30])
+
+    # caches are not shipped with pickled data
+    unpickled = cPickle.loads(cPickle.dumps(view, -1))
+
+    nose.tools.assert_equal(len(unpickled._parent._bins_cache), 0)
+    nose.tools.assert_equal(
+        unpickled.to_bins_array(run_data.solver_names, 4).tolist(),
+        view.to_bins_array(run_data.solver_names, 4).tolist(),
+        )
+
+def test_edged_bins_array():
+    run_data = make_run_data()
+    array_data = borg.storage.ArrayRunData(borg.storage.RunColumns.from_run_data(run_data))
+    view = array_data.filter("foo", "bar").masked([True, False])
+    edges = borg.storage.geometric_bin_edges(3, 80.0, 2.0)
+
+    nose.tools.assert_equal(
+        run_data.to_bins_array(run_data.solver_names, 4, edges = [25.0, 50.0, 75.0, 100.0]).tolist(),
+        run_data.to_bins_array(run_data.solver_names, 4).tolist(),
+        )
+    nose.tools.assert_equal(
+        run_data.to_bins_array(run_data.solver_names, 3, edges = edges).tolist(),
+        [[[1, 0, 0, 0], [0, 0, 1, 1]], [[0, 0, 2, 0], [0, 0, 0, 1]]],
+        )
+    nose.tools.assert_equal(
+        array_data.to_bins_array(run_data.solver_names, 3, edges = edges).tolist(),
+        run_data.to_bins_array(run_data.solver_names, 3, edges = edges).tolist(),
+        )
+    nose.tools.assert_equal(
+        view.to_bins_array(run_data.solver_names, 3, edges = edges).tolist(),
+        run_data.filter("bar").to_bins_array(run_data.solver_names, 3, edges = edges).tolist(),
+        )
+    nose.tools.assert_raises(ValueError, run_data.to_bins_array, run_data.solver_names, 4, edges = edges)
+
+def test_array_run_data_views():
+    run_data = make_run_data()
+    array_data = borg.storage.ArrayRunData(borg.storage.RunColumns.from_run_data(run_data))
+    view = array_data.filter("foo", "bar").masked([True, False])
+    expected = run_data.filter(sorted(run_data.ids)[0])
+
+    nose.tools.assert_equal(view.ids, expected.ids)
+    nose.tools.assert_equal(view.get_run_count(), expected.get_run_count())
+    nose.tools.assert_equal(
+        view.to_bins_array(run_data.solver_names, 4).tolist(),
+        expected.to_bins_array(run_data.solver_names, 4).tolist(),
+        )
+    nose.tools.assert_equal(view.to_features_array().tolist(), expected.to_features_array().tolist())
+    nose.tools.assert_equal(view.copy().get_run_count(), expected.get_run_count())
+
+def test_from_paths_cache():
+    with borg.util.mkdtemp_scoped() as root:
+        task_paths = [os.path.join(root, "task{0}.cnf".format(i)) for i in xrange(3)]
+        cache_path = os.path.join(root, "tasks.cache")
+
+        for (i, task_path) in enumerate(task_paths):
+            with open(task_path + ".runs.csv", "w") as runs_file:
+                runs_file.write("solver,budget,cost,succeeded,answer\n")
+                runs_file.write("solver_a,100.0,{0}.0,True,\n".format(i + 1))
+
+            with open(task_path + ".features.csv", "w") as features_file:
+                features_file.write("cpu_cost,size\n1.0,{0}.0\n".format(i))
+
+        def load():
+            return \
+                borg.RunData.from_paths(
+                    ["solver_a"],
+                    task_paths,
+                    None,
+                    workers = 2,
+                    cache_path = cache_path,
+                    )
+
+        nose.tools.assert_equal(load().get_run_count(), 3)
+
+        with open(task_paths[0] + ".runs.csv", "a") as runs_file:
+            runs_file.write("solver_a,100.0,100.0,False,\n")
+
+        reloaded = load()
+
+        nose.tools.assert_equal(reloaded.get_run_count(), 4)
+        nose.tools.assert_equal(reloaded.get_feature_vector(task_paths[2])["size"], 2.0)
@@ -0,0 +1,162 @@
+"""@author: Bryan Silverthorn <bcs@cargo-cult.org>"""
+
+import csv
+import time
+import resource
+import itertools
+import multiprocessing
+import numpy
+import borg
+import borg.tools.plan
+
+logger = borg.get_logger(__name__, default_level = "INFO")
+
+named_planners = {
+    "knapsack": borg.planners.KnapsackPlanner(),
+    "streeter": borg.planners.StreeterPlanner(),
+    "lazy_streeter": borg.planners.LazyStreeterPlanner(),
+    "reordering": borg.planners.ReorderingPlanner(borg.planners.KnapsackPlanner()),
+    "bellman": borg.planners.BellmanPlanner(),
+    "pruned_bellman": borg.planners.PrunedBellmanPlanner(),
+    }
+
+def synthetic_log_survival(W, S, B, seed):
+    """Generate random per-world survival functions over B bins."""
+
+    random = numpy.random.RandomState(seed)
+    alpha = numpy.ones(B + 1) / B
+    alpha[-1] = 1.0
+    rates_WSB = random.dirichlet(alpha, size = (W, S))
+
+    return numpy.log(1.0 + 1e-8 - numpy.cumsum(rates_WSB[..., :-1], axis = -1))
+
+def plan_success(log_survival_WSB, log_weights_W, plan):
+    """Compute the probability that some run in a plan succeeds."""
+
+    log_failure_W = log_weights_W - numpy.logaddexp.reduce(log_weights_W)
+
+    for (s, b) in plan:
+        log_failure_W = log_failure_W + log_survival_WSB[:, s, b]
+
+    return 1.0 - numpy.exp(numpy.logaddexp.reduce(log_failure_W))
+
+def measure_planner(planner, log_survival_WSB, log_weights_W, connection):
+    """Plan, and report the cost of doing so."""
+
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.time()
+    plan = planner.plan(log_survival_WSB, log_weights_W)
+    elapsed = time.time() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    connection.send((elapsed, max(0, peak_kb - baseline_kb), plan))
+
+def benchmark_planner(planner, log_survival_WSB, log_weights_W, timeout):
+    """Plan in a child process; return its time, memory and plan, or None."""
+
+    (receiving, sending) = multiprocessing.Pipe(False)
+    process = \
+        multiprocessing.Process(
+            target = measure_planner,
+            args = (planner, log_survival_WSB, log_weights_W, sending),
+            )
+
+    process.start()
+
+    try:
+        if receiving.poll(timeout):
+            return receiving.recv()
+        else:
+            return None
+    finally:
+        if process.is_alive():
+            process.terminate()
+
+        process.join()
+
+def parse_sizes(sizes):
+    """Parse a comma-separated list of sizes."""
+
+    return map(int, sizes.split(","))
+
+@borg.annotations(
+    out_path = ("results output path"),
+    planner_names = ("comma-separated planners to run", "option", "p"),
+    worlds = ("comma-separated synthetic world counts", "option", "W", parse_sizes),
+    solvers = ("comma-separated synthetic solver counts", "option", "S", parse_sizes),
+    bins = ("comma-separated bin counts", "option", "B", parse_sizes),
+    repeats = ("runs per configuration", "option", "r", int),
+    timeout = ("per-plan time limit", "option", "t", float),
+    bundle_paths = ("paths to run data bundles"),
+    )
+def main(
+    out_path,
+    planner_names = "knapsack,streeter,reordering,bellman",
+    worlds = [64, 1024],
+    solvers = [4, 16],
+    bins = [8, 30, 60],
+    repeats = 1,
+    timeout = 60.0,
+    *bundle_paths
+    ):
+    """Benchmark planners over a grid of problem sizes."""
+
+    planner_names = planner_names.split(",")
+
+    # assemble the problems
+    def yield_problems():
+        for (W, S, B) in itertools.product(worlds, solvers, bins):
+            for r in xrange(repeats):
+                yield ("synthetic", r, synthetic_log_survival(W, S, B, r))
+
+        for bundle_path in bundle_paths:
+            logger.info("loading run data from %s", bundle_path)
+
+            run_data = borg.RunData.from_bundle(bundle_path, mutable = False)
+
+            for B in bins:
+                log_survival = borg.tools.plan.run_data_log_survival(run_data, B + 1)[..., :-1]
+
+                for r in xrange(repeats):
+                    yield (bundle_path, r, log_survival)
+
+    # and run the planners on them
+    with borg.util.openz(out_path, "wb") as out_file:
+        out_csv = csv.writer(out_file)
+
+        out_csv.writerow(["source", "planner", "W", "S", "B", "repeat", "seconds", "peak_kb", "success", "actions"])
+
+        for (source, r, log_survival) in yield_problems():
+            (W, S, B) = log_survival.shape
+            log_weights = -numpy.ones(W) * numpy.log(W)
+
+            for planner_name in planner_names:
+                result = benchmark_planner(named_planners[planner_name], log_survival, log_weights, timeout)
+
+                if result is None:
+                    logger.info("%s timed out on %s (%i x %i x %i)", planner_name, source, W, S, B)
+
+                    row = [source, planner_name, W, S, B, r, None, None, None, None]
+                else:
+                    (elapsed, peak_kb, plan) = result
+                    success = plan_success(log_survival, log_weights, plan)
+
+                    logger.info(
+                        "%s took %.3fs on %s (%i x %i x %i); success probability %.4f",
+                        planner_name,
+                        elapsed,
+                        source,
+                        W,
+                        S,
+                        B,
+                        success,
+                        )
+
+                    row = [source, planner_name, W, S, B, r, elapsed, peak_kb, success, len(plan)]
+
+                out_csv.writerow(row)
+                out_file.flush()
+
+if __name__ == "__main__":
+    borg.script(main)
+
@@ -3,82 +3,317 @@
 import os
 import os.path
 import csv
+import json
+import hashlib
+import collections
 import borg
 
 logger = borg.get_logger(__name__, default_level = "INFO")
 
+def read_new_rows(path, source = None):
+    """
+    Read the complete CSV rows added to a file since it was last bundled.
+
+    The source record of the file, if any, holds the offset up to which it
+    was bundled, its size and modification time then, and a checksum of its
+    bundled prefix; a file whose size and modification time are unchanged is
+    not read, and one whose bundled prefix has changed is refused. Returns
+    the header row, if read, the new rows, and the new source record.
+    """
+
+    stat = os.stat(path)
+
+    if source is None:
+        source = {"offset": 0, "size": None, "mtime": None, "sha1": hashlib.sha1().hexdigest()}
+    elif (stat.st_size, stat.st_mtime) == (source["size"], source["mtime"]):
+        return (None, [], source)
+
+    offset = source["offset"]
+
+    with open(path, "rb") as in_file:
+        data = in_file.read()
+
+    if len(data) < offset or hashlib.sha1(data[:offset]).hexdigest() != source["sha1"]:
+        raise Exception("{0} changed since it was bundled; rebuild the bundle".format(path))
+
+    end = offset + data[offset:].rfind("\n") + 1
+    rows = [row for row in csv.reader(data[offset:end].splitlines(True)) if row]
+
+    if offset == 0 and rows:
+        header = rows.pop(0)
+    else:
+        header = None
+
+    source = {
+        "offset": end,
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+        "sha1": hashlib.sha1(data[:end]).hexdigest(),
+        }
+
+    return (header, rows, source)
+
+def find_bundled_source(path, count, only_solver = None):
+    """
+    Reconstruct the source record of a file bundled without a manifest.
+
+    Sources are only appended to, so a file with count rows in the bundle
+    (of only_solver's runs, if given) was bundled up to its next such row.
+    """
+
+    with open(path, "rb") as in_file:
+        data = in_file.read()
+
+    consumed = [0]
+
+    def yield_lines():
+        for line in data.splitlines(True):
+            consumed[0] += len(line)
+
+            yield line
+
+    end = 0
+
+    for (i, row) in enumerate(csv.reader(yield_lines())):
+        if i > 0 and row and (only_solver is None or row[0] == only_solver):
+            if count == 0:
+                break
+
+            count -= 1
+
+        end = consumed[0]
+
+    if count > 0:
+        raise Exception("{0} changed since it was bundled; rebuild the bundle".format(path))
+
+    return {"offset": end, "size": None, "mtime": None, "sha1": hashlib.sha1(data[:end]).hexdigest()}
+
+def migrate_bundle(bundle_path, runs_paths, runs_extension, features_paths, features_extension, only_solver):
+    """
+    Build a manifest for a bundle written without one.
+
+    The bundle is taken to have been written, from these files, with the
+    only_solver given now.
+    """
+
+    logger.info("building a manifest for the existing bundle %s", bundle_path)
+
+    manifest = {
+        "only_solver": only_solver,
+        "feature_names": None,
+        "next_segment": 1,
+        "segments": {"runs": [], "features": []},
+        "sources": {"runs": {}, "features": {}},
+        }
+
+    for (name, paths, extension) in [("runs", runs_paths, runs_extension), ("features", features_paths, features_extension)]:
+        rows = borg.storage.iter_csv_bundle(bundle_path, name)
+        counts = collections.defaultdict(int)
+
+        try:
+            header = rows.next()
+        except StopIteration:
+            pass
+        else:
+            if name == "features":
+                manifest["feature_names"] = header[1:]
+
+            for row in rows:
+                counts[row[0]] += 1
+
+        for path in paths:
+            instance_path = path[:-len(extension)]
+
+            if instance_path in counts:
+                manifest["sources"][name][path] = \
+                    find_bundled_source(path, counts[instance_path], only_solver if name == "runs" else None)
+
+    return manifest
+
+def write_manifest(bundle_path, manifest):
+    """Write a bundle manifest, replacing any existing one."""
+
+    manifest_path = os.path.join(bundle_path, borg.storage.csv_manifest_name)
+    partial_path = manifest_path + ".partial"
+
+    with open(partial_path, "wb") as manifest_file:
+        json.dump(manifest, manifest_file, indent = 2)
+
+    os.rename(partial_path, manifest_path)
+
+def compact_bundle(bundle_path):
+    """Merge the segments of a bundle into its base files."""
+
+    manifest_path = os.path.join(bundle_path, borg.storage.csv_manifest_name)
+
+    if not os.path.exists(manifest_path):
+        logger.info("%s has no manifest, and so no segments to merge", bundle_path)
+
+        return
+
+    manifest = borg.util.load_json(manifest_path)
+
+    for name in ["runs", "features"]:
+        if not manifest["segments"][name]:
+            continue
+
+        logger.info("merging %i %s segments", len(manifest["segments"][name]), name)
+
+        segment_paths = borg.storage.csv_bundle_paths(bundle_path, name)[1:]
+        base_path = os.path.join(bundle_path, "all_{0}.csv.gz".format(name))
+        partial_path = os.path.join(bundle_path, "all_{0}.partial.csv.gz".format(name))
+
+        with borg.util.openz(partial_path, "w") as out_file:
+            csv.writer(out_file).writerows(borg.storage.iter_csv_bundle(bundle_path, name))
+
+        os.rename(partial_path, base_path)
+
+        manifest["segments"][name] = []
+
+        write_manifest(bundle_path, manifest)
+
+        for segment_path in segment_paths:
+            os.unlink(segment_path)
+
 @borg.annotations(
     bundle_path = ("path to new bundle",),
     root_path = ("instances root directory",),
     runs_extension = ("runs files extension",),
     features_extension = ("features files extension",),
     only_solver = ("only include one solver's runs", "option"),
+    columnar = ("convert the CSV bundle at root_path to columnar format", "flag"),
+    append = ("add only new runs to an existing bundle", "flag"),
+    compact = ("merge the segments of an existing bundle", "flag"),
     )
 def main(
     bundle_path,
-    root_path,
+    root_path = None,
     runs_extension = ".runs.csv",
     features_extension = ".features.csv",
     only_solver = None,
+    columnar = False,
+    append = False,
+    compact = False,
     ):
     """Bundle together run and feature data."""
 
+    if columnar:
+        logger.info("converting CSV bundle %s to columnar bundle %s", root_path, bundle_path)
+
+        borg.storage.RunColumns.from_csv_bundle(root_path).save(bundle_path)
+
+        return
+
+    if compact:
+        compact_bundle(bundle_path)
+
+        return
+
     # list relevant files
     runs_paths = map(os.path.abspath, borg.util.files_under(root_path, [runs_extension]))
     features_paths = map(os.path.abspath, borg.util.files_under(root_path, [features_extension]))
 
-    # write the bundle
-    os.mkdir(bundle_path)
     csv.field_size_limit(1000 * 1000 * 1000)
 
+    # start or continue the bundle
+    if append:
+        manifest_path = os.path.join(bundle_path, borg.storage.csv_manifest_name)
+
+        if os.path.exists(manifest_path):
+            manifest = borg.util.load_json(manifest_path)
+        else:
+            manifest = \
+                migrate_bundle(
+                    bundle_path,
+                    runs_paths,
+                    runs_extension,
+                    features_paths,
+                    features_extension,
+                    only_solver,
+                    )
+
+        only_solver = manifest["only_solver"]
+        runs_name = "runs.{0:06d}.csv.gz".format(manifest["next_segment"])
+        features_name = "features.{0:06d}.csv.gz".format(manifest["next_segment"])
+    else:
+        os.mkdir(bundle_path)
+
+        manifest = {
+            "only_solver": only_solver,
+            "feature_names": None,
+            "next_segment": 1,
+            "segments": {"runs": [], "features": []},
+            "sources": {"runs": {}, "features": {}},
+            }
+        runs_name = "all_runs.csv.gz"
+        features_name = "all_features.csv.gz"
+
+    # write the new rows
     logger.info("bundling run data from %i files", len(runs_paths))
 
-    with borg.util.openz(os.path.join(bundle_path, "all_runs.csv.gz"), "w") as out_file:
+    runs_sources = manifest["sources"]["runs"]
+    runs_written = 0
+
+    with borg.util.openz(os.path.join(bundle_path, runs_name), "w") as out_file:
         out_writer = csv.writer(out_file)
 
         out_writer.writerow(["instance", "solver", "budget", "cost", "succeeded"])
 
         for runs_path in runs_paths:
-            logger.info("reading %s", runs_path)
-
             instance_path = runs_path[:-len(runs_extension)]
 
-            with open(runs_path) as in_file:
-                in_reader = csv.reader(in_file)
-                column_names = in_reader.next()
+            (column_names, rows, runs_sources[runs_path]) = read_new_rows(runs_path, runs_sources.get(runs_path))
 
+            if column_names is not None:
                 assert column_names[:4] == ["solver", "budget", "cost", "succeeded"]
 
-                for row in in_reader:
-                    if only_solver is None or row[0] == only_solver:
-                        out_writer.writerow([instance_path] + row[:4])
+            for row in rows:
+                if only_solver is None or row[0] == only_solver:
+                    out_writer.writerow([instance_path] + row[:4])
+
+                    runs_written += 1
 
     logger.info("bundling feature data from %i files", len(features_paths))
 
-    with borg.util.openz(os.path.join(bundle_path, "all_features.csv.gz"), "w") as out_file:
+    features_sources = manifest["sources"]["features"]
+    features_written = 0
+
+    with borg.util.openz(os.path.join(bundle_path, features_name), "w") as out_file:
         out_writer = csv.writer(out_file)
-        feature_names = None
 
         for features_path in features_paths:
-            logger.info("reading %s", features_path)
-
             instance_path = features_path[:-len(features_extension)]
 
-            with open(features_path) as in_file:
-                in_reader = csv.reader(in_file)
-
-                if feature_names is None:
-                    feature_names = in_reader.next()
+            (column_names, rows, features_sources[features_path]) = \
+                read_new_rows(features_path, features_sources.get(features_path))
 
-                    out_writer.writerow(["instance"] + feature_names)
+            if column_names is not None:
+                if manifest["feature_names"] is None:
+                    manifest["feature_names"] = column_names
                 else:
-                    column_names = in_reader.next()
+                    assert manifest["feature_names"] == column_names
+
+            for row in rows:
+                if features_written == 0:
+                    out_writer.writerow(["instance"] + manifest["feature_names"])
+
+                out_writer.writerow([instance_path] + row)
 
-                    assert feature_names == column_names
+                features_written += 1
 
-                for row in in_reader:
-                    out_writer.writerow([instance_path] + row)
+    logger.info("bundled %i new runs and %i new feature vectors", runs_written, features_written)
+
+    # record the new segments
+    if append:
+        for (name, segment, written) in [("runs", runs_name, runs_written), ("features", features_name, features_written)]:
+            if written > 0:
+                manifest["segments"][name].append(segment)
+            else:
+                os.unlink(os.path.join(bundle_path, segment))
+
+        manifest["next_segment"] += 1
+
+    write_manifest(bundle_path, manifest)
 
 if __name__ == "__main__":
     borg.script(main)
-
@@ -34,12 +34,21 @@ def plans_to_per_bin(category, planner_name, solver_names, plans, B):
         for (s, d) in plan:
             yield [category, planner_name, solver_names[s], str(d)]
 
+def run_data_log_survival(run_data, B):
+    """Compute per-instance empirical survival functions over B bins."""
+
+    bins = run_data.to_bins_array(run_data.solver_names, B).astype(numpy.double)
+    bins[..., -2] += 1e-2 # if all else fails...
+    rates = bins / numpy.sum(bins, axis = -1)[..., None]
+
+    return numpy.log(1.0 + 1e-8 - numpy.cumsum(rates[..., :-1], axis = -1))
+
 def run_experiment(planner_name, bundle_path, category, individual):
     """Run a planning experiment."""
 
     logger.info("loading run data from %s", bundle_path)
 
-    run_data = borg.RunData.from_bundle(bundle_path)
+    run_data = borg.RunData.from_bundle(bundle_path, mutable = False)
 
     logger.info("computing a plan over %i instances with %s", len(run_data), planner_name)
 
@@ -53,17 +62,10 @@ def run_experiment(planner_name, bundle_path, category, individual):
         raise ValueError("unrecognized planner name: {0}".format(planner_name))
 
     B = 60
-    bins = run_data.to_bins_array(run_data.solver_names, B).astype(numpy.double)
-    bins[..., -2] += 1e-2 # if all else fails...
-    rates = bins / numpy.sum(bins, axis = -1)[..., None]
-    log_survival = numpy.log(1.0 + 1e-8 - numpy.cumsum(rates[..., :-1], axis = -1))
+    log_survival = run_data_log_survival(run_data, B)
 
     if individual:
-        plans = []
-
-        for n in xrange(len(run_data)):
-            plans.append(planner.plan(log_survival[n, :, :-1][None, ...]))
-
+        plans = planner.plan_batch(log_survival[..., :-1])
         rows = plans_to_per_bin(category, planner_name, run_data.solver_names, plans, B)
     else:
         plan = planner.plan(log_survival[..., :-1])
@@ -57,7 +57,7 @@ def simulate_split(maker, train_data, test_data):
     solver = maker(suite, train_data)
     rows = []
 
-    for instance_id in test_data.run_lists:
+    for instance_id in test_data.ids:
         logger.info("simulating run on %s", instance_id)
 
         with suite.domain.task_from_path(instance_id) as instance:
@@ -105,8 +105,8 @@ def main(
 
     # generate jobs
     def yield_runs():
-        train_data = borg.storage.RunData.from_bundle(train_bundle)
-        test_data = borg.storage.RunData.from_bundle(test_bundle)
+        train_data = borg.storage.RunData.from_bundle(train_bundle, mutable = False)
+        test_data = borg.storage.RunData.from_bundle(test_bundle, mutable = False)
 
         if portfolio_name == "-":
             if single is None:
@@ -1,7 +1,10 @@
 """@author: Bryan Silverthorn <bcs@cargo-cult.org>"""
 
 import os
+import time
+import errno
 import select
+import tempfile
 import signal
 import datetime
 import collections
@@ -9,6 +12,16 @@ import borg
 
 log = borg.get_logger(__name__)
 
+def usage_time(usage, system = False):
+    """
+    Return the CPU time in a resource usage record.
+    """
+
+    if system:
+        return datetime.timedelta(seconds = usage.ru_utime + usage.ru_stime)
+    else:
+        return datetime.timedelta(seconds = usage.ru_utime)
+
 class SessionTimeAccountant(object):
     """
     Track the total CPU (user) time for members of a session.
@@ -20,23 +33,299 @@ class SessionTimeAccountant(object):
     mostly good only at making it harder for processes to actively evade being
     charged. For primarily long-running processes that act in good faith, we
     should do ok.
+
+    Members are found by a session scanner, which looks for new members only
+    every C{rescan_period} seconds. System time is charged if C{system}.
     """
 
-    def __init__(self, sid):
+    def __init__(self, sid, system = False, rescan_period = None):
         """
         Initialize.
         """
 
+        if rescan_period is None:
+            rescan_period = borg.defaults.proc_rescan_period
+
         self.sid     = sid
+        self.system  = system
+        self.scanner = borg.unix.proc.SessionScanner(sid, rescan_period)
+        self.charged = {}
+        self.floor   = datetime.timedelta()
+
+    def audit(self):
+        """
+        Update estimates.
+        """
+
+        for p in self.scanner.scan():
+            if self.system:
+                self.charged[p.pid] = p.user_time + p.system_time
+            else:
+                self.charged[p.pid] = p.user_time
+
+    def settle(self, pid, usage):
+        """
+        Charge at least the final usage of a reaped member.
+        """
+
+        self.floor = max(self.floor, usage_time(usage, self.system))
+
+    def kill(self):
+        """
+        Kill every member of the session.
+        """
+
+        borg.unix.sessions.kill_session(self.sid, signal.SIGKILL)
+
+    def close(self):
+        """
+        Release any resources.
+        """
+
+    @property
+    def total(self):
+        """
+        Return estimated total.
+        """
+
+        return max(self.floor, sum(self.charged.values(), datetime.timedelta()))
+
+class TrackedTimeAccountant(object):
+    """
+    Track the total CPU (user) time of a process tree through /proc.
+
+    Descendants of the root process are discovered through the children lists
+    of known processes (or, on kernels without them, through a scan of parent
+    pids), so an audit usually costs time in the size of the tree rather than
+    of the system. Each process is charged its own time and that of children
+    it has waited for; a process that vanishes while its parent lives was
+    waited for, and is thereafter charged through its parent. Descendants that
+    are reparented before they are first seen escape accounting. System time
+    is charged if C{system}.
+    """
+
+    def __init__(self, pid, system = False):
+        """
+        Initialize.
+        """
+
+        self.pid     = pid
+        self.system  = system
+        self.parents = {pid: None}
         self.charged = {}
+        self.floor   = datetime.timedelta()
+
+    def audit(self):
+        """
+        Update estimates.
+        """
+
+        # read the known processes, and discover their new children
+        stats       = {}
+        pending     = list(self.parents)
+        children_of = None
+
+        while pending:
+            pid = pending.pop()
+
+            try:
+                stats[pid] = borg.unix.proc.ProcessStat(pid)
+            except IOError:
+                continue
+
+            children = borg.unix.proc.get_children(pid)
+
+            if children is None:
+                if children_of is None:
+                    children_of = collections.defaultdict(list)
+
+                    for p in borg.unix.proc.ProcessStat.all():
+                        children_of[p.ppid].append(p.pid)
+
+                children = children_of[pid]
+
+            for child in children:
+                if child not in self.parents:
+                    self.parents[child] = pid
+
+                    pending.append(child)
+
+        # charge the living, and forget the departed
+        for (pid, stat) in stats.iteritems():
+            self.charged[pid] = stat.user_time + stat.child_user_time
+
+            if self.system:
+                self.charged[pid] += stat.system_time + stat.child_system_time
+
+        for pid in self.parents.keys():
+            if pid not in stats:
+                if self.parents[pid] in stats:
+                    self.charged.pop(pid, None)
+
+                del self.parents[pid]
+
+    def settle(self, pid, usage):
+        """
+        Charge at least the final usage of a reaped member.
+        """
+
+        self.floor = max(self.floor, usage_time(usage, self.system))
+
+    def kill(self):
+        """
+        Kill every process in the tree, and in the session that it leads.
+
+        The tree is stopped before it is rediscovered, so that no process can
+        fork an untracked child before being killed; descendants that escaped
+        the tree, but not the session, are killed through the session.
+        """
+
+        self.signal_all(signal.SIGSTOP)
+        self.audit()
+        self.signal_all(signal.SIGKILL)
+
+        borg.unix.sessions.kill_session(self.pid, signal.SIGKILL)
+
+    def signal_all(self, number):
+        """
+        Send a signal to every known process in the tree.
+        """
+
+        for pid in self.parents:
+            try:
+                os.kill(pid, number)
+            except OSError, error:
+                if error.errno != errno.ESRCH:
+                    raise
+
+    def close(self):
+        """
+        Release any resources.
+        """
+
+    @property
+    def total(self):
+        """
+        Return estimated total.
+        """
+
+        return max(self.floor, sum(self.charged.values(), datetime.timedelta()))
+
+def get_cgroup2_directory():
+    """
+    Return the cgroup v2 directory of this process, or None.
+    """
+
+    try:
+        with open("/proc/self/mountinfo") as mountinfo:
+            mounts = [line.split() for line in mountinfo]
+
+        with open("/proc/self/cgroup") as cgroups:
+            memberships = [line.rstrip("\n").split(":", 2) for line in cgroups]
+    except IOError:
+        return None
+
+    for fields in mounts:
+        separator = fields.index("-")
+
+        if fields[separator + 1] == "cgroup2":
+            for (hierarchy, _, path) in memberships:
+                if hierarchy == "0":
+                    return os.path.join(fields[4], path.lstrip("/"))
+
+    return None
+
+class CgroupTimeAccountant(object):
+    """
+    Track the total CPU (user) time of a session confined to its own cgroup.
+
+    The kernel keeps the cumulative usage of every process ever in the cgroup,
+    including those that have exited, so an audit reads a single file. The
+    cgroup is created under that of this process, which must be a writable
+    cgroup v2 directory; the session must be placed in it at spawn. System
+    time is charged if C{system}.
+    """
+
+    def __init__(self, parent = None, system = False):
+        """
+        Create the cgroup.
+        """
+
+        if parent is None:
+            parent = get_cgroup2_directory()
+
+            if parent is None:
+                raise EnvironmentError("no cgroup v2 hierarchy is mounted")
+
+        self.path   = tempfile.mkdtemp(prefix = "borg.", dir = parent)
+        self.system = system
+        self.used   = datetime.timedelta()
+        self.floor = datetime.timedelta()
 
     def audit(self):
         """
         Update estimates.
         """
 
-        for p in borg.unix.proc.ProcessStat.in_session(self.sid):
-            self.charged[p.pid] = p.user_time
+        wanted = "usage_usec" if self.system else "user_usec"
+
+        with open(os.path.join(self.path, "cpu.stat")) as stat:
+            for line in stat:
+                (key, value) = line.split()
+
+                if key == wanted:
+                    self.used = datetime.timedelta(microseconds = int(value))
+
+    def settle(self, pid, usage):
+        """
+        Charge at least the final usage of a reaped member.
+        """
+
+        self.floor = max(self.floor, usage_time(usage, self.system))
+
+    def kill(self):
+        """
+        Kill every process in the cgroup.
+        """
+
+        try:
+            with open(os.path.join(self.path, "cgroup.kill"), "w") as kill:
+                kill.write("1\n")
+        except IOError:
+            # (kernels before 5.14 lack cgroup.kill)
+            for i in xrange(8):
+                with open(os.path.join(self.path, "cgroup.procs")) as procs:
+                    pids = [int(line) for line in procs]
+
+                if not pids:
+                    break
+
+                for pid in pids:
+                    try:
+                        os.kill(pid, signal.SIGKILL)
+                    except OSError, error:
+                        if error.errno != errno.ESRCH:
+                            raise
+
+    def close(self, timeout = 1.0):
+        """
+        Remove the cgroup, waiting up to C{timeout} seconds for it to empty.
+        """
+
+        deadline = time.time() + timeout
+
+        while True:
+            try:
+                os.rmdir(self.path)
+            except OSError, error:
+                if error.errno == errno.EBUSY and time.time() < deadline:
+                    time.sleep(0.01)
+                else:
+                    log.warning("could not remove cgroup %s: %s", self.path, error)
+
+                    break
+            else:
+                break
 
     @property
     def total(self):
@@ -44,7 +333,72 @@ class SessionTimeAccountant(object):
         Return estimated total.
         """
 
-        return sum(self.charged.values(), datetime.timedelta())
+        return max(self.floor, self.used)
+
+def spawn_accounted_session(arguments, environment = {}, cwd = None, method = None, system = None):
+    """
+    Spawn a subprocess in its own session, with an accountant of its CPU time.
+    """
+
+    def spawn(cgroup):
+        return borg.unix.sessions.spawn_pipe_session(arguments, environment, cwd = cwd, cgroup = cgroup)
+
+    return start_accounted_session(spawn, method, system)
+
+def fork_accounted_slot(environment = {}, method = None, system = None):
+    """
+    Fork a session slot, waiting to execute a command, with an accountant.
+    """
+
+    def spawn(cgroup):
+        return borg.unix.sessions.SessionSlot(environment, cgroup)
+
+    return start_accounted_session(spawn, method, system)
+
+def start_accounted_session(spawn, method = None, system = None):
+    """
+    Start a session through C{spawn}, with an accountant of its CPU time.
+
+    Under the "cgroup" method, the session is confined to its own cgroup;
+    under "tracked", its process tree is followed through /proc; under
+    "session", processes on the system are scanned for membership. The
+    default "auto" method uses a cgroup where possible, and otherwise tracks
+    the process tree. System time is charged if C{system}.
+    """
+
+    if method is None:
+        method = borg.defaults.session_accounting
+
+    if system is None:
+        system = borg.defaults.charge_system_time
+
+    if method in ("auto", "cgroup"):
+        accountant = None
+
+        try:
+            accountant = CgroupTimeAccountant(system = system)
+            popened    = spawn(accountant.path)
+        except EnvironmentError, error:
+            if accountant is not None:
+                accountant.close()
+
+            if method == "cgroup":
+                raise
+
+            log.debug("cgroup accounting unavailable (%s); tracking instead", error)
+
+            method = "tracked"
+        else:
+            return (popened, accountant)
+
+    popened = spawn(None)
+
+    if method == "tracked":
+        return (popened, TrackedTimeAccountant(popened.pid, system))
+    elif method == "session":
+        return (popened, SessionTimeAccountant(popened.pid, system))
+    else:
+        raise ValueError("unknown accounting method \"%s\"" % method)
 
 class PollingReader(object):
     """
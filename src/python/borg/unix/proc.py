@@ -1,7 +1,7 @@
 """@author: Bryan Silverthorn <bcs@cargo-cult.org>"""
 
 import os
-import re
+import time
 import datetime
 
 class ProcFileParseError(RuntimeError):
@@ -17,74 +17,81 @@ class ProcessStat(object):
     """
 
     __ticks_per_second = os.sysconf(os.sysconf_names["SC_CLK_TCK"])
-    __entry_re         = re.compile("\\d+")
-    __stat_re_strings  = [
+    __field_names      = [
         # signedness decisions were made by examining the kernel source, and in some
         # cases (eg pid) don't make much sense---but who are we in userland to judge?
-        "(?P<pid>-?\\d+)",      # process pid
-        "(?P<name>\\(.+\\))",   # executable name
-        "(?P<state>[RSDZTWX])", # process state
-        "(?P<ppid>-?\\d+)",     # parent's pid
-        "(?P<pgid>-?\\d+)",     # process group id
-        "(?P<sid>-?\\d+)",      # session id
-        "(?P<tty>-?\\d+)",      # tty number
-        "(?P<ttyg>-?\\d+)",     # group id of the process which owns the associated tty
-        "(?P<flags>\\d+)",      # kernel flags word (kernel-version-dependent)
-        "(?P<min>\\d+)",        # minor faults count
-        "(?P<cmin>\\d+)",       # waited-for-children minor faults count
-        "(?P<maj>\\d+)",        # major faults count
-        "(?P<cmaj>\\d+)",       # waited-for-children major faults count
-        "(?P<utime>\\d+)",      # user mode jiffies count
-        "(?P<stime>\\d+)",      # kernel mode jiffies count
-        "(?P<cutime>-?\\d+)",   # waited-for-children user mode jiffies count
-        "(?P<cstime>-?\\d+)",   # waited-for-children kernel mode jiffies count
-        "(?P<priority>-?\\d+)", # real-time priority or raw nice value
-        "(?P<nice>-?\\d+)",     # signed nice value in [-19, 19]
-        "(?P<nthreads>-?\\d+)", # number of threads in the process (replaced removed field)
-        "0",                    # removed-field placeholder
-        "(?P<start>\\d+)",      # process start time in jiffies
-        "(?P<vsize>\\d+)",      # bytes of process virtual memory
-        "(?P<rss>-?\\d+)",      # resident set size minus three
-        "(?P<rlim>\\d+)",       # rss limit in bytes
-        "(?P<pbot>\\d+)",       # program text bottom address
-        "(?P<ptop>\\d+)",       # program text top address
-        "(?P<stack>\\d+)",      # stack start address
-        "(?P<esp>\\d+)",        # stack pointer address
-        "(?P<eip>\\d+)",        # instruction pointer address
-        "(?P<pending>\\d+)",    # pending signals bitmap
-        "(?P<blocked>\\d+)",    # blocked signals bitmap
-        "(?P<ignored>\\d+)",    # ignored signals bitmap
-        "(?P<caught>\\d+)",     # caught signals bitmap
-        "(?P<wchan>\\d+)",      # process wait channel
-        "\\d+",                 # zero (in the past, pages swapped)
-        "\\d+",                 # zero (in the past, childrens' pages swapped)
-        "(?P<dsig>-?\\d+)",     # death signal to parent
-        "(?P<cpu>-?\\d+)",      # last CPU of execution
-        "(?P<rtprio>\\d+)",     # real-time scheduling priority
-        "(?P<policy>\\d+)",     # scheduling policy
-        "(?P<blkio>\\d+)",      # clock ticks of block I/O delays
-        "(?P<gtime>\\d+)",      # process guest time in clock ticks
-        "(?P<cgtime>\\d+)",     # waited-for-children's guest time in clock ticks
+        "pid",      # process pid
+        "name",     # executable name
+        "state",    # process state
+        "ppid",     # parent's pid
+        "pgid",     # process group id
+        "sid",      # session id
+        "tty",      # tty number
+        "ttyg",     # group id of the process which owns the associated tty
+        "flags",    # kernel flags word (kernel-version-dependent)
+        "min",      # minor faults count
+        "cmin",     # waited-for-children minor faults count
+        "maj",      # major faults count
+        "cmaj",     # waited-for-children major faults count
+        "utime",    # user mode jiffies count
+        "stime",    # kernel mode jiffies count
+        "cutime",   # waited-for-children user mode jiffies count
+        "cstime",   # waited-for-children kernel mode jiffies count
+        "priority", # real-time priority or raw nice value
+        "nice",     # signed nice value in [-19, 19]
+        "nthreads", # number of threads in the process (replaced removed field)
+        None,       # removed-field placeholder
+        "start",    # process start time in jiffies
+        "vsize",    # bytes of process virtual memory
+        "rss",      # resident set size minus three
+        "rlim",     # rss limit in bytes
+        "pbot",     # program text bottom address
+        "ptop",     # program text top address
+        "stack",    # stack start address
+        "esp",      # stack pointer address
+        "eip",      # instruction pointer address
+        "pending",  # pending signals bitmap
+        "blocked",  # blocked signals bitmap
+        "ignored",  # ignored signals bitmap
+        "caught",   # caught signals bitmap
+        "wchan",    # process wait channel
+        None,       # zero (in the past, pages swapped)
+        None,       # zero (in the past, childrens' pages swapped)
+        "dsig",     # death signal to parent
+        "cpu",      # last CPU of execution
+        "rtprio",   # real-time scheduling priority
+        "policy",   # scheduling policy
+        "blkio",    # clock ticks of block I/O delays
+        "gtime",    # process guest time in clock ticks
+        "cgtime",   # waited-for-children's guest time in clock ticks
         ]
-    __stat_res = [re.compile(s) for s in __stat_re_strings]
 
     def __init__(self, pid):
         """Read and parse /proc/<pid>/stat."""
 
-        with open("/proc/%i/stat" % pid) as file:
-            stat = file.read()
+        path = "/proc/%i/stat" % pid
 
-        strings  = stat.split()
-        self.__d = {
-            "pid"   : strings[0],
-            "sid"   : strings[5],
-            "utime" : strings[13],
-            }
+        try:
+            fd = os.open(path, os.O_RDONLY)
 
-#         for i in fields:
-#             m = ProcessStat.__stat_res[i].match(strings[i])
+            try:
+                stat = os.read(fd, 4096)
+            finally:
+                os.close(fd)
+        except OSError, error:
+            raise IOError(error.errno, error.strerror, path)
 
-#             self.__d.update(m.groupdict())
+        # the executable name may itself contain spaces and parentheses
+        (head, closing, tail) = stat.rpartition(")")
+        (pid_string, _, name) = head.partition(" ")
+
+        if not closing:
+            raise ProcFileParseError("malformed %s" % path)
+
+        self.__d = dict(zip(ProcessStat.__field_names[2:], tail.split()))
+
+        self.__d["pid"] = pid_string
+        self.__d["name"] = name + ")"
 
     @staticmethod
     def all():
@@ -98,9 +105,7 @@ class ProcessStat(object):
         """
 
         for name in os.listdir("/proc"):
-            m = ProcessStat.__entry_re.match(name)
-
-            if m:
+            if name.isdigit():
                 try:
                     yield ProcessStat(int(name))
                 except IOError:
@@ -135,8 +140,10 @@ class ProcessStat(object):
     child_major_faults  = property(lambda self: long(self.__d["cmaj"]))
     user_time           = property(lambda self: self.__ticks_to_timedelta(self.__d["utime"]))
     kernel_time         = property(lambda self: self.__ticks_to_timedelta(self.__d["stime"]))
+    system_time         = kernel_time
     child_user_time     = property(lambda self: self.__ticks_to_timedelta(self.__d["cutime"]))
     child_kernel_time   = property(lambda self: self.__ticks_to_timedelta(self.__d["cstime"]))
+    child_system_time   = child_kernel_time
     priority            = property(lambda self: int(self.__d["priority"]))
     nice                = property(lambda self: int(self.__d["nice"]))
     threads             = property(lambda self: int(self.__d["nthreads"]))
@@ -156,12 +163,100 @@ class ProcessStat(object):
     wait_channel        = property(lambda self: long(self.__d["wchan"]))
     exit_signal         = property(lambda self: int(self.__d["dsig"]))
     last_cpu            = property(lambda self: int(self.__d["cpu"]))
-    priority            = property(lambda self: long(self.__d["rtprio"]))
+    real_time_priority  = property(lambda self: long(self.__d["rtprio"]))
     policy              = property(lambda self: long(self.__d["policy"]))
     io_delay            = property(lambda self: long(self.__d["blkio"]))
     guest_time          = property(lambda self: self.__ticks_to_timedelta(self.__d["gtime"]))
     child_guest_time    = property(lambda self: self.__ticks_to_timedelta(self.__d["cgtime"]))
 
+class SessionScanner(object):
+    """
+    Follow the processes of a session, scanning /proc for newcomers only occasionally.
+
+    Known members are re-read at every scan, and other pids are remembered as
+    non-members, so that a rescan reads the stat files only of processes new
+    since the last. Members born and gone between rescans are missed.
+    """
+
+    def __init__(self, sid, rescan_period = 1.0):
+        """Initialize."""
+
+        self.sid = sid
+        self.rescan_period = rescan_period
+        self.members = set([sid])
+        self.others = set()
+        self.last_rescan = None
+
+    def scan(self):
+        """Return the current statistics of each member process."""
+
+        now = time.time()
+
+        if self.last_rescan is None or now - self.last_rescan >= self.rescan_period:
+            self.rescan()
+
+            self.last_rescan = now
+
+        stats = []
+
+        for pid in list(self.members):
+            try:
+                stat = ProcessStat(pid)
+            except IOError:
+                self.members.discard(pid)
+            else:
+                if stat.sid == self.sid:
+                    stats.append(stat)
+                else:
+                    self.members.discard(pid)
+
+        return stats
+
+    def rescan(self):
+        """Look for new members among processes not seen before."""
+
+        pids = set(int(name) for name in os.listdir("/proc") if name.isdigit())
+
+        self.others &= pids
+
+        for pid in pids - self.members - self.others:
+            try:
+                stat = ProcessStat(pid)
+            except IOError:
+                continue
+
+            if stat.sid == self.sid:
+                self.members.add(pid)
+            else:
+                self.others.add(pid)
+
+def get_children(pid):
+    """
+    Return the pids of the children of a process, or None if unsupported.
+
+    Reads /proc/<pid>/task/<tid>/children, which requires a kernel built with
+    CONFIG_PROC_CHILDREN; a process that has terminated has no children.
+    """
+
+    try:
+        tids = os.listdir("/proc/%i/task" % pid)
+    except OSError:
+        return []
+
+    children = []
+
+    for tid in tids:
+        try:
+            with open("/proc/%i/task/%s/children" % (pid, tid)) as file:
+                children.extend(map(int, file.read().split()))
+        except IOError:
+            if not os.path.exists("/proc/%i/task/%s" % (pid, tid)):
+                continue
+            else:
+                return None
+
+    return children
+
 def get_pid_utime(pid):
     return ProcessStat(pid).user_time
 
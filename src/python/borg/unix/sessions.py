@@ -2,12 +2,18 @@
 
 import os
 import pty
+import fcntl
+import errno
+import shutil
+import select
+import signal
+import tempfile
 import subprocess
 import borg
 
 log = borg.get_logger(__name__)
 
-def _child_preexec(environment):
+def _child_preexec(environment, cgroup = None):
     """Run in the child code prior to execution."""
 
     # update the environment
@@ -17,8 +23,13 @@ def _child_preexec(environment):
     # start our own session
     os.setsid()
 
-def spawn_pipe_session(arguments, environment = {}, cwd = None):
-    """Spawn a subprocess in its own session."""
+    # and, optionally, join a cgroup
+    if cgroup is not None:
+        with open(os.path.join(cgroup, "cgroup.procs"), "w") as procs:
+            procs.write("%i\n" % os.getpid())
+
+def spawn_pipe_session(arguments, environment = {}, cwd = None, cgroup = None):
+    """Spawn a subprocess in its own session, optionally in a cgroup directory."""
 
     popened = \
         subprocess.Popen(
@@ -27,7 +38,7 @@ def spawn_pipe_session(arguments, environment = {}, cwd = None):
             stdin = subprocess.PIPE,
             stdout = subprocess.PIPE,
             stderr = subprocess.PIPE,
-            preexec_fn = lambda: _child_preexec(environment),
+            preexec_fn = lambda: _child_preexec(environment, cgroup),
             cwd = cwd,
             )
 
@@ -73,6 +84,186 @@ def spawn_pty_session(arguments, environment = {}, cwd = None):
 
         raised.re_raise()
 
+def _read_status(fd):
+    """Read a newline-terminated status line, or an empty string at EOF."""
+
+    status = ""
+
+    while not status.endswith("\n"):
+        chunk = os.read(fd, 64)
+
+        if chunk == "":
+            break
+
+        status += chunk
+
+    return status.strip()
+
+def _slot_child(environment, cgroup, control_fd, status_fd, stdout_fd, stderr_fd):
+    """Run in a slot's child: set up, wait for a command, and execute it."""
+
+    try:
+        try:
+            _child_preexec(environment, cgroup)
+
+            null_fd = os.open(os.devnull, os.O_RDONLY)
+
+            os.dup2(null_fd, 0)
+            os.dup2(stdout_fd, 1)
+            os.dup2(stderr_fd, 2)
+
+            # (including descriptors inherited from other slots)
+            for name in os.listdir("/proc/self/fd"):
+                if int(name) > 2 and int(name) not in (control_fd, status_fd):
+                    try:
+                        os.close(int(name))
+                    except OSError:
+                        pass
+        except EnvironmentError, error:
+            os.write(status_fd, "%i\n" % error.errno)
+        else:
+            os.write(status_fd, "ok\n")
+
+            chunks = []
+
+            while True:
+                chunk = os.read(control_fd, 65536)
+
+                if chunk == "":
+                    break
+
+                chunks.append(chunk)
+
+            if chunks:
+                (cwd, arguments) = "".join(chunks).split("\0", 1)
+                arguments = arguments.split("\0")
+
+                try:
+                    if cwd:
+                        os.chdir(cwd)
+
+                    os.execvp(arguments[0], arguments)
+                except OSError, error:
+                    os.write(status_fd, "%i\n" % error.errno)
+    finally:
+        os._exit(127)
+
+class SessionSlot(object):
+    """
+    A forked process, in its own session and with its own temporary
+    directory, waiting to execute a command.
+
+    Once executing, a slot stands in for the subprocess.Popen instance that
+    C{spawn_pipe_session} would have returned.
+    """
+
+    def __init__(self, environment = {}, cgroup = None):
+        """Fork the waiting process."""
+
+        self.tmpdir = tempfile.mkdtemp(prefix = "borg.")
+        self.returncode = None
+
+        (control_r, control_w) = os.pipe()
+        (status_r, status_w) = os.pipe()
+        (stdout_r, stdout_w) = os.pipe()
+        (stderr_r, stderr_w) = os.pipe()
+
+        fcntl.fcntl(status_w, fcntl.F_SETFD, fcntl.FD_CLOEXEC)
+
+        self.pid = os.fork()
+
+        if self.pid == 0:
+            _slot_child(environment, cgroup, control_r, status_w, stdout_w, stderr_w)
+
+        for fd in [control_r, status_w, stdout_w, stderr_w]:
+            os.close(fd)
+
+        self._control_fd = control_w
+        self._status_fd = status_r
+        self.stdout = os.fdopen(stdout_r, "rb")
+        self.stderr = os.fdopen(stderr_r, "rb")
+
+        status = _read_status(self._status_fd)
+
+        if status != "ok":
+            self.close()
+
+            raise OSError(int(status or errno.ECHILD), "could not prepare session slot")
+
+    def execute(self, arguments, cwd = None):
+        """Execute a command in the slot."""
+
+        message = "\0".join([cwd or ""] + list(arguments))
+
+        try:
+            while message:
+                message = message[os.write(self._control_fd, message):]
+        finally:
+            os.close(self._control_fd)
+
+            self._control_fd = None
+
+        status = _read_status(self._status_fd)
+
+        os.close(self._status_fd)
+
+        self._status_fd = None
+
+        if status:
+            self.wait()
+
+            raise OSError(int(status), "%s: %s" % (os.strerror(int(status)), arguments[0]))
+
+    def poll(self):
+        """Return the exit code if the process has exited, or None."""
+
+        if self.returncode is None:
+            (pid, status) = os.waitpid(self.pid, os.WNOHANG)
+
+            if pid != 0:
+                self._set_returncode(status)
+
+        return self.returncode
+
+    def wait(self):
+        """Wait for the process to exit, and return its exit code."""
+
+        if self.returncode is None:
+            (_, status) = os.waitpid(self.pid, 0)
+
+            self._set_returncode(status)
+
+        return self.returncode
+
+    def kill(self):
+        """Kill the process."""
+
+        os.kill(self.pid, signal.SIGKILL)
+
+    def close(self):
+        """Dismiss the slot, if it has not executed a command."""
+
+        for fd in [self._control_fd, self._status_fd]:
+            if fd is not None:
+                os.close(fd)
+
+        self._control_fd = None
+        self._status_fd = None
+
+        self.wait()
+        self.stdout.close()
+        self.stderr.close()
+
+        shutil.rmtree(self.tmpdir, ignore_errors = True)
+
+    def _set_returncode(self, status):
+        """Interpret a wait status."""
+
+        if os.WIFSIGNALED(status):
+            self.returncode = -os.WTERMSIG(status)
+        else:
+            self.returncode = os.WEXITSTATUS(status)
+
 def kill_session(sid, number):
     """
     Send signal C{number} to all processes in session C{sid}.
@@ -88,3 +279,180 @@ def kill_session(sid, number):
         if exit_code not in (0, 1):
             raise RuntimeError("pkill failure")
 
+
+def _set_nonblocking(fd):
+    """Put a file descriptor in non-blocking mode."""
+
+    fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+
+class SessionMonitor(object):
+    """
+    Multiplex the output and exits of many session leaders in one epoll loop.
+
+    Each call to C{wait} blocks until some registered process writes to stdout
+    or stderr, some child exits, C{wake} is called, or the timeout expires.
+    Both output streams are drained, so a chatty process cannot block on a
+    full stderr pipe. Exits are noticed immediately if C{watch_children} has
+    been called, and otherwise at the next wakeup.
+    """
+
+    def __init__(self):
+        """Initialize."""
+
+        self._epoll = select.epoll()
+        self._streams = {}
+        self._popens = {}
+        self._watching = False
+        (self._wakeup_fd, self._waker_fd) = os.pipe()
+
+        _set_nonblocking(self._wakeup_fd)
+        _set_nonblocking(self._waker_fd)
+
+        self._epoll.register(self._wakeup_fd, select.EPOLLIN)
+
+    def watch_children(self):
+        """Wake on SIGCHLD; must be called from the main thread."""
+
+        signal.signal(signal.SIGCHLD, lambda number, frame: None)
+        signal.siginterrupt(signal.SIGCHLD, False)
+        signal.set_wakeup_fd(self._waker_fd)
+
+        self._watching = True
+
+    def add(self, key, popened):
+        """Monitor a session leader spawned with pipes."""
+
+        for (name, stream) in [("stdout", popened.stdout), ("stderr", popened.stderr)]:
+            fd = stream.fileno()
+
+            self._streams[fd] = (key, name)
+            self._epoll.register(fd, select.EPOLLIN)
+
+        self._popens[key] = popened
+
+    def discard(self, key):
+        """Stop monitoring a process."""
+
+        for (fd, (stream_key, _)) in self._streams.items():
+            if stream_key == key:
+                self._unregister(fd)
+
+        self._popens.pop(key, None)
+
+    def wake(self):
+        """Interrupt a concurrent or subsequent call to C{wait}."""
+
+        try:
+            os.write(self._waker_fd, "\0")
+        except OSError, error:
+            if error.errno != errno.EAGAIN:
+                raise
+
+    def wait(self, timeout = -1):
+        """
+        Wait for events, returning a list of (key, kind, data) triples.
+
+        Output events are of kind "stdout" or "stderr", with a chunk of output
+        as data, or an empty string at end of file. Exit events are of kind
+        "exit", with the pair of exit status and resource usage as data; they
+        follow any output left in the pipes of the exited process.
+        """
+
+        try:
+            polled = self._epoll.poll(timeout)
+        except IOError, error:
+            if error.errno == errno.EINTR:
+                polled = []
+            else:
+                raise
+
+        events = []
+
+        for (fd, mask) in polled:
+            if fd == self._wakeup_fd:
+                self._drain_wakeups()
+            elif fd in self._streams:
+                (key, name) = self._streams[fd]
+
+                if mask & select.EPOLLIN:
+                    chunk = os.read(fd, 65536)
+                else:
+                    chunk = ""
+
+                if chunk == "":
+                    self._unregister(fd)
+
+                events.append((key, name, chunk))
+
+        # reap any exited processes
+        for (key, popened) in self._popens.items():
+            (pid, status, usage) = os.wait4(popened.pid, os.WNOHANG)
+
+            if pid != 0:
+                if os.WIFSIGNALED(status):
+                    popened.returncode = -os.WTERMSIG(status)
+                else:
+                    popened.returncode = os.WEXITSTATUS(status)
+
+                events.extend(self._drain_streams(key))
+                events.append((key, "exit", (status, usage)))
+
+                del self._popens[key]
+
+        return events
+
+    def close(self):
+        """Release the monitor's descriptors; call from the main thread."""
+
+        if self._watching:
+            signal.set_wakeup_fd(-1)
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+
+            self._watching = False
+
+        self._epoll.close()
+
+        os.close(self._wakeup_fd)
+        os.close(self._waker_fd)
+
+    def _drain_wakeups(self):
+        """Empty the wakeup pipe."""
+
+        try:
+            while os.read(self._wakeup_fd, 4096):
+                pass
+        except OSError, error:
+            if error.errno != errno.EAGAIN:
+                raise
+
+    def _drain_streams(self, key):
+        """Read whatever output an exited process left behind."""
+
+        events = []
+
+        for (fd, (stream_key, name)) in self._streams.items():
+            if stream_key == key:
+                _set_nonblocking(fd)
+
+                try:
+                    while True:
+                        chunk = os.read(fd, 65536)
+
+                        events.append((key, name, chunk))
+
+                        if chunk == "":
+                            self._unregister(fd)
+
+                            break
+                except OSError, error:
+                    if error.errno != errno.EAGAIN:
+                        raise
+
+        return events
+
+    def _unregister(self, fd):
+        """Stop polling a stream."""
+
+        self._epoll.unregister(fd)
+
+        del self._streams[fd]
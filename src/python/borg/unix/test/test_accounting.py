@@ -0,0 +1,70 @@
+"""@author: Bryan Silverthorn <bcs@cargo-cult.org>"""
+
+import os
+import datetime
+import resource
+import nose
+import nose.tools
+import borg
+
+def assert_charges_exited_children(method):
+    # a child burns CPU time and exits, while the session leader lives on
+    arguments = ["sh", "-c", "(i=0; while [ $i -lt 100000 ]; do i=$((i+1)); done); echo; sleep 60"]
+    (popened, accountant) = borg.unix.accounting.spawn_accounted_session(arguments, method = method)
+
+    try:
+        popened.stdout.readline()
+
+        accountant.audit()
+
+        nose.tools.assert_true(accountant.total > datetime.timedelta(seconds = 0.05))
+
+        # and every process of the session can be killed
+        accountant.kill()
+
+        nose.tools.assert_equal(popened.wait(), -9)
+    finally:
+        if popened.returncode is None:
+            popened.kill()
+            popened.wait()
+
+        popened.stdout.close()
+        popened.stderr.close()
+
+        accountant.close()
+
+    return accountant
+
+def test_tracked_time_accountant():
+    assert_charges_exited_children("tracked")
+
+def test_session_time_accountant_kill():
+    (popened, accountant) = borg.unix.accounting.spawn_accounted_session(["sh", "-c", "echo; sleep 60"], method = "session")
+
+    try:
+        popened.stdout.readline()
+
+        accountant.kill()
+
+        nose.tools.assert_equal(popened.wait(), -9)
+    finally:
+        popened.stdout.close()
+        popened.stderr.close()
+
+def test_cgroup_time_accountant():
+    parent = borg.unix.accounting.get_cgroup2_directory()
+
+    if parent is None or not os.access(parent, os.W_OK):
+        raise nose.SkipTest("no writable cgroup v2 directory")
+
+    accountant = assert_charges_exited_children("cgroup")
+
+    nose.tools.assert_false(os.path.exists(accountant.path))
+
+def test_accountant_settle():
+    accountant = borg.unix.accounting.TrackedTimeAccountant(os.getpid())
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+
+    accountant.settle(os.getpid(), usage)
+
+    nose.tools.assert_equal(accountant.total, datetime.timedelta(seconds = usage.ru_utime))
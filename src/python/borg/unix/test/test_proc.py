@@ -0,0 +1,83 @@
+"""@author: Bryan Silverthorn <bcs@cargo-cult.org>"""
+
+import os
+import signal
+import subprocess
+import nose.tools
+import borg
+
+def test_process_stat_names():
+    # the executable name is free text, and may contain spaces and parentheses
+    for name in ["a b", "x) (y", "))"]:
+        popened = \
+            subprocess.Popen(
+                ["sh", "-c", "printf '%s' \"$0\" > /proc/$$/comm; echo; read line", name],
+                stdin = subprocess.PIPE,
+                stdout = subprocess.PIPE,
+                )
+
+        try:
+            popened.stdout.readline()
+
+            stat = borg.unix.proc.ProcessStat(popened.pid)
+
+            nose.tools.assert_equal(stat.name, "(%s)" % name)
+            nose.tools.assert_equal(stat.pid, popened.pid)
+            nose.tools.assert_equal(stat.ppid, os.getpid())
+            nose.tools.assert_equal(stat.sid, os.getsid(0))
+        finally:
+            popened.stdin.close()
+            popened.wait()
+
+def test_process_stat_missing():
+    popened = subprocess.Popen(["true"])
+
+    popened.wait()
+
+    nose.tools.assert_raises(IOError, borg.unix.proc.ProcessStat, popened.pid)
+
+def test_session_scanner():
+    popened = \
+        subprocess.Popen(
+            ["sh", "-c", "sleep 60 & echo; wait"],
+            stdout = subprocess.PIPE,
+            preexec_fn = os.setsid,
+            )
+
+    try:
+        popened.stdout.readline()
+
+        scanner = borg.unix.proc.SessionScanner(popened.pid, rescan_period = 60.0)
+        members = set(p.pid for p in scanner.scan())
+
+        nose.tools.assert_equal(len(members), 2)
+        nose.tools.assert_true(popened.pid in members)
+
+        # until the next rescan, newcomers go unseen
+        others = set(scanner.others)
+        newcomer = subprocess.Popen(["sleep", "60"])
+
+        try:
+            nose.tools.assert_equal(set(p.pid for p in scanner.scan()), members)
+            nose.tools.assert_equal(scanner.others, others)
+
+            scanner.rescan()
+
+            nose.tools.assert_true(newcomer.pid in scanner.others)
+            nose.tools.assert_equal(set(p.pid for p in scanner.scan()), members)
+        finally:
+            newcomer.kill()
+            newcomer.wait()
+
+        # and departed members are forgotten
+        (child,) = members - set([popened.pid])
+
+        os.kill(child, signal.SIGKILL)
+        popened.wait()
+
+        nose.tools.assert_equal(scanner.scan(), [])
+        nose.tools.assert_equal(scanner.members, set())
+    finally:
+        if popened.returncode is None:
+            borg.unix.sessions.kill_session(popened.pid, signal.SIGKILL)
+            popened.wait()
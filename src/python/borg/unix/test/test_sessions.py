@@ -0,0 +1,110 @@
+"""@author: Bryan Silverthorn <bcs@cargo-cult.org>"""
+
+import os
+import time
+import errno
+import nose.tools
+import borg
+
+def monitor_until_exit(monitor, key, timeout = 10.0):
+    """Collect monitor events for a process until its exit."""
+
+    deadline = time.time() + timeout
+    output = {"stdout": [], "stderr": []}
+
+    while time.time() < deadline:
+        for (event_key, kind, data) in monitor.wait(0.1):
+            nose.tools.assert_equal(event_key, key)
+
+            if kind == "exit":
+                return (output, data)
+            else:
+                output[kind].append(data)
+
+    raise AssertionError("no exit event")
+
+def test_session_monitor():
+    monitor = borg.unix.sessions.SessionMonitor()
+
+    try:
+        # output arrives on both streams, with end of file, before the exit
+        popened = borg.unix.sessions.spawn_pipe_session(["sh", "-c", "echo foo; echo bar >&2; exit 3"])
+
+        monitor.add("a", popened)
+
+        (output, (status, usage)) = monitor_until_exit(monitor, "a")
+
+        nose.tools.assert_equal("".join(output["stdout"]), "foo\n")
+        nose.tools.assert_equal("".join(output["stderr"]), "bar\n")
+        nose.tools.assert_equal(output["stdout"][-1], "")
+        nose.tools.assert_equal(output["stderr"][-1], "")
+        nose.tools.assert_equal(os.WEXITSTATUS(status), 3)
+        nose.tools.assert_equal(popened.returncode, 3)
+        nose.tools.assert_true(usage.ru_utime >= 0.0)
+
+        popened.stdout.close()
+        popened.stderr.close()
+
+        # a process writing more than a pipe buffer to stderr is drained
+        popened = borg.unix.sessions.spawn_pipe_session(["sh", "-c", "head -c 1000000 /dev/zero >&2; echo done"])
+
+        monitor.add("b", popened)
+
+        (output, _) = monitor_until_exit(monitor, "b")
+
+        nose.tools.assert_equal("".join(output["stdout"]), "done\n")
+        nose.tools.assert_equal(len("".join(output["stderr"])), 1000000)
+
+        popened.stdout.close()
+        popened.stderr.close()
+
+        # and waking interrupts a wait
+        monitor.wake()
+
+        started = time.time()
+
+        nose.tools.assert_equal(monitor.wait(10.0), [])
+        nose.tools.assert_true(time.time() - started < 5.0)
+    finally:
+        monitor.close()
+
+def test_session_slot():
+    # a slot executes its command in its own session
+    slot = borg.unix.sessions.SessionSlot()
+
+    try:
+        nose.tools.assert_true(os.path.isdir(slot.tmpdir))
+        nose.tools.assert_equal(slot.poll(), None)
+
+        slot.execute(["sh", "-c", "pwd; ps -o sid= -p $$"], cwd = slot.tmpdir)
+
+        (cwd, sid) = slot.stdout.read().split()
+
+        nose.tools.assert_equal(os.path.realpath(cwd), os.path.realpath(slot.tmpdir))
+        nose.tools.assert_equal(int(sid), slot.pid)
+        nose.tools.assert_equal(slot.wait(), 0)
+    finally:
+        slot.close()
+
+    nose.tools.assert_false(os.path.exists(slot.tmpdir))
+
+def test_session_slot_bad_command():
+    slot = borg.unix.sessions.SessionSlot()
+
+    try:
+        with nose.tools.assert_raises(OSError) as context:
+            slot.execute(["/nonexistent/solver"])
+
+        nose.tools.assert_equal(context.exception.errno, errno.ENOENT)
+        nose.tools.assert_equal(slot.returncode, 127)
+    finally:
+        slot.close()
+
+def test_session_slot_close():
+    # an idle slot exits, and removes its directory, when dismissed
+    slot = borg.unix.sessions.SessionSlot()
+
+    slot.close()
+
+    nose.tools.assert_equal(slot.returncode, 127)
+    nose.tools.assert_false(os.path.exists(slot.tmpdir))